@@ -12,11 +12,13 @@ import time
 import numpy as np
 from PIL import Image
 import base64
+from concurrent.futures import ThreadPoolExecutor
 
 # Import app modules
-from jsonschema import validate, ValidationError
-from cache import CompositionCache
+from cache import CompositionCache, composition_fingerprint
+from composition_store import get_composition_store
 from metrics import metrics, logger, log_user_action, track_time
+from resampler import PREVIEW_SAMPLE_RATE, EXPORT_SAMPLE_RATES
 
 # Safe import for audio_effects
 AudioEffects = None
@@ -32,6 +34,9 @@ music_utils = None
 music_utils_error = None
 try:
     import music_utils
+    from composition_validator import validate_composition
+    from encoding_service import EncodingService
+    from incremental_render import IncrementalRenderer
 except Exception as e:
     music_utils_error = str(e)
     st.error(f"❌ Erreur critique: music_utils n'a pas pu être chargé: {e}")
@@ -39,6 +44,9 @@ except Exception as e:
 # Load environment variables
 load_dotenv()
 
+# Formats encodés en arrière-plan dès la lecture, avant toute demande de téléchargement
+PREWARM_FORMATS = tuple(f.strip() for f in os.getenv("ENCODE_PREWARM", "mp3").split(',') if f.strip())
+
 # Server configuration
 import socket
 
@@ -63,9 +71,17 @@ L'application est prête à l'emploi.
 
 # Initialize cache and effects
 if 'composition_cache' not in st.session_state:
-    st.session_state.composition_cache = CompositionCache(max_size=100, ttl_seconds=3600)
+    # Memory tier per session, in front of the disk tier shared by every session and process
+    st.session_state.composition_cache = CompositionCache(
+        max_size=int(os.getenv("CACHE_MAX_SIZE", "100")),
+        ttl_seconds=3600,
+        disk=get_composition_store()
+    )
 if 'audio_effects' not in st.session_state and AudioEffects is not None:
-    st.session_state.audio_effects = AudioEffects(sample_rate=44100)
+    st.session_state.audio_effects = AudioEffects(
+        sample_rate=44100,
+        workers=int(os.getenv("EFFECTS_WORKERS", "1"))
+    )
 elif AudioEffects is None:
     st.warning("⚠️ Audio effects non disponibles. La composition utilisera l'audio brut.")
 
@@ -112,67 +128,13 @@ def get_mistral_config():
 API_KEY, MODEL_ID = get_mistral_config()
 mistral_client = Mistral(api_key=API_KEY)
 
-# JSON Schema for validation
-def _get_music_schema():
-    """Returns the JSON schema for music composition validation."""
-    return {
-        "type": "object",
-        "required": ["mood", "tempo", "key", "time_signature", "reasoning", "tracks"],
-        "properties": {
-            "mood": {"type": "string"},
-            "reasoning": {"type": "string"},
-            "key": {"type": "string"},
-            "time_signature": {"type": "string"},
-            "tempo": {"type": "number", "minimum": 40, "maximum": 240},
-            "suggested_instrument": {"type": "string"},
-            "tracks": {
-                "type": "object",
-                "properties": {
-                    "melody": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "required": ["note", "duration"],
-                            "properties": {
-                                "note": {"type": "string"},
-                                "duration": {"type": "number", "minimum": 0.125, "maximum": 8.0}
-                            }
-                        }
-                    },
-                    "bass": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "required": ["note", "duration"],
-                            "properties": {
-                                "note": {"type": "string"},
-                                "duration": {"type": "number", "minimum": 0.125, "maximum": 8.0}
-                            }
-                        }
-                    },
-                    "chords": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "required": ["notes", "duration"],
-                            "properties": {
-                                "notes": {
-                                    "type": "array",
-                                    "items": {"type": "string"}
-                                },
-                                "duration": {"type": "number", "minimum": 0.125, "maximum": 8.0}
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    }
-
 # --- AI LOGIC ---
 @st.cache_data(show_spinner=False)
-def analyze_with_mistral(_image, audio_path=None):
-    """Analyze image with Mistral AI to generate music composition."""
+def analyze_with_mistral(_image, audio_path=None, fingerprint=None):
+    """
+    Analyze image with Mistral AI to generate music composition.
+    The image itself is not hashed by st.cache_data: its fingerprint is.
+    """
     # Vérifier la configuration à chaque appel
     current_api_key = os.getenv("MISTRAL_API_KEY") or (st.secrets.get("mistral", {}).get("api_key") if "mistral" in st.secrets else None)
     
@@ -264,19 +226,23 @@ def analyze_with_mistral(_image, audio_path=None):
         if match:
             parsed_json = json.loads(match.group(0))
             
-            # Validate JSON schema
-            try:
-                validate(instance=parsed_json, schema=_get_music_schema())
-                
-                duration = time.time() - start_time
-                metrics.record_api_call(duration, cached=False)
-                log_user_action("composition_generated", {"tempo": parsed_json.get("tempo"), "mood": parsed_json.get("mood")})
-                
-                return parsed_json, "✅ Composition IA générée avec succès."
-            except ValidationError as ve:
-                logger.error(f"JSON validation error: {ve}")
-                metrics.record_error("validation", str(ve))
-                return None, f"❌ Erreur validation JSON: {ve.message}"
+            # Schéma compilé une fois + contrôle des notes, tessitures et longueurs de pistes ;
+            # les petits écarts sont corrigés sans nouvel appel à l'API
+            composition, report = validate_composition(parsed_json)
+            if composition is None:
+                logger.error(f"JSON validation error: {report.summary()}")
+                metrics.record_error("validation", report.summary())
+                return None, f"❌ Erreur validation JSON: {report.errors[0]}"
+            if report.warnings or report.repairs:
+                logger.info(f"Composition validated in {report.seconds * 1000:.1f} ms: {report.summary()}")
+            
+            duration = time.time() - start_time
+            metrics.record_api_call(duration, cached=False)
+            log_user_action("composition_generated", {"tempo": composition.get("tempo"), "mood": composition.get("mood")})
+            
+            if report.repairs:
+                return composition, f"✅ Composition IA générée avec succès ({len(report.repairs)} correction(s) automatique(s))."
+            return composition, "✅ Composition IA générée avec succès."
         
         return None, "❌ Erreur format JSON Mistral"
     except Exception as e:
@@ -284,16 +250,103 @@ def analyze_with_mistral(_image, audio_path=None):
         metrics.record_error("api", str(e))
         return None, f"❌ Erreur API Mistral: {e}"
 
-def process_composition(image, audio_file, instrument, use_reverb, use_delay, use_compression):
-    """Process image and generate music composition."""
+def effects_params(use_reverb, use_delay, use_compression, reverb_mode='schroeder', ping_pong=False, stereo_width=1.0):
+    """Effects chain settings of the sidebar, as AudioEffects.apply_effects_chain() keyword arguments."""
+    return dict(
+        use_reverb=use_reverb,
+        use_delay=use_delay,
+        use_compression=use_compression,
+        use_width=stereo_width != 1.0,
+        room_size=0.6,
+        reverb_mode=reverb_mode,
+        delay_time=0.25,
+        feedback=0.35,
+        delay_mix=0.25,
+        ping_pong=ping_pong,
+        stereo_width=stereo_width
+    )
+
+def apply_effects(wav_data, use_reverb, use_delay, use_compression, reverb_mode='schroeder',
+                  ping_pong=False, stereo_width=1.0):
+    """Apply the sidebar effects chain to (sample_rate, int16 audio); returns the same layout."""
+    # Apply effects if available
+    if 'audio_effects' in st.session_state and st.session_state.audio_effects is not None:
+        sr, audio_array = wav_data
+        
+        # Convertir en float32 et normaliser si nécessaire
+        if audio_array.dtype != np.float32:
+            if np.issubdtype(audio_array.dtype, np.integer):
+                audio_float = audio_array.astype(np.float32) / np.iinfo(audio_array.dtype).max
+            else:
+                audio_float = audio_array.astype(np.float32)
+        else:
+            audio_float = audio_array
+        
+        effects_start = time.time()
+        processed_audio = st.session_state.audio_effects.apply_effects_chain(
+            audio_float,
+            sample_rate=sr,
+            **effects_params(use_reverb, use_delay, use_compression, reverb_mode, ping_pong, stereo_width)
+        )
+        chain_stats = st.session_state.audio_effects.last_chain_stats
+        metrics.record_effects_chain(
+            time.time() - effects_start,
+            chain_stats['allocated_bytes'],
+            cache_hits=chain_stats['cache_hits'],
+            cache_misses=chain_stats['cache_misses']
+        )
+        
+        # S'assurer que le signal est dans la plage [-1, 1]
+        processed_audio = np.clip(processed_audio, -1.0, 1.0)
+        
+        # Convertir en int16 pour la sortie
+        processed_audio_int16 = (processed_audio * 32767).astype(np.int16)
+        
+        # S'assurer que le taux d'échantillonnage est valide
+        if not (0 < sr <= 65535):
+            sr = 44100  # Valeur par défaut sûre
+        
+        # La chaîne d'effets rend l'audio dans la disposition d'entrée (N, canaux)
+        wav_data = (int(sr), processed_audio_int16)
+    else:
+        st.info("ℹ️ Effets audio non appliqués (module manquant)")
+        
+        # S'assurer que le taux d'échantillonnage est valide même sans effets
+        sr, audio_data = wav_data
+        if not (0 < sr <= 65535):
+            sr = 44100
+            wav_data = (sr, audio_data)
+    
+    return wav_data
+
+def process_composition(image, audio_file, instrument, use_reverb, use_delay, use_compression, reverb_mode='schroeder',
+                        ping_pong=False, stereo_width=1.0, sample_rate=44100, fast_synth=False, progressive=False,
+                        fingerprint=None):
+    """
+    Process image and generate music composition.
+    fingerprint: composition_fingerprint() of the request, the key of the
+    composition cache (computed from the image when not given).
+    With progressive=True the first bars are rendered and shown as a playable
+    preview while the full piece renders in a background thread.
+    """
     if music_utils is None:
         st.error(f"❌ Erreur: music_utils n'est pas disponible. {music_utils_error}")
         return None
     
     start_time = time.time()
     
-    with st.spinner("🎨 Analyse de l'image avec l'IA..."):
-        analysis, msg = analyze_with_mistral(image, audio_file)
+    if fingerprint is None:
+        fingerprint = composition_fingerprint(image)
+    cache = st.session_state.composition_cache
+    analysis = cache.get(fingerprint)
+    if analysis is not None:
+        metrics.record_api_call(0.0, cached=True)
+        msg = "⚡ Composition retrouvée dans le cache."
+    else:
+        with st.spinner("🎨 Analyse de l'image avec l'IA..."):
+            analysis, msg = analyze_with_mistral(image, audio_file, fingerprint)
+        if analysis:
+            cache.set(fingerprint, analysis)
     
     if not analysis:
         # Check for critical errors (API Key issues)
@@ -318,114 +371,106 @@ def process_composition(image, audio_file, instrument, use_reverb, use_delay, us
     inst = instrument if instrument != "Auto-Detect" else analysis.get('suggested_instrument', 'piano')
     
     with st.spinner("🎼 Génération de la partition..."):
-        score = music_utils.json_to_music21(analysis)
-        abc_content = music_utils.music21_to_abc(score)
-    
-    with st.spinner("🎵 Synthèse audio..."):
-        wav_data = music_utils.score_to_audio(score, inst)
-
-        # Apply effects if available
-        if 'audio_effects' in st.session_state and st.session_state.audio_effects is not None:
-            sr, audio_array = wav_data
-            
-            # Convertir en float32 et normaliser si nécessaire
-            if audio_array.dtype != np.float32:
-                if np.issubdtype(audio_array.dtype, np.integer):
-                    audio_float = audio_array.astype(np.float32) / np.iinfo(audio_array.dtype).max
-                else:
-                    audio_float = audio_array.astype(np.float32)
-            else:
-                audio_float = audio_array
-
-            processed_audio = st.session_state.audio_effects.apply_effects_chain(
-                audio_float,
-                use_reverb=use_reverb,
-                use_delay=use_delay,
-                use_compression=use_compression,
-                room_size=0.6,
-                delay_time=0.25,
-                feedback=0.35,
-                delay_mix=0.25
+        # Notes converties une seule fois en tableaux (NoteEvents), relus par l'ABC,
+        # le MIDI et la synthèse ; ABC écrit directement, en mémoire
+        notes = music_utils.NoteEvents.from_json(analysis)
+        abc_content = music_utils.json_to_abc(notes)
+    
+    engine = 'numpy' if fast_synth else 'fluidsynth'
+    preview_slot = st.empty()
+    synth_start = time.time()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        if progressive:
+            with st.spinner("⏩ Aperçu des premières mesures..."):
+                head = music_utils.composition_head(notes)
+                preview_stems = music_utils.render_stems(head, inst, sample_rate=sample_rate, engine=engine)
+        
+        # Une piste (stem) par partie, rendues en parallèle et mises en cache séparément :
+        # changer d'instrument ne refait que la mélodie. En mode progressif, le rendu
+        # complet tourne pendant le mixage, les effets et l'envoi de l'aperçu
+        full_render = executor.submit(
+            music_utils.render_stems, notes, inst, sample_rate=sample_rate, engine=engine
+        )
+        
+        if progressive:
+            preview = apply_effects(
+                (sample_rate, music_utils.mix_stems(preview_stems)), use_reverb, use_delay, use_compression,
+                reverb_mode, ping_pong=ping_pong, stereo_width=stereo_width
             )
-
-            # S'assurer que le signal est dans la plage [-1, 1]
-            processed_audio = np.clip(processed_audio, -1.0, 1.0)
-            
-            # Convertir en int16 pour la sortie
-            processed_audio_int16 = (processed_audio * 32767).astype(np.int16)
-            
-            # S'assurer que le taux d'échantillonnage est valide
-            if not (0 < sr <= 65535):
-                sr = 44100  # Valeur par défaut sûre
-                
-            # S'assurer que les données sont dans le bon format
-            if len(processed_audio_int16.shape) == 2 and processed_audio_int16.shape[0] < processed_audio_int16.shape[1]:
-                processed_audio_int16 = processed_audio_int16.T
-                
-            wav_data = (int(sr), processed_audio_int16)
-        else:
-            st.info("ℹ️ Effets audio non appliqués (module manquant)")
+            metrics.record_time_to_first_audio(time.time() - start_time)
+            with preview_slot.container():
+                st.audio(music_utils.audio_to_wav(*preview), format='audio/wav')
+                st.caption(f"⏩ Aperçu des {music_utils.PREVIEW_BARS} premières mesures, rendu complet en cours...")
+        
+        with st.spinner("🎵 Synthèse audio..."):
+            stems = full_render.result()
+            wav_data = (sample_rate, music_utils.mix_stems(stems))
+            metrics.record_audio_generation(time.time() - synth_start)
             
-            # S'assurer que le taux d'échantillonnage est valide même sans effets
-            sr, audio_data = wav_data
-            if not (0 < sr <= 65535):
-                sr = 44100
-                wav_data = (sr, audio_data)
+            wav_data = apply_effects(
+                wav_data, use_reverb, use_delay, use_compression, reverb_mode,
+                ping_pong=ping_pong, stereo_width=stereo_width
+            )
+    
+    if not progressive:
+        metrics.record_time_to_first_audio(time.time() - start_time)
     
-    with st.spinner("💾 Export MIDI et MP3..."):
-        midi_path = music_utils.score_to_midi(score)
-        mp3_path = music_utils.save_audio_to_mp3(wav_data[0], wav_data[1])
+    with st.spinner("💾 Export MIDI et pistes..."):
+        # MP3 / Opus / FLAC sont encodés en arrière-plan, à la demande (voir les téléchargements)
+        midi_data = music_utils.score_to_midi(notes, inst)
+        stem_files = {key: music_utils.audio_to_wav(sample_rate, stem) for key, stem in stems.items()}
     
     metrics.record_composition(time.time() - start_time)
+    preview_slot.empty()
     
     return {
         'audio': wav_data,
+        'audio_key': EncodingService.pcm_key(*wav_data),
         'abc': abc_content,
-        'midi': midi_path,
-        'mp3': mp3_path,
+        'midi': midi_data,
+        'stems': stem_files,
         'json': analysis
     }
 
-def update_from_abc(abc_content, instrument, use_reverb, use_delay, use_compression):
-    """Update audio from modified ABC notation."""
+def update_from_abc(abc_content, instrument, use_reverb, use_delay, use_compression, reverb_mode='schroeder',
+                    ping_pong=False, stereo_width=1.0, sample_rate=44100, fast_synth=False):
+    """
+    Update audio from modified ABC notation.
+    The renderer kept in the session only re-parses, re-synthesizes and
+    re-processes what the edit changed (see IncrementalRenderer).
+    """
     if music_utils is None or not abc_content:
         return None
     
     with st.spinner("🔄 Mise à jour de la partition..."):
-        score = music_utils.abc_to_music21(abc_content)
-        if not score:
-            st.error("❌ Erreur: Code ABC invalide")
-            return None
-        
         inst = instrument if instrument != "Auto-Detect" else 'piano'
+        engine = 'numpy' if fast_synth else 'fluidsynth'
+        renderer = st.session_state.get('abc_renderer')
+        if renderer is None or not renderer.matches(inst, sample_rate, engine):
+            renderer = IncrementalRenderer(inst, sample_rate, engine, effects=st.session_state.get('audio_effects'))
+            st.session_state.abc_renderer = renderer
         
-        wav_data = music_utils.score_to_audio(score, inst)
-
-        if 'audio_effects' in st.session_state and st.session_state.audio_effects is not None:
-            sr, audio_array = wav_data
-            audio_float = audio_array.astype(np.float32) / 32767.0
-
-            processed_audio = st.session_state.audio_effects.apply_effects_chain(
-                audio_float,
-                use_reverb=use_reverb,
-                use_delay=use_delay,
-                use_compression=use_compression,
-                room_size=0.6,
-                delay_time=0.25,
-                feedback=0.35,
-                delay_mix=0.25
-            )
-
-            processed_audio_int16 = (processed_audio * 32767).astype(np.int16)
-            wav_data = (sr, processed_audio_int16)
+        synth_start = time.time()
+        chain_params = effects_params(use_reverb, use_delay, use_compression, reverb_mode, ping_pong, stereo_width)
+        update = renderer.update(abc_content, chain_params if renderer.effects is not None else None)
+        if update is None:
+            st.error("❌ Erreur: Code ABC invalide")
+            return None
+        metrics.record_audio_generation(time.time() - synth_start)
         
-        midi_path = music_utils.score_to_midi(score)
-        mp3_path = music_utils.save_audio_to_mp3(wav_data[0], wav_data[1])
+        wav_data = (sample_rate, update['audio'])
+        midi_data = music_utils.tracks_to_midi(update['tracks'], update['tempo'])
+        stem_files = {key: music_utils.audio_to_wav(sample_rate, stem) for key, stem in update['stems'].items()}
+    
+    stats = renderer.last_stats
+    st.caption(f"🔁 {stats['changed_seconds']:.1f} s recalculées sur {stats['total_seconds']:.1f} s "
+               f"en {stats['seconds'] * 1000:.0f} ms")
     
     return {
         'audio': wav_data,
-        'midi': midi_path,
-        'mp3': mp3_path
+        'audio_key': EncodingService.pcm_key(*wav_data),
+        'midi': midi_data,
+        'stems': stem_files
     }
 
 # --- STREAMLIT UI ---
@@ -466,12 +511,52 @@ with st.sidebar:
         ["Auto-Detect", "piano", "synth_retro", "strings", "bass", "guitar", "brass", "drums"],
         help="Choisissez l'instrument ou laissez l'IA décider"
     )
+    fast_synth = st.checkbox(
+        "⚡ Synthèse rapide",
+        value=False,
+        help="Moteur intégré (NumPy) sans FluidSynth : rendu quasi instantané, timbres plus simples. "
+             "Utilisé automatiquement si aucune soundfont n'est installée"
+    )
+    progressive = st.checkbox(
+        "⏩ Aperçu progressif",
+        value=True,
+        help="Joue les premières mesures dès qu'elles sont prêtes, pendant que le reste du morceau "
+             "et les exports se terminent"
+    )
     
     st.subheader("🎚️ Effets Audio")
     use_reverb = st.checkbox("🌊 Reverb", value=False, help="Ajoute de la profondeur et de l'espace")
+    reverb_mode = st.selectbox(
+        "Type de reverb",
+        ["schroeder", "convolution"],
+        format_func=lambda m: "Convolution (queue réaliste)" if m == "convolution" else "Schroeder (léger)",
+        disabled=not use_reverb
+    )
     use_delay = st.checkbox("🔁 Delay", value=False, help="Écho rythmique")
+    ping_pong = st.checkbox(
+        "↔️ Ping-pong",
+        value=False,
+        help="Les échos alternent entre gauche et droite",
+        disabled=not use_delay
+    )
+    stereo_width = st.slider(
+        "🎧 Largeur stéréo",
+        min_value=0.0,
+        max_value=2.0,
+        value=1.0,
+        step=0.1,
+        help="0 = mono, 1 = inchangé, 2 = très large"
+    )
     use_compression = st.checkbox("📊 Compression", value=True, help="Égalise les dynamiques (recommandé)")
     
+    sample_rate = st.selectbox(
+        "🎛️ Fréquence d'échantillonnage",
+        [PREVIEW_SAMPLE_RATE, *EXPORT_SAMPLE_RATES],
+        index=1,
+        format_func=lambda r: f"{r / 1000:g} kHz" + (" (aperçu rapide)" if r == PREVIEW_SAMPLE_RATE else ""),
+        help="22.05 kHz divise par deux le coût de synthèse et d'effets ; 44.1 ou 48 kHz pour l'export final"
+    )
+    
     st.divider()
     
     # Metrics
@@ -479,7 +564,26 @@ with st.sidebar:
         stats = metrics.get_stats()
         st.metric("Compositions", stats['total_compositions'])
         st.metric("Appels API", stats['api_calls'])
-        st.metric("Taux de cache", stats['cache_hit_rate'])
+        cache_stats = st.session_state.composition_cache.get_stats()
+        st.metric("Taux de cache", stats['cache_hit_rate'],
+                  help=f"{cache_stats['size']}/{cache_stats['max_size']} compositions en cache, "
+                       f"{cache_stats['evictions']} évincées, {cache_stats['expirations']} expirées")
+        disk_stats = cache_stats['disk']
+        if disk_stats is not None:
+            st.caption(f"💽 Cache disque : {disk_stats['entries']} compositions, "
+                       f"{disk_stats['bytes'] / 1e6:.1f}/{disk_stats['max_bytes'] / 1e6:.0f} Mo, "
+                       f"{cache_stats['disk_hits']} retrouvées depuis le disque")
+        st.metric("Cache effets", stats['effects_cache_hit_rate'])
+        st.metric("Cache rendus", stats['render_cache_hit_rate'],
+                  help=f"{stats['render_cache_bytes_saved'] / 1e6:.1f} Mo d'audio non resynthétisés")
+        st.metric("Premier son", stats['avg_time_to_first_audio'],
+                  help="Délai moyen avant le premier audio jouable (aperçu progressif ou rendu complet)")
+        if music_utils is not None:
+            formats = music_utils.AUDIO_FORMATS
+            for fmt, enc in music_utils.get_encoding_service().get_stats()['formats'].items():
+                if enc['encodes']:
+                    st.caption(f"🎛️ {formats[fmt]['label']} : {enc['avg_time']:.2f} s, "
+                               f"compression x{enc['compression_ratio']:.1f}")
 
 # Main content
 tab1, tab2, tab3 = st.tabs(["🎨 Composer", "📝 Éditeur ABC", "ℹ️ Aide"])
@@ -513,8 +617,17 @@ with tab1:
             # Process composition
             image = Image.open(uploaded_image)
             audio_path = uploaded_audio.name if uploaded_audio else None
+            # Empreinte calculée une fois sur les octets du fichier (ni décodage ni ré-encodage PNG),
+            # utilisée pour la recherche et l'insertion dans le cache
+            fingerprint = composition_fingerprint(
+                image, uploaded_image.getvalue(), uploaded_audio.getvalue() if uploaded_audio else None
+            )
             
-            result = process_composition(image, audio_path, instrument, use_reverb, use_delay, use_compression)
+            result = process_composition(
+                image, audio_path, instrument, use_reverb, use_delay, use_compression, reverb_mode,
+                ping_pong=ping_pong, stereo_width=stereo_width, sample_rate=sample_rate, fast_synth=fast_synth,
+                progressive=progressive, fingerprint=fingerprint
+            )
             
             if result:
                 # Store in session state
@@ -566,42 +679,68 @@ with tab1:
                 
                 # Afficher l'audio avec le bon format
                 st.audio(audio_data, format='audio/wav', sample_rate=int(sr))
+                
+                # Pré-encodage des formats les plus téléchargés pendant l'écoute
+                music_utils.get_encoding_service().prewarm(
+                    int(sr), result['audio'][1], PREWARM_FORMATS, key=result.get('audio_key')
+                )
             except Exception as e:
                 st.error(f"Erreur lors de la lecture audio: {e}")
                 if isinstance(result['audio'][1], np.ndarray):
                      st.caption(f"Debug: Shape={result['audio'][1].shape}, Dtype={result['audio'][1].dtype}")
             
             # Download buttons
-            col_midi, col_mp3 = st.columns(2)
+            col_midi, col_audio = st.columns(2)
             with col_midi:
-                midi_path = result.get('midi')
-                if midi_path and os.path.isfile(midi_path):
-                    with open(midi_path, 'rb') as f:
+                midi_data = result.get('midi')
+                if midi_data:
+                    st.download_button(
+                        "📥 Télécharger MIDI",
+                        midi_data,
+                        file_name="composition.mid",
+                        mime="audio/midi",
+                        width='stretch'
+                    )
+                else:
+                    st.error("❌ Erreur: Export MIDI échoué")
+            with col_audio:
+                formats = music_utils.AUDIO_FORMATS
+                fmt = st.selectbox(
+                    "Format audio", list(formats), format_func=lambda f: formats[f]['label'],
+                    label_visibility='collapsed'
+                )
+                spec = formats[fmt]
+                service = music_utils.get_encoding_service()
+                audio_key = result.get('audio_key') or EncodingService.pcm_key(*result['audio'])
+                encoded = service.peek(audio_key, fmt)
+                if encoded is None and st.button(f"🎛️ Préparer {spec['label']}", width='stretch'):
+                    with st.spinner(f"Encodage {spec['label']}..."):
+                        encoded = service.get(*result['audio'], fmt, key=audio_key)
+                    if encoded is None:
+                        st.warning(f"⚠️ Export {spec['label']} non disponible (ffmpeg requis)")
+                if encoded:
+                    st.download_button(
+                        f"📥 Télécharger {spec['label']}",
+                        encoded,
+                        file_name=f"composition.{spec['ext']}",
+                        mime=spec['mime'],
+                        width='stretch'
+                    )
+            
+            # Stems: une piste WAV par partie
+            stem_files = result.get('stems') or {}
+            if stem_files:
+                st.caption("🎚️ Pistes séparées (WAV)")
+                part_names = {key: name for key, name, _, _ in music_utils.TRACK_LAYOUT}
+                for col, (key, stem_data) in zip(st.columns(len(stem_files)), stem_files.items()):
+                    with col:
                         st.download_button(
-                            "📥 Télécharger MIDI",
-                            f.read(),
-                            file_name="composition.mid",
-                            mime="audio/midi",
+                            f"📥 {part_names.get(key, key)}",
+                            stem_data,
+                            file_name=f"composition_{key}.wav",
+                            mime="audio/wav",
                             width='stretch'
                         )
-                else:
-                    st.error("❌ Erreur: Export MIDI échoué")
-            with col_mp3:
-                mp3_path = result.get('mp3')
-                if mp3_path and mp3_path != "None" and os.path.isfile(mp3_path):
-                    try:
-                        with open(mp3_path, 'rb') as f:
-                            st.download_button(
-                                "📥 Télécharger MP3",
-                                f.read(),
-                                file_name="composition.mp3",
-                                mime="audio/mpeg",
-                                width='stretch'
-                            )
-                    except Exception as e:
-                        st.error(f"❌ Erreur lors de l'ouverture du fichier MP3: {e}")
-                else:
-                    st.warning("⚠️ Export MP3 non disponible (ffmpeg requis)")
             
             # JSON Debug
             with st.expander("🔍 Détails JSON (Debug)"):
@@ -619,7 +758,10 @@ with tab2:
         )
         
         if st.button("🔄 Mettre à jour Audio & Partition", width='stretch'):
-            updated = update_from_abc(abc_editor, instrument, use_reverb, use_delay, use_compression)
+            updated = update_from_abc(
+                abc_editor, instrument, use_reverb, use_delay, use_compression, reverb_mode,
+                ping_pong=ping_pong, stereo_width=stereo_width, sample_rate=sample_rate, fast_synth=fast_synth
+            )
             if updated:
                 st.session_state.composition.update(updated)
                 st.session_state.abc_content = abc_editor
@@ -671,7 +813,9 @@ with tab3:
     
     ### 5. Export
     - **MIDI**: Pour édition dans votre DAW
-    - **MP3**: Pour partage et écoute
+    - **MP3 / Ogg Opus**: Pour partage et écoute (Opus : plus compact à qualité égale)
+    - **FLAC**: Sans perte, pour archiver ou retravailler
+    - **Pistes séparées**: Mélodie, basse et accords en WAV, pour mixer vous-même
     
     ### 💡 Astuces
     - Le **cache** accélère les requêtes identiques
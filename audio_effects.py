@@ -1,50 +1,1461 @@
 """
 Audio effects processing for img2music.
-Provides reverb, delay, EQ, and compression effects.
+Provides reverb, delay, EQ, compression and stereo width effects.
+
+Public methods take and return audio in the interleaved layout produced by
+the synthesizer and WAV files, shape (N,) for mono or (N, channels). The
+kernels work on planar float32 arrays of shape (channels, N), where each
+channel is contiguous; the conversion happens once, at the chain boundary.
 """
+import os
+import wave
+import hashlib
+import tracemalloc
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
 import numpy as np
-from typing import Tuple
+
+from resampler import resample
+
+
+# Cache of precomputed impulse-response spectra, keyed by
+# (ir identity, sample rate, block size). Bounded to a handful of entries.
+_IR_SPECTRA_CACHE: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+_IR_SPECTRA_CACHE_SIZE = 16
+
+# Default 3-band EQ crossover frequencies (Hz)
+DEFAULT_EQ_CROSSOVERS = (250.0, 4000.0)
+
+# Lowest gain an EQ band can be set to (-60 dB), avoids log(0) in shelf design
+_MIN_EQ_GAIN = 1e-3
+
+
+def to_planar(audio: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Convert interleaved audio to the planar layout used by the effect kernels.
+    
+    Args:
+        audio: Audio of shape (N,) or (N, channels), any numeric dtype
+        out: Optional float32 array of shape (channels, N)
+    
+    Returns:
+        C-contiguous float32 audio of shape (channels, N)
+    """
+    frames = audio.reshape(len(audio), -1)
+    if out is None:
+        out = np.empty((frames.shape[1], len(frames)), dtype=np.float32)
+    np.copyto(out, frames.T, casting='unsafe')
+    return out
+
+
+def from_planar(planar: np.ndarray, shape: Tuple[int, ...], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Convert planar (channels, N) audio back to an interleaved shape.
+    
+    Args:
+        planar: Audio of shape (channels, N)
+        shape: Target shape, (N,) or (N, channels)
+        out: Optional contiguous float32 array of the target shape
+    
+    Returns:
+        Float32 audio of the target shape
+    """
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    np.copyto(out.reshape(shape[0], -1), planar.T)
+    return out
+
+
+def _delay_recursion(x: np.ndarray, y: np.ndarray, delay_samples: int, feedback: float, ping_pong: bool):
+    """
+    Fill ``y[..., d:]`` from ``y[..., :d]``, one block of ``d`` samples at a time.
+    
+    Every sample of a block only depends on the previous block, so each step
+    is a single array operation over all channels.
+    """
+    d = delay_samples
+    n = x.shape[-1]
+    if ping_pong:
+        scratch = np.empty(d, dtype=y.dtype)
+    for start in range(d, n, d):
+        stop = min(start + d, n)
+        cur, prev = slice(start, stop), slice(start - d, stop - d)
+        if ping_pong:
+            # Mono input enters left, echoes bounce L -> R -> L losing one feedback step per bounce
+            m = stop - start
+            np.add(x[0, prev], x[1, prev], out=y[0, cur])
+            y[0, cur] *= 0.5
+            np.multiply(y[1, prev], feedback, out=scratch[:m])
+            y[0, cur] += scratch[:m]
+            np.multiply(y[0, prev], feedback, out=y[1, cur])
+        else:
+            np.multiply(y[..., prev], feedback, out=y[..., cur])
+            y[..., cur] += x[..., prev]
+
+
+def feedback_delay(audio: np.ndarray, delay_samples: int, feedback: float,
+                   out: Optional[np.ndarray] = None, ping_pong: bool = False) -> np.ndarray:
+    """
+    Compute the wet signal of a feedback delay line.
+    
+    Implements ``delayed[i] = audio[i - d] + feedback * delayed[i - d]`` for
+    ``i >= d``. Every sample of a block of ``d`` samples only depends on the
+    previous block, so the recursion is evaluated one block at a time with a
+    single array operation per block instead of one Python step per sample.
+    
+    In ping-pong mode (stereo input only) the mono sum feeds the left line and
+    each line feeds the other one, so echoes alternate between the channels:
+    ``left[i] = mid[i - d] + feedback * right[i - d]``,
+    ``right[i] = feedback * left[i - d]``.
+    
+    Args:
+        audio: Input audio, shape (N,) or (channels, N); integer PCM is
+            processed as floating point on its own scale (int16 as float32)
+        delay_samples: Delay length in samples
+        feedback: Feedback amount
+        out: Optional preallocated floating-point output array with the same shape as audio
+        ping_pong: Cross-feed the two channels of a (2, N) input
+    
+    Returns:
+        Delayed (wet) signal, same shape as audio, float32 for float32 and
+        int16 input (np.result_type(audio.dtype, np.float32) in general)
+    """
+    # Echoes add up beyond the input range and are scaled by feedback: never in integers
+    audio = np.asarray(audio, dtype=np.result_type(audio.dtype, np.float32))
+    n = audio.shape[-1]
+    if out is None:
+        out = np.zeros_like(audio)
+    
+    if delay_samples <= 0:
+        # Zero delay: the recursion degenerates to the dry signal
+        out[...] = audio
+        return out
+    
+    out[..., :min(delay_samples, n)] = 0
+    ping_pong = ping_pong and audio.ndim == 2 and audio.shape[0] == 2
+    _delay_recursion(audio, out, delay_samples, feedback, ping_pong)
+    return out
+
+
+def stereo_width(audio: np.ndarray, width: float, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Mid/side stereo width control.
+    
+    The side signal ``(left - right) / 2`` is scaled by ``width`` while the mid
+    signal is kept: 0 folds to mono, 1 leaves the image unchanged and values
+    above 1 widen it. Input that is not stereo is copied unchanged.
+    
+    Args:
+        audio: Input audio, shape (channels, N)
+        width: Side gain (0.0 to 2.0)
+        out: Optional output array with the same shape as audio (may be audio itself)
+    
+    Returns:
+        Audio with the stereo width applied
+    """
+    if out is None:
+        out = np.empty_like(audio)
+    if audio.ndim != 2 or audio.shape[0] != 2:
+        if out is not audio:
+            out[...] = audio
+        return out
+    
+    side = np.subtract(audio[0], audio[1])
+    side *= 0.5 * width
+    np.add(audio[0], audio[1], out=out[0])
+    out[0] *= 0.5
+    np.subtract(out[0], side, out=out[1])
+    out[0] += side
+    return out
+
+
+def schroeder_taps(sample_rate: int, room_size: float, damping: float) -> Tuple[List[int], float]:
+    """
+    Tap delays (samples) and shared tap gain of the feed-forward Schroeder reverb.
+    """
+    delays = [int(int(sample_rate * d) * (0.5 + room_size * 0.5)) for d in [0.0297, 0.0371, 0.0411, 0.0437]]
+    return [d for d in delays if d > 0], 0.7 * (1 - damping)
+
+
+def load_impulse_response(path: str, sample_rate: int) -> np.ndarray:
+    """
+    Load an impulse response from a PCM WAV file.
+    
+    Args:
+        path: Path to a 16-bit or 32-bit PCM WAV file
+        sample_rate: Target sample rate; the IR is resampled if needed
+    
+    Returns:
+        Float32 impulse response, shape (N,) or (N, channels)
+    """
+    with wave.open(path, 'rb') as wf:
+        sr = wf.getframerate()
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        frames = wf.readframes(wf.getnframes())
+    
+    dtypes = {2: np.int16, 4: np.int32}
+    if width not in dtypes:
+        raise ValueError(f"Unsupported WAV sample width for impulse response: {width * 8} bits")
+    dtype = dtypes[width]
+    ir = np.frombuffer(frames, dtype=dtype).astype(np.float32) / np.iinfo(dtype).max
+    if channels > 1:
+        ir = ir.reshape(-1, channels)
+    
+    if sr != sample_rate and len(ir) > 1:
+        ir = resample(ir, sr, sample_rate)
+    
+    return ir
+
+
+def synthetic_impulse_response(sample_rate: int, decay_time: float = 1.5, damping: float = 0.5,
+                               channels: int = 2, seed: int = 0) -> np.ndarray:
+    """
+    Generate a synthetic room impulse response.
+    
+    Exponentially decaying noise reaching -60 dB after ``decay_time`` seconds.
+    Damping progressively crossfades towards low-passed noise so that high
+    frequencies die out faster than low ones, as in a real room.
+    
+    Args:
+        sample_rate: Sample rate in Hz
+        decay_time: RT60 decay time in seconds
+        damping: High frequency damping (0.0 to 1.0)
+        channels: 1 for mono, 2 for a decorrelated stereo IR
+        seed: Random seed (keeps the IR deterministic for caching)
+    
+    Returns:
+        Float32 impulse response, shape (N,) or (N, channels)
+    """
+    n = max(1, int(decay_time * sample_rate))
+    rng = np.random.default_rng(seed)
+    noise = rng.standard_normal((n, channels))
+    
+    # Low-passed copy of the noise (moving average over ~1 ms)
+    width = max(1, sample_rate // 1000)
+    kernel = np.ones(width) / width
+    smooth = np.stack([np.convolve(noise[:, c], kernel, mode='same') for c in range(channels)], axis=1)
+    smooth *= np.sqrt(width)  # Keep roughly the same energy as the raw noise
+    
+    t = np.arange(n) / sample_rate
+    blend = (damping * t / decay_time)[:, None]
+    envelope = np.exp(-6.9078 * t / decay_time)[:, None]  # ln(1000): -60 dB at decay_time
+    
+    ir = envelope * ((1.0 - blend) * noise + blend * smooth)
+    ir[0] = 1.0  # Direct path
+    ir /= np.sqrt(np.sum(ir ** 2, axis=0))
+    ir = ir.astype(np.float32)
+    
+    return ir[:, 0] if channels == 1 else ir
+
+
+def impulse_response_spectra(ir: np.ndarray, block_size: int) -> np.ndarray:
+    """
+    Split an impulse response into uniform partitions and FFT each of them.
+    
+    Args:
+        ir: Impulse response, shape (N,) or (N, channels) as returned by the loaders
+        block_size: Partition length in samples
+    
+    Returns:
+        Complex array of shape (channels, partitions, block_size + 1)
+    """
+    planar = to_planar(ir)
+    n_parts = -(-planar.shape[1] // block_size)
+    padded = np.zeros((planar.shape[0], n_parts * block_size), dtype=np.float32)
+    padded[:, :planar.shape[1]] = planar
+    parts = padded.reshape(planar.shape[0], n_parts, block_size)
+    return np.fft.rfft(parts, n=2 * block_size, axis=-1)
+
+
+def _cached_ir_spectra(key: tuple, loader, block_size: int) -> np.ndarray:
+    """Return IR spectra from the module cache, computing them on a miss."""
+    cache_key = key + (block_size,)
+    spectra = _IR_SPECTRA_CACHE.get(cache_key)
+    if spectra is not None:
+        _IR_SPECTRA_CACHE.move_to_end(cache_key)
+        return spectra
+    
+    spectra = impulse_response_spectra(loader(), block_size)
+    _IR_SPECTRA_CACHE[cache_key] = spectra
+    if len(_IR_SPECTRA_CACHE) > _IR_SPECTRA_CACHE_SIZE:
+        _IR_SPECTRA_CACHE.popitem(last=False)
+    return spectra
+
+
+def _match_ir_channels(spectra: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Match IR spectra to the audio channel count.
+    
+    A mono IR is shared by all channels, extra IR channels are dropped and an
+    IR with fewer channels than the audio is folded to mono.
+    """
+    ir_channels = spectra.shape[0]
+    if ir_channels in (1, channels):
+        return spectra
+    if channels > 1 and ir_channels > channels:
+        return spectra[:channels]
+    return spectra.mean(axis=0, keepdims=True)
+
+
+def partitioned_convolve(audio: np.ndarray, spectra: np.ndarray, block_size: int,
+                         out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Convolve audio with an impulse response using uniformly partitioned FFT convolution.
+    
+    The input is cut into blocks of ``block_size`` samples; each block spectrum is
+    multiplied with every IR partition spectrum and accumulated into the output
+    block it lands on (frequency-domain delay line), then overlap-added. Cost is
+    O(N log B + N * partitions) instead of O(N * IR length). All channels go
+    through the same batched FFTs.
+    
+    Args:
+        audio: Input audio, shape (N,) or (channels, N)
+        spectra: IR partition spectra from impulse_response_spectra()
+        block_size: Partition length the spectra were computed with
+        out: Optional output array with the same shape as audio
+    
+    Returns:
+        Wet signal truncated to the input length, same shape as audio
+    """
+    n = audio.shape[-1]
+    x = audio.reshape(-1, n)
+    channels = x.shape[0]
+    n_blocks = -(-n // block_size)
+    
+    padded = np.zeros((channels, n_blocks * block_size), dtype=np.float32)
+    padded[:, :n] = x
+    X = np.fft.rfft(padded.reshape(channels, n_blocks, block_size), n=2 * block_size, axis=-1)
+    
+    # Frequency-domain delay line: output block k sums X[k - p] * H[p]
+    h = _match_ir_channels(spectra, channels)
+    Y = np.zeros_like(X, dtype=np.result_type(X.dtype, h.dtype))
+    for p in range(min(h.shape[1], n_blocks)):
+        Y[:, p:] += X[:, :n_blocks - p] * h[:, p, None, :]
+    
+    y = np.fft.irfft(Y, n=2 * block_size, axis=-1)
+    
+    # Overlap-add: each block contributes to its own slot and the next one
+    wet = y[..., :block_size]
+    wet[:, 1:] += y[:, :-1, block_size:]
+    
+    if out is None:
+        out = np.empty(audio.shape, dtype=audio.dtype)
+    out_view = out.reshape(channels, n)
+    full = n // block_size
+    out_view[:, :full * block_size] = wet[:, :full].reshape(channels, -1)
+    out_view[:, full * block_size:] = wet[:, full, :n - full * block_size] if full < n_blocks else 0
+    return out
+
+
+@lru_cache(maxsize=32)
+def _fft_band_index(n: int, sample_rate: int, crossovers: Tuple[float, ...]) -> np.ndarray:
+    """Map every rfft bin of an n-sample signal to its EQ band index (cached)."""
+    freqs = np.fft.rfftfreq(n, 1 / sample_rate)
+    index = np.searchsorted(np.asarray(crossovers), freqs, side='right')
+    index.setflags(write=False)
+    return index
+
+
+def fft_band_gains(n: int, sample_rate: int, crossovers: Sequence[float], gains: Sequence[float]) -> np.ndarray:
+    """
+    Per-bin gain vector of a multi-band FFT EQ.
+    
+    Args:
+        n: Signal length in samples
+        sample_rate: Sample rate in Hz
+        crossovers: Ascending band edges in Hz
+        gains: Linear gain per band, len(crossovers) + 1 values
+    
+    Returns:
+        Gain for each of the n // 2 + 1 rfft bins
+    """
+    index = _fft_band_index(n, sample_rate, tuple(float(c) for c in crossovers))
+    return np.asarray(gains, dtype=np.float32)[index]
+
+
+def high_shelf_coefficients(freq: float, gain: float, sample_rate: int) -> Tuple[float, ...]:
+    """
+    RBJ cookbook high-shelf biquad (shelf slope S = 1).
+    
+    Returns:
+        Normalized coefficients (b0, b1, b2, a1, a2)
+    """
+    A = np.sqrt(max(gain, _MIN_EQ_GAIN))
+    w0 = 2 * np.pi * freq / sample_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / 2 * np.sqrt(2)
+    sqrt_a = 2 * np.sqrt(A) * alpha
+    
+    b0 = A * ((A + 1) + (A - 1) * cos_w0 + sqrt_a)
+    b1 = -2 * A * ((A - 1) + (A + 1) * cos_w0)
+    b2 = A * ((A + 1) + (A - 1) * cos_w0 - sqrt_a)
+    a0 = (A + 1) - (A - 1) * cos_w0 + sqrt_a
+    a1 = 2 * ((A - 1) - (A + 1) * cos_w0)
+    a2 = (A + 1) - (A - 1) * cos_w0 - sqrt_a
+    
+    return tuple(float(c) for c in (b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0))
+
+
+def peaking_coefficients(freq: float, gain: float, q: float, sample_rate: int) -> Tuple[float, ...]:
+    """
+    RBJ cookbook peaking biquad.
+    
+    Returns:
+        Normalized coefficients (b0, b1, b2, a1, a2)
+    """
+    A = np.sqrt(max(gain, _MIN_EQ_GAIN))
+    w0 = 2 * np.pi * freq / sample_rate
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    
+    b0 = 1 + alpha * A
+    b1 = -2 * cos_w0
+    b2 = 1 - alpha * A
+    a0 = 1 + alpha / A
+    a1 = -2 * cos_w0
+    a2 = 1 - alpha / A
+    
+    return tuple(float(c) for c in (b0 / a0, b1 / a0, b2 / a0, a1 / a0, a2 / a0))
+
+
+@lru_cache(maxsize=64)
+def _biquad_block_response(coeffs: Tuple[float, ...], block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Block response of a direct-form I biquad.
+    
+    Within a block of L samples the output is ``y = (h * x)[:L] + Z @ s`` where h
+    is the impulse response truncated to L samples and Z (L x 4) is the response
+    to each of the four state values s = (x[-1], x[-2], y[-1], y[-2]).
+    
+    Returns:
+        (rfft of h zero-padded to 2L, Z)
+    """
+    b0, b1, b2, a1, a2 = coeffs
+    L = block_size
+    
+    # Impulse response and zero-input responses, run once per filter/block size
+    h = np.zeros(L)
+    Z = np.zeros((L, 4))
+    for col, (x1, x2, y1, y2) in enumerate(((1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1))):
+        for n in range(L):
+            y = b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+            Z[n, col] = y
+            x1, x2, y1, y2 = 0, x1, y, y1
+    
+    x1 = x2 = y1 = y2 = 0.0
+    for n in range(L):
+        x0 = 1.0 if n == 0 else 0.0
+        y = b0 * x0 + b1 * x1 + b2 * x2 - a1 * y1 - a2 * y2
+        h[n] = y
+        x1, x2, y1, y2 = x0, x1, y, y1
+    
+    H = np.fft.rfft(h, n=2 * L)
+    H.setflags(write=False)
+    Z.setflags(write=False)
+    return H, Z
+
+
+class BiquadFilterBank:
+    """
+    Cascade of biquad sections processed block-wise with persistent state.
+    
+    Each section is evaluated a block at a time: the zero-state response of all
+    blocks is one batched FFT convolution, and only the four-value filter state
+    is carried from block to block. Calling process() repeatedly on consecutive
+    pieces of a signal gives the same result as one call on the whole signal.
+    """
+    
+    def __init__(self, sections: Sequence[Tuple[float, ...]], gain: float = 1.0, block_size: int = 1024):
+        """
+        Args:
+            sections: Normalized biquad coefficients (b0, b1, b2, a1, a2) per section
+            gain: Broadband gain applied after the cascade
+            block_size: Block length used for the block recursion
+        """
+        self.sections = [tuple(float(c) for c in s) for s in sections]
+        self.gain = gain
+        self.block_size = block_size
+        self.state: Optional[np.ndarray] = None  # (sections, channels, 4)
+    
+    @classmethod
+    def from_bands(cls, crossovers: Sequence[float], gains: Sequence[float], sample_rate: int,
+                   peaks: Sequence[Tuple[float, float, float]] = (), block_size: int = 1024) -> 'BiquadFilterBank':
+        """
+        Build a multi-band EQ from band edges and per-band gains.
+        
+        Band i gets gain ``gains[i]`` through a cascade of high shelves: the
+        shelf at ``crossovers[i]`` steps the gain from ``gains[i]`` to
+        ``gains[i + 1]``, and ``gains[0]`` is applied as broadband gain.
+        
+        Args:
+            crossovers: Ascending band edges in Hz
+            gains: Linear gain per band, len(crossovers) + 1 values
+            sample_rate: Sample rate in Hz
+            peaks: Extra peaking sections as (freq, gain, q) tuples
+            block_size: Block length used for the block recursion
+        """
+        if len(gains) != len(crossovers) + 1:
+            raise ValueError(f"Expected {len(crossovers) + 1} EQ gains for {len(crossovers)} crossovers, got {len(gains)}")
+        
+        gains = [max(float(g), _MIN_EQ_GAIN) for g in gains]
+        nyquist = sample_rate / 2
+        sections = [
+            high_shelf_coefficients(freq, gains[i + 1] / gains[i], sample_rate)
+            for i, freq in enumerate(crossovers)
+            if 0 < freq < nyquist and gains[i + 1] != gains[i]
+        ]
+        sections += [peaking_coefficients(freq, g, q, sample_rate) for freq, g, q in peaks if 0 < freq < nyquist]
+        
+        return cls(sections, gain=gains[0], block_size=block_size)
+    
+    def reset(self):
+        """Clear the filter state."""
+        self.state = None
+    
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Filter the next piece of the signal.
+        
+        Args:
+            audio: Input audio, shape (N,) or (channels, N)
+        
+        Returns:
+            Filtered audio (float64), same shape as audio
+        """
+        n = audio.shape[-1]
+        x = audio.reshape(-1, n).astype(np.float64)
+        channels = x.shape[0]
+        if self.state is None or self.state.shape[1] != channels:
+            self.state = np.zeros((len(self.sections), channels, 4))
+        
+        for i, coeffs in enumerate(self.sections):
+            x = self._process_section(x, coeffs, self.state[i])
+        
+        if self.gain != 1.0:
+            x *= self.gain
+        return x.reshape(audio.shape)
+    
+    def _process_section(self, x: np.ndarray, coeffs: Tuple[float, ...], state: np.ndarray) -> np.ndarray:
+        """Run one biquad over x (channels, N), updating state (channels, 4) in place."""
+        channels, n = x.shape
+        if n == 0:
+            return x
+        L = self.block_size
+        H, Z = _biquad_block_response(coeffs, L)
+        n_blocks = -(-n // L)
+        
+        padded = np.zeros((channels, n_blocks * L))
+        padded[:, :n] = x
+        blocks = padded.reshape(channels, n_blocks, L)
+        
+        # Zero-state response of every block of every channel at once
+        zs = np.fft.irfft(np.fft.rfft(blocks, n=2 * L, axis=-1) * H, n=2 * L, axis=-1)[..., :L]
+        
+        # Carry the state across blocks; only the last two outputs are needed
+        starts = np.empty((channels, n_blocks, 4))
+        s = state.copy()
+        Z_tail = Z[-2:].T
+        for k in range(n_blocks):
+            starts[:, k] = s
+            y_tail = zs[:, k, -2:] + s @ Z_tail
+            s = np.stack([blocks[:, k, -1], blocks[:, k, -2], y_tail[:, 1], y_tail[:, 0]], axis=1)
+        
+        zs += starts @ Z.T
+        y = zs.reshape(channels, n_blocks * L)[:, :n]
+        
+        # Final state from the true (unpadded) end of the signal
+        x_hist = np.concatenate([state[:, 1::-1], x[:, -2:]], axis=1)
+        y_hist = np.concatenate([state[:, :1:-1], y[:, -2:]], axis=1)
+        state[:] = np.stack([x_hist[:, -1], x_hist[:, -2], y_hist[:, -1], y_hist[:, -2]], axis=1)
+        
+        return y
+
+
+@lru_cache(maxsize=16)
+def _one_pole_block_response(coeff: float, block_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Block response of the smoother ``e[n] = a * e[n-1] + (1 - a) * u[n]``.
+    
+    Within a block of L samples ``e = u @ T + a**(n + 1) * e[-1]``.
+    
+    Returns:
+        (T, L x L input response matrix; decay, a**(n + 1) for n in 0..L-1)
+    """
+    n = np.arange(block_size)
+    lag = n[None, :] - n[:, None]  # T[j, i] weights u[j] in e[i]
+    T = np.where(lag >= 0, (1 - coeff) * coeff ** np.maximum(lag, 0), 0.0)
+    decay = coeff ** (n + 1.0)
+    T.setflags(write=False)
+    decay.setflags(write=False)
+    return T, decay
+
+
+class Compressor:
+    """
+    Feed-forward compressor with attack/release envelope, soft knee and lookahead.
+    
+    The envelope detector smooths the (linked) sidechain level with a one-pole
+    filter whose coefficient switches between attack and release. The
+    recursion is evaluated in short blocks: the response to the block input is
+    a single matrix product for all blocks, and only the last envelope value is
+    propagated block to block, choosing attack when the block level exceeds the
+    running envelope and release otherwise. In RMS mode the squared signal is
+    first averaged over ``rms_window`` so that this per-block choice closely
+    follows a per-sample one. Detector state and lookahead buffer are kept
+    between process() calls, so a stream can be compressed block by block.
+    """
+    
+    def __init__(
+        self,
+        sample_rate: int,
+        threshold: float = 0.5,
+        ratio: float = 4.0,
+        attack: float = 0.005,
+        release: float = 0.1,
+        knee_db: float = 6.0,
+        lookahead: float = 0.0,
+        detector: str = 'rms',
+        makeup_gain: Optional[float] = None,
+        rms_window: float = 0.01,
+        block_size: int = 32
+    ):
+        """
+        Args:
+            sample_rate: Sample rate in Hz
+            threshold: Compression threshold (0.0 to 1.0, linear)
+            ratio: Compression ratio (1.0 to 20.0)
+            attack: Attack time in seconds
+            release: Release time in seconds
+            knee_db: Soft knee width in dB (0 for a hard knee)
+            lookahead: Lookahead time in seconds (adds the same latency)
+            detector: 'rms' or 'peak'
+            makeup_gain: Linear make-up gain; derived from the ratio if None
+            rms_window: RMS averaging time in seconds
+            block_size: Envelope recursion block length in samples
+        """
+        if detector not in ('rms', 'peak'):
+            raise ValueError(f"Unknown compressor detector: {detector}")
+        
+        self.sr = sample_rate
+        self.threshold_db = 20 * np.log10(max(threshold, 1e-6))
+        self.ratio = max(ratio, 1.0)
+        self.knee_db = max(knee_db, 0.0)
+        self.detector = detector
+        self.makeup_gain = (
+            makeup_gain if makeup_gain is not None
+            else 1.0 / (1.0 - (1.0 - 1.0 / self.ratio) * 0.5)
+        )
+        self.block_size = block_size
+        self.lookahead_samples = int(round(lookahead * sample_rate))
+        self.attack_coeff = float(np.exp(-1.0 / max(attack * sample_rate, 1e-9)))
+        self.release_coeff = float(np.exp(-1.0 / max(release * sample_rate, 1e-9)))
+        self.rms_coeff = float(np.exp(-1.0 / max(rms_window * sample_rate, 1e-9)))
+        self.reset()
+    
+    def reset(self):
+        """Clear the detector state and lookahead buffer."""
+        self.envelope = 0.0
+        self._mean_square = 0.0
+        self._delay_line: Optional[np.ndarray] = None
+    
+    @property
+    def latency(self) -> int:
+        """Output latency in samples introduced by the lookahead."""
+        return self.lookahead_samples
+    
+    def envelope_of(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Run the envelope detector over the next piece of the signal.
+        
+        Args:
+            audio: Input audio, shape (N,) or (channels, N)
+        
+        Returns:
+            Envelope in the detector domain (mean square for 'rms',
+            absolute value for 'peak'), shape (N,)
+        """
+        n = audio.shape[-1]
+        x = audio.reshape(-1, n)
+        if self.detector == 'rms':
+            u = np.mean(np.square(x, dtype=np.float64), axis=0)
+        else:
+            u = np.max(np.abs(x), axis=0).astype(np.float64)
+        
+        L = self.block_size
+        n_blocks = -(-n // L)
+        padded = np.zeros(n_blocks * L)
+        padded[:n] = u
+        blocks = padded.reshape(n_blocks, L)
+        
+        if self.detector == 'rms':
+            blocks = self._smooth_mean_square(blocks, n)
+        
+        T_att, d_att = _one_pole_block_response(self.attack_coeff, L)
+        T_rel, d_rel = _one_pole_block_response(self.release_coeff, L)
+        zs_att = blocks @ T_att
+        zs_rel = blocks @ T_rel
+        
+        # Propagate the envelope block to block (scalar work only)
+        rising = (blocks.max(axis=1)).tolist()
+        last_att = zs_att[:, -1].tolist()
+        last_rel = zs_rel[:, -1].tolist()
+        da, dr = float(d_att[-1]), float(d_rel[-1])
+        starts = np.empty(n_blocks)
+        attack = np.empty(n_blocks, dtype=bool)
+        e = self.envelope
+        for k in range(n_blocks):
+            starts[k] = e
+            attack[k] = rising[k] > e
+            e = last_att[k] + da * e if attack[k] else last_rel[k] + dr * e
+        
+        env = np.where(attack[:, None], zs_att + starts[:, None] * d_att, zs_rel + starts[:, None] * d_rel)
+        env = env.reshape(-1)[:n]
+        if n:
+            self.envelope = float(env[-1])
+        return env
+    
+    def _smooth_mean_square(self, blocks: np.ndarray, n: int) -> np.ndarray:
+        """Linear one-pole average of the squared signal, blocks of shape (K, L)."""
+        T, decay = _one_pole_block_response(self.rms_coeff, self.block_size)
+        zs = blocks @ T
+        
+        last = zs[:, -1].tolist()
+        d = float(decay[-1])
+        starts = np.empty(len(blocks))
+        m = self._mean_square
+        for k in range(len(blocks)):
+            starts[k] = m
+            m = last[k] + d * m
+        
+        smoothed = zs + starts[:, None] * decay
+        if n:
+            self._mean_square = float(smoothed.reshape(-1)[n - 1])
+        return smoothed
+    
+    def gain_db(self, env: np.ndarray) -> np.ndarray:
+        """Soft-knee static curve: gain reduction in dB for a detector envelope."""
+        if self.detector == 'rms':
+            level_db = 10 * np.log10(np.maximum(env, 1e-12))
+        else:
+            level_db = 20 * np.log10(np.maximum(env, 1e-6))
+        
+        over = level_db - self.threshold_db
+        slope = 1.0 / self.ratio - 1.0
+        W = self.knee_db
+        if W > 0:
+            in_knee = np.clip(over + W / 2, 0.0, W)
+            # Quadratic inside the knee, linear above it
+            return np.where(over >= W / 2, slope * over, slope * in_knee ** 2 / (2 * W))
+        return slope * np.maximum(over, 0.0)
+    
+    def linear_gain(self, env: np.ndarray) -> np.ndarray:
+        """Linear gain (make-up included) for a detector envelope, as float32."""
+        gain = self.gain_db(env)
+        gain *= 1 / 20
+        np.power(10.0, gain, out=gain)
+        gain *= self.makeup_gain
+        return gain.astype(np.float32)
+    
+    def process_offline(self, audio: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Compress a complete signal with the lookahead latency compensated.
+        
+        Instead of delaying the audio, the gain computed ``latency`` samples
+        ahead is applied to each sample, so the output is aligned with the
+        input and no delay buffer is needed.
+        
+        Args:
+            audio: Input audio, shape (N,) or (channels, N)
+            out: Optional output array with the same shape as audio (may be audio itself)
+        
+        Returns:
+            Compressed audio
+        """
+        env = self.envelope_of(audio)
+        D = self.lookahead_samples
+        if D:
+            env = np.concatenate([env[D:], self.envelope_of(np.zeros(min(D, audio.shape[-1]), dtype=np.float32))])
+        gain = self.linear_gain(env)
+        
+        if out is None:
+            out = np.empty(audio.shape, dtype=np.float32)
+        # One gain curve for all channels (linked stereo), broadcast along the rows
+        return np.multiply(audio, gain, out=out)
+    
+    def process(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Compress the next piece of the signal.
+        
+        With lookahead, the output is delayed by ``latency`` samples relative
+        to the input so that the gain reacts before transients arrive.
+        
+        Args:
+            audio: Input audio, shape (N,) or (channels, N)
+        
+        Returns:
+            Compressed audio (float32), same shape as audio
+        """
+        gain = self.linear_gain(self.envelope_of(audio))
+        
+        D = self.lookahead_samples
+        if D:
+            n = audio.shape[-1]
+            x = audio.reshape(-1, n)
+            if self._delay_line is None or self._delay_line.shape[0] != x.shape[0]:
+                self._delay_line = np.zeros((x.shape[0], D), dtype=np.float32)
+            delayed = np.concatenate([self._delay_line, x], axis=1)
+            self._delay_line = delayed[:, n:].copy()
+            delayed = delayed[:, :n].reshape(audio.shape)
+        else:
+            delayed = audio
+        
+        return (delayed * gain).astype(np.float32, copy=False)
+
+
+class FeedbackDelayLine:
+    """
+    Streaming feedback delay with dry/wet mix.
+    
+    Keeps the last ``delay_samples`` input and wet samples, so consecutive
+    blocks give the same result as feedback_delay() on the whole signal.
+    """
+    
+    def __init__(self, delay_samples: int, feedback: float, mix: float, ping_pong: bool = False):
+        self.delay_samples = max(int(delay_samples), 0)
+        self.feedback = feedback
+        self.mix = mix
+        self.ping_pong = ping_pong
+        self._x_hist: Optional[np.ndarray] = None
+        self._y_hist: Optional[np.ndarray] = None
+    
+    def reset(self):
+        """Clear the delay line."""
+        self._x_hist = self._y_hist = None
+    
+    @property
+    def tail_samples(self) -> int:
+        """Samples until the echoes decay below -60 dB (capped at 60 repeats)."""
+        if self.feedback <= 0:
+            return self.delay_samples
+        repeats = np.ceil(np.log(1e-3) / np.log(min(abs(self.feedback), 0.999)))
+        return self.delay_samples * int(min(repeats, 60) + 1)
+    
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Process a block of shape (channels, B)."""
+        d = self.delay_samples
+        if d == 0:
+            return block.copy()
+        
+        channels, n = block.shape
+        if self._x_hist is None or self._x_hist.shape[0] != channels:
+            self._x_hist = np.zeros((channels, d), dtype=np.float32)
+            self._y_hist = np.zeros((channels, d), dtype=np.float32)
+        
+        xx = np.concatenate([self._x_hist, block], axis=1)
+        yy = np.empty_like(xx)
+        yy[:, :d] = self._y_hist
+        _delay_recursion(xx, yy, d, self.feedback, self.ping_pong and channels == 2)
+        
+        self._x_hist = xx[:, -d:].copy()
+        self._y_hist = yy[:, -d:].copy()
+        
+        wet = yy[:, d:]
+        wet *= self.mix
+        wet += block * (1 - self.mix)
+        return wet
+
+
+class PartitionedConvolver:
+    """
+    Streaming uniformly partitioned convolution.
+    
+    Holds a frequency-domain delay line of the last input block spectra and
+    the overlap from the previous block, so each call costs one forward FFT,
+    one inverse FFT and a multiply-accumulate over the IR partitions.
+    """
+    
+    def __init__(self, spectra: np.ndarray, block_size: int, mix: float = 1.0):
+        """
+        Args:
+            spectra: IR partition spectra from impulse_response_spectra()
+            block_size: Partition length the spectra were computed with
+            mix: Dry/wet mix (1.0 outputs the wet signal only)
+        """
+        self.spectra = spectra
+        self.block_size = block_size
+        self.mix = mix
+        self.reset()
+    
+    def reset(self):
+        """Clear the delay line and overlap buffer."""
+        self._fdl: Optional[np.ndarray] = None
+        self._overlap: Optional[np.ndarray] = None
+        self._pos = 0
+    
+    @property
+    def tail_samples(self) -> int:
+        """Length of the impulse response (rounded up to whole partitions)."""
+        return self.spectra.shape[1] * self.block_size
+    
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Process exactly ``block_size`` samples, shape (channels, block_size)."""
+        B = self.block_size
+        P = self.spectra.shape[1]
+        channels = block.shape[0]
+        if self._fdl is None or self._fdl.shape[1] != channels:
+            dtype = np.result_type(self.spectra.dtype, np.complex64)
+            self._fdl = np.zeros((P, channels, B + 1), dtype=dtype)
+            self._overlap = np.zeros((channels, B), dtype=np.float32)
+            self._pos = 0
+            # Partition-major so the delay line and the IR line up along axis 0
+            self._h = np.ascontiguousarray(_match_ir_channels(self.spectra, channels).transpose(1, 0, 2))
+        
+        self._fdl[self._pos] = np.fft.rfft(block, n=2 * B, axis=-1)
+        order = (self._pos - np.arange(P)) % P
+        Y = np.sum(self._fdl[order] * self._h, axis=0)
+        y = np.fft.irfft(Y, n=2 * B, axis=-1)
+        self._pos = (self._pos + 1) % P
+        
+        wet = y[:, :B] + self._overlap
+        self._overlap[:] = y[:, B:]
+        
+        if self.mix != 1.0:
+            wet *= self.mix
+            wet += block * (1 - self.mix)
+        return wet.astype(np.float32, copy=False)
+
+
+class StereoWidener:
+    """Streaming wrapper of stereo_width() (stateless)."""
+    
+    def __init__(self, width: float):
+        self.width = width
+    
+    def reset(self):
+        """Nothing to clear."""
+    
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Process a block of shape (channels, B) in place."""
+        return stereo_width(block, self.width, out=block)
+
+
+class EffectsChainStream:
+    """
+    Block-streaming version of AudioEffects.apply_effects_chain().
+    
+    Feed consecutive blocks of ``block_size`` samples to process() (only the
+    last block may be shorter), then drain flush() for the remaining latency
+    and effect tails. Delay lines, reverb tails, EQ filter state and the
+    compressor envelope are carried across blocks, so memory stays
+    O(block size + longest tail) whatever the clip length.
+    
+    Blocks are interleaved, shape (B,) or (B, channels), and are processed
+    planar internally like the offline chain.
+    
+    Differences with the offline chain:
+    - output is delayed by ``latency`` samples (compressor lookahead);
+    - EQ always uses the biquad filter bank, the FFT mode needs the whole signal;
+    - there is no final peak normalization (the global peak is unknown),
+      ``output_gain`` is applied instead.
+    With those accounted for, the stream matches
+    ``apply_effects_chain(..., eq_mode='biquad', normalize=False)``.
+    """
+    
+    def __init__(self, effects: 'AudioEffects', block_size: int = 4096, output_gain: float = 1.0,
+                 use_reverb: bool = False, use_delay: bool = False, use_eq: bool = False,
+                 use_compression: bool = True, use_width: bool = False, **effect_params):
+        """
+        Args:
+            effects: AudioEffects instance (sample rate and IR cache)
+            block_size: Samples per block
+            output_gain: Gain applied to every output block
+            use_reverb, use_delay, use_eq, use_compression, use_width, **effect_params:
+                Same as AudioEffects.apply_effects_chain()
+        """
+        self.sr = effects.sr
+        self.block_size = block_size
+        self.output_gain = output_gain
+        self.latency = 0
+        self.tail_samples = 0
+        self._stages = []
+        self._finished = False
+        self._pending: Optional[np.ndarray] = None
+        
+        stages = effects.chain_stages(use_reverb, use_delay, use_eq, use_compression, use_width, **effect_params)
+        for name, params in stages:
+            if name == 'eq':
+                gains = params['gains'] or (params['low_gain'], params['mid_gain'], params['high_gain'])
+                stage = BiquadFilterBank.from_bands(params['crossovers'], gains, self.sr)
+            elif name == 'compression':
+                stage = Compressor(self.sr, **params)
+                self.latency += stage.latency
+            elif name == 'delay':
+                stage = FeedbackDelayLine(int(params['delay_time'] * self.sr), params['feedback'],
+                                          params['mix'], ping_pong=params['ping_pong'])
+                self.tail_samples += stage.tail_samples
+            elif name == 'width':
+                stage = StereoWidener(params['width'])
+            else:
+                stage = self._reverb_stage(effects, **params)
+                self.tail_samples += stage.tail_samples
+            self._stages.append(stage)
+    
+    def _reverb_stage(self, effects: 'AudioEffects', room_size: float, damping: float, mode: str,
+                      impulse_response: Optional[Union[str, np.ndarray]], mix: float) -> PartitionedConvolver:
+        """Reverb as a streaming convolution (the Schroeder taps form a short IR)."""
+        if mode == 'convolution':
+            spectra = effects._ir_spectra(room_size, damping, impulse_response, self.block_size)
+            return PartitionedConvolver(spectra, self.block_size, mix=mix)
+        if mode != 'schroeder':
+            raise ValueError(f"Unknown reverb mode: {mode}")
+        
+        delays, gain = schroeder_taps(self.sr, room_size, damping)
+        ir = np.zeros(max(delays, default=0) + 1, dtype=np.float32)
+        ir[0] = 1.0
+        for delay in delays:
+            ir[delay] += gain
+        return PartitionedConvolver(impulse_response_spectra(ir, self.block_size), self.block_size)
+    
+    def reset(self):
+        """Clear all stage state to start a new stream."""
+        for stage in self._stages:
+            stage.reset()
+        self._finished = False
+        self._pending = None
+    
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        Process the next block.
+        
+        Args:
+            block: Audio block, shape (B,) or (B, channels), B <= block_size.
+                Only the final block of a stream may be shorter than block_size.
+        
+        Returns:
+            Processed block (float32), same shape as block
+        """
+        n = len(block)
+        if n > self.block_size:
+            raise ValueError(f"Block of {n} samples exceeds block_size={self.block_size}")
+        if self._finished:
+            raise ValueError("Stream already received its final (short) block; call reset() first")
+        if n < self.block_size:
+            self._finished = True
+        
+        frames = block.reshape(n, -1)
+        x = np.zeros((frames.shape[1], self.block_size), dtype=np.float32)
+        x[:, :n] = frames.T
+        for stage in self._stages:
+            x = stage.process(x)
+        x = x.astype(np.float32, copy=False)
+        if self.output_gain != 1.0:
+            x *= self.output_gain
+        
+        if n < self.block_size:
+            # The padding already carries the start of the tail: keep it for flush()
+            self._pending = x[:, n:]
+        return from_planar(x[:, :n], block.shape)
+    
+    def flush(self, channels: int = 2) -> Iterator[np.ndarray]:
+        """
+        Yield the remaining output: lookahead latency plus effect tails.
+        
+        Args:
+            channels: Channel count of the stream (1 for mono)
+        """
+        remaining = self.latency + self.tail_samples
+        if self._pending is not None:
+            pending = self._pending[:, :remaining]
+            self._pending = None
+            remaining -= pending.shape[1]
+            if pending.shape[1]:
+                n = pending.shape[1]
+                yield from_planar(pending, (n, channels) if channels > 1 else (n,))
+        
+        self._finished = False
+        while remaining > 0:
+            n = min(self.block_size, remaining)
+            block = np.zeros((n, channels) if channels > 1 else (n,), dtype=np.float32)
+            yield self.process(block)
+            remaining -= n
+    
+    def process_stream(self, blocks: Iterable[np.ndarray]) -> Iterator[np.ndarray]:
+        """Process an iterable of blocks, then yield the flushed tail."""
+        channels = 1
+        for block in blocks:
+            channels = block.shape[1] if block.ndim > 1 else 1
+            yield self.process(block)
+        yield from self.flush(channels)
+
+
+class EffectsChainSplicer:
+    """
+    Incremental version of AudioEffects.apply_effects_chain() for a signal edited in places.
+    
+    render() runs the whole chain once, keeping the dry input and the
+    un-normalized output with its effect tails. splice() takes the edited
+    signal and the ranges where it changed, and reprocesses only those: the
+    short-memory stages at the head of the chain (biquad EQ, compressor) run
+    on the old and the new input of each range, padded with their pre-roll
+    and look-ahead, and the difference is passed through the linear stages
+    (delay, reverb, width) and added to the kept output, tails included.
+    The work follows the length of the edit rather than of the signal, and
+    the result matches a full run to float32 precision, up to the warm-up
+    approximation the chunked chain already makes.
+    
+    A chain with the FFT EQ, which filters the whole signal at once, is
+    rendered in full on every splice.
+    """
+    
+    # Segment starts stay on the compressor's envelope block grid
+    _GRID = 32
+    
+    def __init__(self, effects: 'AudioEffects', **chain_params):
+        """
+        Args:
+            effects: AudioEffects instance (sample rate, IR cache and thread pool)
+            **chain_params: use_* flags and effect parameters, as for apply_effects_chain()
+        """
+        self.effects = effects
+        stages = effects.chain_stages(**chain_params)
+        head = 0
+        while head < len(stages) and (
+            stages[head][0] == 'compression' or (stages[head][0] == 'eq' and stages[head][1]['mode'] == 'biquad')
+        ):
+            head += 1
+        self._head, self._linear = stages[:head], stages[head:]
+        self.supported = all(name in ('delay', 'reverb', 'width') for name, _ in self._linear)
+        
+        margins = [effects._stage_warmup(name, params) for name, params in self._head]
+        self._before = sum(before for before, _ in margins)
+        self._after = sum(after for _, after in margins)
+        self.tail_samples = sum(
+            effects._stage_tail(name, params) for name, params in self._linear if name != 'width'
+        ) if self.supported else 0
+        
+        self._dry: Optional[np.ndarray] = None  # Planar (channels, N)
+        self._wet: Optional[np.ndarray] = None  # Planar (channels, N + tail_samples), not normalized
+        self.last_processed_samples = 0
+    
+    def _run(self, stages: List[Tuple[str, Dict[str, Any]]], audio: np.ndarray) -> np.ndarray:
+        """Run stages over a planar float32 array (used as scratch) and return the output."""
+        src, dst = audio, np.empty_like(audio)
+        for name, params in stages:
+            self.effects._run_stage(name, src, dst, params)
+            src, dst = dst, src
+        return src
+    
+    @staticmethod
+    def _window(planar: np.ndarray, start: int, stop: int) -> np.ndarray:
+        """Copy of planar[:, start:stop], zero-padded past the end of the signal."""
+        out = np.zeros((planar.shape[0], stop - start), dtype=np.float32)
+        available = max(min(stop, planar.shape[1]) - start, 0)
+        out[:, :available] = planar[:, start:start + available]
+        return out
+    
+    def _output(self, shape: Tuple[int, ...]) -> np.ndarray:
+        """Normalized output in the caller's layout."""
+        planar = self._wet[:, :shape[0]].copy()
+        if self._head or self._linear:
+            self.effects._normalize(planar)
+        return from_planar(planar, shape)
+    
+    def render(self, audio: np.ndarray) -> np.ndarray:
+        """
+        Run the whole chain and keep its state for later splices.
+        
+        Args:
+            audio: Dry signal, shape (N,) or (N, channels)
+        
+        Returns:
+            Processed audio, float32 in the input layout, peak-normalized
+        """
+        n = len(audio)
+        self._dry = to_planar(audio)
+        padded = np.zeros((self._dry.shape[0], n + self.tail_samples), dtype=np.float32)
+        padded[:, :n] = self._dry
+        self._wet = self._run(self._head + self._linear, padded)
+        self.last_processed_samples = padded.shape[1]
+        return self._output(audio.shape)
+    
+    def splice(self, audio: np.ndarray, ranges: Sequence[Tuple[int, int]]) -> np.ndarray:
+        """
+        Update the output for an edited dry signal.
+        
+        Args:
+            audio: New dry signal, same channel count as the previous one
+            ranges: (start, stop) sample ranges; outside them audio equals the previous dry signal
+        
+        Returns:
+            Processed audio, as render()
+        """
+        frames = audio.reshape(len(audio), -1)
+        if not self.supported or self._dry is None or frames.shape[1] != self._dry.shape[0]:
+            return self.render(audio)
+        
+        n, old_n = len(frames), self._dry.shape[1]
+        channels = frames.shape[1]
+        old_dry, dry, wet = self._dry, self._dry, self._wet
+        if n != old_n:
+            ranges = list(ranges) + [(min(n, old_n), max(n, old_n))]
+            dry = self._window(old_dry, 0, n)
+            wet = self._window(self._wet, 0, n + self.tail_samples)
+        
+        # Ranges whose head-stage outputs overlap are processed together
+        merged = []
+        for start, stop in sorted(ranges):
+            if merged and start - self._after - self._GRID < merged[-1][1] + self._before:
+                merged[-1][1] = max(merged[-1][1], stop)
+            elif stop > start:
+                merged.append([start, stop])
+        
+        processed = 0
+        for start, stop in merged:
+            start, stop = max(start, 0), min(stop, max(n, old_n))
+            # Head outputs change over [first, last); computing them needs the input over [seg_start, seg_stop)
+            first, last = max(start - self._after, 0), min(stop + self._before, max(n, old_n))
+            if last <= first:
+                continue
+            seg_start = max(first - self._before, 0) // self._GRID * self._GRID
+            seg_stop = last + self._after
+            new_seg = np.zeros((channels, seg_stop - seg_start), dtype=np.float32)
+            available = max(min(seg_stop, n) - seg_start, 0)
+            to_planar(frames[seg_start:seg_start + available], out=new_seg[:, :available])
+            
+            new_head = self._run(self._head, new_seg)[:, first - seg_start:last - seg_start]
+            old_head = self._run(self._head, self._window(old_dry, seg_start, seg_stop))[:, first - seg_start:last - seg_start]
+            
+            diff = np.zeros((channels, last - first + self.tail_samples), dtype=np.float32)
+            np.subtract(new_head, old_head, out=diff[:, :last - first])
+            diff = self._run(self._linear, diff)
+            end = min(first + diff.shape[1], wet.shape[1])
+            wet[:, first:end] += diff[:, :end - first]
+            
+            if start < n:
+                to_planar(frames[start:min(stop, n)], out=dry[:, start:min(stop, n)])
+            processed += 2 * (seg_stop - seg_start) + diff.shape[1]
+        
+        self._dry, self._wet = dry, wet
+        self.last_processed_samples = processed
+        return self._output(audio.shape)
+
+
+class StageResultCache:
+    """
+    LRU cache of effect stage outputs under a memory budget.
+    
+    Entries are read-only float32 arrays keyed by a digest of the chain input
+    and every stage parameter up to and including the cached stage.
+    """
+    
+    def __init__(self, max_bytes: int = 128 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: Memory budget for cached stage outputs
+        """
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Return the cached output for key, refreshing its recency."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+    
+    def put(self, key: str, audio: np.ndarray) -> int:
+        """
+        Store a copy of a stage output, evicting least recently used entries.
+        
+        Returns:
+            Bytes allocated for the copy (0 if it does not fit the budget)
+        """
+        if audio.nbytes > self.max_bytes or key in self._entries:
+            return 0
+        
+        entry = audio.copy()
+        entry.setflags(write=False)
+        self._entries[key] = entry
+        self.current_bytes += entry.nbytes
+        while self.current_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+        return entry.nbytes
+    
+    def clear(self):
+        """Drop all cached outputs."""
+        self._entries.clear()
+        self.current_bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        return {
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def _param_token(value: Any, is_path: bool = False) -> str:
+    """
+    Stable text token for a stage parameter: arrays by content, the file named by
+    an impulse_response path (is_path) by the same identity as the IR spectra cache,
+    anything else literally.
+    """
+    if isinstance(value, np.ndarray):
+        return 'array:' + hashlib.blake2b(np.ascontiguousarray(value).tobytes(), digest_size=16).hexdigest()
+    if is_path and isinstance(value, str):
+        stat = os.stat(value)
+        return f"file:{os.path.abspath(value)}:{stat.st_mtime_ns}:{stat.st_size}"
+    if isinstance(value, (list, tuple)):
+        return '(' + ','.join(_param_token(v) for v in value) + ')'
+    return repr(value)
 
 
 class AudioEffects:
-    """Audio effects processor."""
+    """
+    Audio effects processor.
+    
+    Every effect is implemented as ``_<effect>_into(src, dst)``, writing the
+    processed signal into ``dst`` and free to use ``src`` as scratch space.
+    Kernels see planar (channels, N) float32 arrays and process all channels
+    in the same array operations. The public ``apply_*`` methods wrap one
+    stage and peak-normalize its result, in the caller's layout;
+    apply_effects_chain() runs the enabled stages back and forth between two
+    float32 scratch buffers owned by the instance and normalizes once at the end.
+    
+    The chain is an ordered list of stages (see chain_stages()). Each stage
+    output is cached under a key chaining the input content hash with the
+    parameters of every stage so far, so toggling the last effect reuses the
+    cached output of all the stages before it.
+    
+    With ``workers > 1``, signals longer than two chunks are split into
+    chunks processed on a thread pool (NumPy releases the GIL in FFTs, BLAS
+    and large ufuncs). The reverb convolves each chunk with its tail and
+    overlap-adds the results; stages with short memory (biquad EQ, compressor)
+    process each chunk with a warm-up pre-roll that is discarded. The FFT EQ
+    filters the whole signal at once and stays serial, and so does the delay:
+    its feedback tail can span the whole track, so padded chunks would redo
+    most of the recursion while the serial block recursion is already cheap.
+    """
     
-    def __init__(self, sample_rate: int = 44100):
+    def __init__(self, sample_rate: int = 44100, cache_bytes: int = 128 * 1024 * 1024,
+                 workers: int = 1, chunk_seconds: float = 4.0):
+        """
+        Args:
+            sample_rate: Sample rate in Hz
+            cache_bytes: Memory budget of the stage result cache (0 disables it)
+            workers: Threads used to process chunks of long signals (1 = serial)
+            chunk_seconds: Chunk length for parallel processing
+        """
         self.sr = sample_rate
+        self._scratch = [np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32)]
+        self.stage_cache = StageResultCache(cache_bytes) if cache_bytes > 0 else None
+        self.workers = max(int(workers), 1)
+        self.chunk_seconds = chunk_seconds
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._rate_siblings: Dict[int, 'AudioEffects'] = {}
+        self.last_chain_stats: Dict[str, Any] = {}
+    
+    def at_sample_rate(self, sample_rate: int) -> 'AudioEffects':
+        """
+        Processor for audio at another sample rate.
+        
+        The sibling shares the stage cache and thread pool of this instance
+        (cache keys include the rate) and is created once per rate.
+        """
+        if sample_rate == self.sr:
+            return self
+        sibling = self._rate_siblings.get(sample_rate)
+        if sibling is None:
+            sibling = AudioEffects(sample_rate, cache_bytes=0, workers=self.workers, chunk_seconds=self.chunk_seconds)
+            sibling.stage_cache = self.stage_cache
+            sibling._pool = self._executor() if self.workers > 1 else None
+            self._rate_siblings[sample_rate] = sibling
+        return sibling
+    
+    # --- Buffers and normalization ---
+    
+    def _scratch_buffer(self, index: int, shape: Tuple[int, ...]) -> Tuple[np.ndarray, int]:
+        """
+        Return a float32 view of the given shape on scratch buffer ``index``.
+        
+        The buffer only grows, so repeated calls with clips of similar length
+        reuse the same memory.
+        
+        Returns:
+            (view, bytes newly allocated)
+        """
+        size = int(np.prod(shape))
+        allocated = 0
+        if self._scratch[index].size < size:
+            self._scratch[index] = np.empty(size, dtype=np.float32)
+            allocated = self._scratch[index].nbytes
+        return self._scratch[index][:size].reshape(shape), allocated
+    
+    @staticmethod
+    def _normalize(audio: np.ndarray, peak: float = 0.95) -> np.ndarray:
+        """Peak-normalize in place, without temporary arrays."""
+        if audio.size:
+            max_val = max(float(audio.max()), -float(audio.min()))
+            if max_val > 0:
+                audio *= peak / max_val
+        return audio
+    
+    def _apply_single(self, stage, audio: np.ndarray, **params) -> np.ndarray:
+        """Run one stage on a planar float32 copy of audio and normalize the result."""
+        src = to_planar(audio)
+        dst = np.empty_like(src)
+        stage(src, dst, **params)
+        return from_planar(self._normalize(dst), audio.shape)
+    
+    # --- Public single effects ---
     
-    def apply_reverb(self, audio: np.ndarray, room_size: float = 0.5, damping: float = 0.5) -> np.ndarray:
+    def apply_reverb(
+        self,
+        audio: np.ndarray,
+        room_size: float = 0.5,
+        damping: float = 0.5,
+        mode: str = 'schroeder',
+        impulse_response: Optional[Union[str, np.ndarray]] = None,
+        mix: float = 0.35,
+        block_size: int = 4096
+    ) -> np.ndarray:
         """
-        Apply simple reverb effect using comb filters.
+        Apply reverb effect.
         
         Args:
             audio: Input audio array
             room_size: Room size (0.0 to 1.0)
             damping: High frequency damping (0.0 to 1.0)
+            mode: 'schroeder' (feed-forward taps) or 'convolution'
+            impulse_response: Convolution mode only: WAV path or IR array.
+                A synthetic IR derived from room_size/damping is used if None.
+            mix: Convolution mode only: dry/wet mix (0.0 to 1.0)
+            block_size: Convolution mode only: FFT partition size in samples
         
         Returns:
             Audio with reverb applied
         """
-        # Simple Schroeder reverb with comb filters
-        delays = [int(self.sr * d) for d in [0.0297, 0.0371, 0.0411, 0.0437]]
-        gains = [0.7, 0.7, 0.7, 0.7]
-        
-        output = audio.copy()
-        
-        for delay, gain in zip(delays, gains):
-            delay = int(delay * (0.5 + room_size * 0.5))
-            if delay < len(audio):
-                delayed = np.zeros_like(audio)
-                delayed[delay:] = audio[:-delay] * gain * (1 - damping)
-                output += delayed
-        
-        # Normalize
-        max_val = np.max(np.abs(output))
-        if max_val > 0:
-            output = output / max_val * 0.95
-        
-        return output
+        return self._apply_single(
+            self._reverb_into, audio, room_size=room_size, damping=damping, mode=mode,
+            impulse_response=impulse_response, mix=mix, block_size=block_size
+        )
     
-    def apply_delay(self, audio: np.ndarray, delay_time: float = 0.3, feedback: float = 0.4, mix: float = 0.3) -> np.ndarray:
+    def apply_delay(self, audio: np.ndarray, delay_time: float = 0.3, feedback: float = 0.4, mix: float = 0.3,
+                    ping_pong: bool = False) -> np.ndarray:
         """
         Apply delay effect.
         
@@ -53,73 +1464,59 @@ class AudioEffects:
             delay_time: Delay time in seconds
             feedback: Feedback amount (0.0 to 0.9)
             mix: Dry/wet mix (0.0 to 1.0)
+            ping_pong: Alternate echoes between left and right (stereo input only)
         
         Returns:
             Audio with delay applied
         """
-        delay_samples = int(delay_time * self.sr)
-        
-        if delay_samples >= len(audio):
+        if int(delay_time * self.sr) >= len(audio):
             return audio
-        
-        output = audio.copy()
-        delayed = np.zeros_like(audio)
-        
-        # Create delay line with feedback
-        for i in range(delay_samples, len(audio)):
-            delayed[i] = audio[i - delay_samples] + delayed[i - delay_samples] * feedback
-        
-        # Mix dry and wet signals
-        output = audio * (1 - mix) + delayed * mix
-        
-        # Normalize
-        max_val = np.max(np.abs(output))
-        if max_val > 0:
-            output = output / max_val * 0.95
-        
-        return output
+        return self._apply_single(self._delay_into, audio, delay_time=delay_time, feedback=feedback,
+                                  mix=mix, ping_pong=ping_pong)
     
-    def apply_eq(self, audio: np.ndarray, low_gain: float = 1.0, mid_gain: float = 1.0, high_gain: float = 1.0) -> np.ndarray:
+    def apply_eq(
+        self,
+        audio: np.ndarray,
+        low_gain: float = 1.0,
+        mid_gain: float = 1.0,
+        high_gain: float = 1.0,
+        mode: str = 'fft',
+        gains: Optional[Sequence[float]] = None,
+        crossovers: Sequence[float] = DEFAULT_EQ_CROSSOVERS,
+        block_size: int = 1024
+    ) -> np.ndarray:
         """
-        Apply simple 3-band EQ.
+        Apply multi-band EQ (3-band by default).
         
         Args:
-            audio: Input audio array
+            audio: Input audio array, shape (N,) or (N, channels)
             low_gain: Low frequency gain (0.0 to 2.0)
             mid_gain: Mid frequency gain (0.0 to 2.0)
             high_gain: High frequency gain (0.0 to 2.0)
+            mode: 'fft' (whole-signal band masks) or 'biquad' (block-wise shelving filter bank)
+            gains: Linear gain per band, overrides low/mid/high gains
+            crossovers: Ascending band edges in Hz, len(gains) - 1 values
+            block_size: Biquad mode only: processing block length in samples
         
         Returns:
             Audio with EQ applied
         """
-        # Simple frequency-based EQ using FFT
-        fft = np.fft.rfft(audio)
-        freqs = np.fft.rfftfreq(len(audio), 1/self.sr)
-        
-        # Define frequency bands
-        low_cutoff = 250
-        high_cutoff = 4000
-        
-        # Apply gains
-        for i, freq in enumerate(freqs):
-            if freq < low_cutoff:
-                fft[i] *= low_gain
-            elif freq < high_cutoff:
-                fft[i] *= mid_gain
-            else:
-                fft[i] *= high_gain
-        
-        # Convert back to time domain
-        output = np.fft.irfft(fft, len(audio))
-        
-        # Normalize
-        max_val = np.max(np.abs(output))
-        if max_val > 0:
-            output = output / max_val * 0.95
-        
-        return output
+        return self._apply_single(
+            self._eq_into, audio, low_gain=low_gain, mid_gain=mid_gain, high_gain=high_gain,
+            mode=mode, gains=gains, crossovers=crossovers, block_size=block_size
+        )
     
-    def apply_compression(self, audio: np.ndarray, threshold: float = 0.5, ratio: float = 4.0) -> np.ndarray:
+    def apply_compression(
+        self,
+        audio: np.ndarray,
+        threshold: float = 0.5,
+        ratio: float = 4.0,
+        attack: float = 0.005,
+        release: float = 0.1,
+        knee_db: float = 6.0,
+        lookahead: float = 0.005,
+        detector: str = 'rms'
+    ) -> np.ndarray:
         """
         Apply dynamic range compression.
         
@@ -127,27 +1524,330 @@ class AudioEffects:
             audio: Input audio array
             threshold: Compression threshold (0.0 to 1.0)
             ratio: Compression ratio (1.0 to 20.0)
+            attack: Attack time in seconds
+            release: Release time in seconds
+            knee_db: Soft knee width in dB
+            lookahead: Lookahead time in seconds
+            detector: Envelope detector, 'rms' or 'peak'
         
         Returns:
             Compressed audio
         """
-        output = audio.copy()
+        return self._apply_single(
+            self._compression_into, audio, threshold=threshold, ratio=ratio, attack=attack,
+            release=release, knee_db=knee_db, lookahead=lookahead, detector=detector
+        )
+    
+    def apply_stereo_width(self, audio: np.ndarray, width: float = 1.0) -> np.ndarray:
+        """
+        Widen or narrow the stereo image with mid/side processing.
         
-        # Simple compression
-        mask = np.abs(output) > threshold
-        excess = np.abs(output[mask]) - threshold
-        output[mask] = np.sign(output[mask]) * (threshold + excess / ratio)
+        Args:
+            audio: Input audio array, shape (N, 2); other layouts are returned as is
+            width: Side level (0.0 = mono, 1.0 = unchanged, 2.0 = wide)
+        
+        Returns:
+            Audio with the stereo width applied
+        """
+        if audio.ndim != 2 or audio.shape[1] != 2:
+            return audio
+        return self._apply_single(self._width_into, audio, width=width)
+    
+    # --- Stage kernels (planar src -> dst, src may be clobbered) ---
+    
+    def _reverb_into(self, src: np.ndarray, dst: np.ndarray, room_size: float = 0.5, damping: float = 0.5,
+                     mode: str = 'schroeder', impulse_response: Optional[Union[str, np.ndarray]] = None,
+                     mix: float = 0.35, block_size: int = 4096):
+        """Reverb stage: feed-forward Schroeder taps or partitioned convolution."""
+        if mode == 'convolution':
+            spectra = self._ir_spectra(room_size, damping, impulse_response, block_size)
+            partitioned_convolve(src, spectra, block_size, out=dst)
+            dst *= mix
+            src *= 1 - mix
+            dst += src
+            return
+        if mode != 'schroeder':
+            raise ValueError(f"Unknown reverb mode: {mode}")
+        
+        # Simple Schroeder reverb with comb filters; all taps share one gain
+        delays, gain = schroeder_taps(self.sr, room_size, damping)
+        
+        dst[:] = 0
+        for delay in delays:
+            if delay < src.shape[-1]:
+                dst[..., delay:] += src[..., :-delay]
+        dst *= gain
+        dst += src
+    
+    def _ir_spectra(self, room_size: float, damping: float,
+                    impulse_response: Optional[Union[str, np.ndarray]], block_size: int) -> np.ndarray:
+        """Resolve an impulse response to its cached partition spectra."""
+        if impulse_response is None:
+            decay_time = round(0.5 + room_size * 2.5, 3)
+            damping = round(damping, 3)
+            key = ('synthetic', decay_time, damping, self.sr)
+            loader = lambda: synthetic_impulse_response(self.sr, decay_time, damping)
+        elif isinstance(impulse_response, str):
+            stat = os.stat(impulse_response)
+            key = ('file', os.path.abspath(impulse_response), stat.st_mtime_ns, stat.st_size, self.sr)
+            loader = lambda: load_impulse_response(impulse_response, self.sr)
+        else:
+            ir = np.ascontiguousarray(impulse_response, dtype=np.float32)
+            key = ('array', hashlib.sha1(ir.tobytes()).hexdigest(), ir.shape, self.sr)
+            loader = lambda: ir
         
-        # Make-up gain
-        makeup_gain = 1.0 / (1.0 - (1.0 - 1.0/ratio) * 0.5)
-        output *= makeup_gain
+        return _cached_ir_spectra(key, loader, block_size)
+    
+    def _delay_into(self, src: np.ndarray, dst: np.ndarray, delay_time: float = 0.3,
+                    feedback: float = 0.4, mix: float = 0.3, ping_pong: bool = False):
+        """Delay stage: feedback (or ping-pong) delay line mixed with the dry signal."""
+        feedback_delay(src, int(delay_time * self.sr), feedback, out=dst, ping_pong=ping_pong)
+        
+        # Mix dry and wet signals
+        dst *= mix
+        src *= 1 - mix
+        dst += src
+    
+    def _eq_into(self, src: np.ndarray, dst: np.ndarray, low_gain: float = 1.0, mid_gain: float = 1.0,
+                 high_gain: float = 1.0, mode: str = 'fft', gains: Optional[Sequence[float]] = None,
+                 crossovers: Sequence[float] = DEFAULT_EQ_CROSSOVERS, block_size: int = 1024):
+        """EQ stage: FFT band masks or biquad filter bank."""
+        if gains is None:
+            gains = (low_gain, mid_gain, high_gain)
+        if len(gains) != len(crossovers) + 1:
+            raise ValueError(f"Expected {len(crossovers) + 1} EQ gains for {len(crossovers)} crossovers, got {len(gains)}")
+        
+        if mode == 'fft':
+            # Frequency-domain EQ: one gain per band, applied with a cached bin->band mask
+            n = src.shape[-1]
+            fft = np.fft.rfft(src, axis=-1)
+            fft *= fft_band_gains(n, self.sr, crossovers, gains)
+            dst[:] = np.fft.irfft(fft, n, axis=-1)
+        elif mode == 'biquad':
+            bank = BiquadFilterBank.from_bands(crossovers, gains, self.sr, block_size=block_size)
+            dst[:] = bank.process(src)
+        else:
+            raise ValueError(f"Unknown EQ mode: {mode}")
+    
+    def _compression_into(self, src: np.ndarray, dst: np.ndarray, threshold: float = 0.5, ratio: float = 4.0,
+                          attack: float = 0.005, release: float = 0.1, knee_db: float = 6.0,
+                          lookahead: float = 0.005, detector: str = 'rms'):
+        """Compression stage: envelope-follower compressor, latency compensated."""
+        compressor = Compressor(
+            self.sr, threshold=threshold, ratio=ratio, attack=attack, release=release,
+            knee_db=knee_db, lookahead=lookahead, detector=detector
+        )
+        compressor.process_offline(src, out=dst)
+    
+    def _width_into(self, src: np.ndarray, dst: np.ndarray, width: float = 1.0):
+        """Stereo width stage: mid/side side-level scaling (non-stereo passes through)."""
+        stereo_width(src, width, out=dst)
+    
+    # --- Chain ---
+    
+    @staticmethod
+    def chain_stages(use_reverb: bool = False, use_delay: bool = False, use_eq: bool = False,
+                     use_compression: bool = True, use_width: bool = False,
+                     **effect_params) -> List[Tuple[str, Dict[str, Any]]]:
+        """
+        Enabled stages of the chain, in processing order.
+        
+        Returns:
+            List of (stage name, stage parameters) with defaults filled in
+        """
+        stages = []
+        if use_eq:
+            stages.append(('eq', dict(
+                low_gain=effect_params.get('low_gain', 1.0),
+                mid_gain=effect_params.get('mid_gain', 1.0),
+                high_gain=effect_params.get('high_gain', 1.0),
+                mode=effect_params.get('eq_mode', 'fft'),
+                gains=effect_params.get('eq_gains'),
+                crossovers=effect_params.get('eq_crossovers', DEFAULT_EQ_CROSSOVERS)
+            )))
+        
+        if use_compression:
+            stages.append(('compression', dict(
+                threshold=effect_params.get('threshold', 0.5),
+                ratio=effect_params.get('ratio', 4.0),
+                attack=effect_params.get('attack', 0.005),
+                release=effect_params.get('release', 0.1),
+                knee_db=effect_params.get('knee_db', 6.0),
+                lookahead=effect_params.get('lookahead', 0.005),
+                detector=effect_params.get('detector', 'rms')
+            )))
+        
+        if use_delay:
+            stages.append(('delay', dict(
+                delay_time=effect_params.get('delay_time', 0.3),
+                feedback=effect_params.get('feedback', 0.4),
+                mix=effect_params.get('delay_mix', 0.3),
+                ping_pong=effect_params.get('ping_pong', False)
+            )))
+        
+        if use_reverb:
+            stages.append(('reverb', dict(
+                room_size=effect_params.get('room_size', 0.5),
+                damping=effect_params.get('damping', 0.5),
+                mode=effect_params.get('reverb_mode', 'schroeder'),
+                impulse_response=effect_params.get('impulse_response'),
+                mix=effect_params.get('reverb_mix', 0.35)
+            )))
         
-        # Normalize
-        max_val = np.max(np.abs(output))
-        if max_val > 0:
-            output = output / max_val * 0.95
+        if use_width:
+            stages.append(('width', dict(
+                width=effect_params.get('stereo_width', 1.0)
+            )))
         
-        return output
+        return stages
+    
+    def _stage_kernel(self, name: str):
+        """Offline src -> dst kernel for a stage name."""
+        return {
+            'eq': self._eq_into,
+            'compression': self._compression_into,
+            'delay': self._delay_into,
+            'reverb': self._reverb_into,
+            'width': self._width_into,
+        }[name]
+    
+    # --- Parallel chunked execution ---
+    
+    def _run_stage(self, name: str, src: np.ndarray, dst: np.ndarray, params: Dict[str, Any]):
+        """Run a stage serially or, for long signals, chunked on the thread pool."""
+        n = src.shape[-1]
+        if name == 'delay' and int(params['delay_time'] * self.sr) >= n:
+            # Delay longer than the signal: leave the audio untouched
+            dst[:] = src
+            return
+        
+        chunk = int(self.chunk_seconds * self.sr) // 1024 * 1024
+        if self.workers <= 1 or chunk <= 0 or n < 2 * chunk:
+            self._stage_kernel(name)(src, dst, **params)
+        elif name == 'reverb':
+            self._overlap_add_stage(name, src, dst, params, chunk)
+        elif name == 'compression' or (name == 'eq' and params['mode'] == 'biquad'):
+            self._warmup_stage(name, src, dst, params, chunk)
+        else:
+            self._stage_kernel(name)(src, dst, **params)
+    
+    def _executor(self) -> ThreadPoolExecutor:
+        """Thread pool for chunked processing, created on first use."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='audio-effects')
+        return self._pool
+    
+    def _stage_tail(self, name: str, params: Dict[str, Any]) -> int:
+        """Length in samples of the response of a linear stage to one input sample."""
+        if name == 'delay':
+            delay_samples = int(params['delay_time'] * self.sr)
+            feedback = min(abs(params['feedback']), 0.999)
+            # Echoes are dropped once below -120 dB
+            repeats = np.ceil(np.log(1e-6) / np.log(feedback)) if feedback > 0 else 0
+            return delay_samples * int(repeats + 1)
+        if params['mode'] == 'convolution':
+            block_size = params.get('block_size', 4096)
+            spectra = self._ir_spectra(params['room_size'], params['damping'], params['impulse_response'], block_size)
+            return spectra.shape[1] * block_size
+        delays, _ = schroeder_taps(self.sr, params['room_size'], params['damping'])
+        return max(delays, default=0)
+    
+    def _stage_warmup(self, name: str, params: Dict[str, Any]) -> Tuple[int, int]:
+        """
+        Pre-roll and look-ahead (samples) needed to process a chunk of a short-memory stage.
+        
+        Returns:
+            (samples before the chunk, samples after the chunk)
+        """
+        if name == 'eq':
+            gains = params['gains'] or (params['low_gain'], params['mid_gain'], params['high_gain'])
+            bank = BiquadFilterBank.from_bands(params['crossovers'], gains, self.sr)
+            radius = max(
+                (np.max(np.abs(np.roots([1.0, a1, a2]))) for _, _, _, a1, a2 in bank.sections),
+                default=0.0
+            )
+            # Filter memory has decayed below -140 dB after the pre-roll
+            warmup = int(np.ceil(np.log(1e-7) / np.log(radius))) if 0 < radius < 1 else 0
+            return min(warmup, 2 * self.sr), 0
+        
+        time_constant = max(params['attack'], params['release'], 0.01)
+        warmup = int(10 * time_constant * self.sr)
+        # Keep chunk boundaries on the compressor's envelope block grid
+        warmup = -(-warmup // 32) * 32
+        return warmup, int(round(params['lookahead'] * self.sr))
+    
+    def _overlap_add_stage(self, name: str, src: np.ndarray, dst: np.ndarray, params: Dict[str, Any], chunk: int):
+        """Process chunks padded with the stage tail in parallel and overlap-add them."""
+        n = src.shape[-1]
+        tail = self._stage_tail(name, params)
+        kernel = self._stage_kernel(name)
+        
+        def work(start: int) -> Tuple[int, np.ndarray]:
+            stop = min(start + chunk, n)
+            segment = np.zeros(src.shape[:-1] + (min(stop + tail, n) - start,), dtype=np.float32)
+            segment[..., :stop - start] = src[..., start:stop]
+            out = np.empty_like(segment)
+            kernel(segment, out, **params)
+            return start, out
+        
+        dst[:] = 0
+        for start, out in self._executor().map(work, range(0, n, chunk)):
+            dst[..., start:start + out.shape[-1]] += out
+    
+    def _warmup_stage(self, name: str, src: np.ndarray, dst: np.ndarray, params: Dict[str, Any], chunk: int):
+        """Process chunks with a discarded pre-roll in parallel, writing disjoint slices of dst."""
+        n = src.shape[-1]
+        before, after = self._stage_warmup(name, params)
+        kernel = self._stage_kernel(name)
+        
+        def work(start: int):
+            stop = min(start + chunk, n)
+            seg_start = max(start - before, 0)
+            segment = src[..., seg_start:min(stop + after, n)].copy()
+            out = np.empty_like(segment)
+            kernel(segment, out, **params)
+            dst[..., start:stop] = out[..., start - seg_start:stop - seg_start]
+        
+        list(self._executor().map(work, range(0, n, chunk)))
+    
+    def _stage_keys(self, audio: np.ndarray, stages: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Cache key of every stage output: input digest chained with stage parameters."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{self.sr}:{audio.dtype}:{audio.shape}".encode())
+        digest.update(np.ascontiguousarray(audio).data)
+        
+        keys = []
+        for name, params in stages:
+            token = name + '|' + ';'.join(
+                f"{k}={_param_token(v, is_path=k == 'impulse_response')}" for k, v in sorted(params.items())
+            )
+            digest.update(token.encode())
+            keys.append(digest.copy().hexdigest())
+        return keys
+    
+    def stream(self, block_size: int = 4096, output_gain: float = 1.0, sample_rate: Optional[int] = None,
+               **chain_params) -> EffectsChainStream:
+        """
+        Create a block-streaming effects chain.
+        
+        Args:
+            block_size: Samples per block
+            output_gain: Gain applied to every output block
+            sample_rate: Sample rate of the stream (defaults to the instance rate)
+            **chain_params: use_* flags and effect parameters, as for apply_effects_chain()
+        """
+        effects = self.at_sample_rate(sample_rate or self.sr)
+        return EffectsChainStream(effects, block_size=block_size, output_gain=output_gain, **chain_params)
+    
+    def splicer(self, sample_rate: Optional[int] = None, **chain_params) -> EffectsChainSplicer:
+        """
+        Create an incremental effects chain, for a signal that is edited in places.
+        
+        Args:
+            sample_rate: Sample rate of the signal (defaults to the instance rate)
+            **chain_params: use_* flags and effect parameters, as for apply_effects_chain()
+        """
+        return EffectsChainSplicer(self.at_sample_rate(sample_rate or self.sr), **chain_params)
     
     def apply_effects_chain(
         self, 
@@ -156,53 +1856,99 @@ class AudioEffects:
         use_delay: bool = False,
         use_eq: bool = False,
         use_compression: bool = True,
+        use_width: bool = False,
+        out: Optional[np.ndarray] = None,
+        normalize: bool = True,
+        sample_rate: Optional[int] = None,
         **effect_params
     ) -> np.ndarray:
         """
         Apply a chain of effects to audio.
         
+        The input is copied once into a planar (channels, N) scratch buffer,
+        stages ping-pong between the two instance scratch buffers and the
+        result is peak-normalized once, then written back in the input layout. With the stage cache on,
+        processing resumes after the longest cached prefix of the chain and
+        the output of every stage that runs is cached.
+        
+        Figures for the call are stored in ``last_chain_stats``:
+        ``allocated_bytes`` counts the buffers created by the executor and the
+        stage cache (zero in steady state without cache when ``out`` is
+        given), ``peak_traced_bytes`` is the tracemalloc peak including
+        temporaries inside the stages, when tracemalloc is tracing, and
+        ``cache_hits``/``cache_misses`` count cache lookups.
+        
         Args:
-            audio: Input audio
+            audio: Input audio, shape (N,) or (N, channels)
             use_reverb: Enable reverb
             use_delay: Enable delay
             use_eq: Enable EQ
             use_compression: Enable compression
+            use_width: Enable stereo width (stereo input only)
+            out: Optional float32 output array with the same shape as audio
+            normalize: Peak-normalize the result (disable to compare with a stream)
+            sample_rate: Sample rate of audio (defaults to the instance rate);
+                delay times, filters and reverb are designed for that rate
             **effect_params: Parameters for each effect
         
         Returns:
-            Processed audio
+            Processed audio (float32)
         """
-        output = audio.copy()
-        
-        # Apply effects in order
-        if use_eq:
-            output = self.apply_eq(
-                output,
-                low_gain=effect_params.get('low_gain', 1.0),
-                mid_gain=effect_params.get('mid_gain', 1.0),
-                high_gain=effect_params.get('high_gain', 1.0)
+        if sample_rate and sample_rate != self.sr:
+            effects = self.at_sample_rate(sample_rate)
+            out = effects.apply_effects_chain(
+                audio, use_reverb, use_delay, use_eq, use_compression, use_width,
+                out=out, normalize=normalize, **effect_params
             )
+            self.last_chain_stats = effects.last_chain_stats
+            return out
         
-        if use_compression:
-            output = self.apply_compression(
-                output,
-                threshold=effect_params.get('threshold', 0.5),
-                ratio=effect_params.get('ratio', 4.0)
-            )
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
         
-        if use_delay:
-            output = self.apply_delay(
-                output,
-                delay_time=effect_params.get('delay_time', 0.3),
-                feedback=effect_params.get('feedback', 0.4),
-                mix=effect_params.get('delay_mix', 0.3)
-            )
+        planar_shape = (audio.shape[1] if audio.ndim > 1 else 1, len(audio))
+        src, allocated = self._scratch_buffer(0, planar_shape)
+        dst, grown = self._scratch_buffer(1, planar_shape)
+        allocated += grown
         
-        if use_reverb:
-            output = self.apply_reverb(
-                output,
-                room_size=effect_params.get('room_size', 0.5),
-                damping=effect_params.get('damping', 0.5)
-            )
+        stages = self.chain_stages(use_reverb, use_delay, use_eq, use_compression, use_width, **effect_params)
+        cache = self.stage_cache
+        hits_before, misses_before = (cache.hits, cache.misses) if cache else (0, 0)
+        
+        # Resume after the longest cached prefix of the chain
+        first = 0
+        keys = self._stage_keys(audio, stages) if cache and stages else []
+        for index in range(len(keys) - 1, -1, -1):
+            cached = cache.get(keys[index])
+            if cached is not None:
+                np.copyto(src, cached)
+                first = index + 1
+                break
+        else:
+            to_planar(audio, out=src)
+        
+        for index in range(first, len(stages)):
+            name, params = stages[index]
+            self._run_stage(name, src, dst, params)
+            src, dst = dst, src
+            if cache:
+                allocated += cache.put(keys[index], src)
+        
+        if stages and normalize:
+            self._normalize(src)
+        
+        if out is None:
+            out = np.empty(audio.shape, dtype=np.float32)
+            allocated += out.nbytes
+        from_planar(src, audio.shape, out=out)
         
-        return output
+        self.last_chain_stats = {
+            'allocated_bytes': allocated,
+            'scratch_bytes': sum(buf.nbytes for buf in self._scratch),
+            'peak_traced_bytes': tracemalloc.get_traced_memory()[1] - traced_before if tracing else None,
+            'cache_hits': cache.hits - hits_before if cache else 0,
+            'cache_misses': cache.misses - misses_before if cache else 0,
+        }
+        return out
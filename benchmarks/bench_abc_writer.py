@@ -0,0 +1,137 @@
+"""
+Benchmark: composition JSON -> ABC with the direct serializer, plus a
+round-trip check: every tune is parsed back with abc_to_music21() and must
+give the same pitches, onsets and durations in every voice.
+
+Usage:
+    python benchmarks/bench_abc_writer.py [--tunes 20] [--bars 16]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from fractions import Fraction
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import music_utils
+
+KEYS = ["C Major", "Eb Major", "A minor", "F#m", "Bb", "E Major", "d", "Ab Major"]
+METERS = ["4/4", "3/4", "6/8", "2/4", "5/4"]
+DURATIONS = [0.25, 0.5, 0.5, 1, 1, 1, 1.5, 2, 3, 4, 1 / 3]
+STEPS = ["C", "D", "E", "F", "G", "A", "B"]
+ACCIDENTALS = ["", "", "", "#", "b", "-"]
+
+
+def random_pitch(rng, octaves):
+    return rng.choice(STEPS) + rng.choice(ACCIDENTALS) + str(rng.choice(octaves))
+
+
+def random_events(rng, bars, beats, octaves, chord=False):
+    """Events filling `bars` bars; triplet eighths always come in threes."""
+    events, total = [], 0.0
+    while total < bars * beats - 1e-6:
+        dur = rng.choice(DURATIONS)
+        count = 3 if dur == 1 / 3 else 1
+        for _ in range(count):
+            if rng.random() < 0.1:
+                events.append({"notes": ["REST"]} if chord else {"note": "REST"})
+            elif chord:
+                events.append({"notes": [random_pitch(rng, octaves) for _ in range(3)]})
+            else:
+                events.append({"note": random_pitch(rng, octaves)})
+            events[-1]["duration"] = dur
+            total += dur
+    return events
+
+
+def make_composition(rng, bars):
+    meter = rng.choice(METERS)
+    num, den = music_utils.parse_meter(meter)
+    beats = 4 * num / den
+    return {
+        "mood": "Benchmark",
+        "tempo": rng.choice([72, 96, 120, 140]),
+        "key": rng.choice(KEYS),
+        "time_signature": meter,
+        "tracks": {
+            "melody": random_events(rng, bars, beats, [4, 5, 6]),
+            "bass": random_events(rng, bars, beats, [1, 2, 3]),
+            "chords": random_events(rng, bars, beats, [3, 4], chord=True),
+        },
+    }
+
+
+def expected_voices(composition):
+    """
+    (onset, duration, MIDI pitches) per voice, split at barlines like the ABC
+    writer, which also writes consecutive rests as one.
+    """
+    num, den = music_utils.parse_meter(composition["time_signature"])
+    bar_length = Fraction(4 * num, den)
+    voices = []
+    for key, _, _, is_chord in music_utils.TRACK_LAYOUT:
+        merged = []
+        for event in composition["tracks"][key]:
+            names = event["notes"] if is_chord else [event["note"]]
+            pitches = tuple(sorted(music_utils.pitch_to_midi(n) for n in names if n != "REST"))
+            duration = Fraction(event["duration"]).limit_denominator(96)
+            if not pitches and merged and not merged[-1][1]:
+                merged[-1][0] += duration
+            else:
+                merged.append([duration, pitches])
+        
+        events, position = [], Fraction(0)
+        for remaining, pitches in merged:
+            while remaining > 0:
+                piece = min(remaining, bar_length - position % bar_length)
+                events.append((position, piece, pitches))
+                position += piece
+                remaining -= piece
+        voices.append(events)
+    return voices
+
+
+def parsed_voices(score):
+    return [
+        [(Fraction(n.offset), Fraction(n.quarterLength), tuple(sorted(p.midi for p in n.pitches)))
+         for n in part.flatten().notesAndRests]
+        for part in score.parts
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tunes', type=int, default=20)
+    parser.add_argument('--bars', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    compositions = [make_composition(rng, args.bars) for _ in range(args.tunes)]
+    
+    start = time.perf_counter()
+    tunes = [music_utils.json_to_abc(c) for c in compositions]
+    t_write = (time.perf_counter() - start) / args.tunes
+    
+    start = time.perf_counter()
+    scores = [music_utils.abc_to_music21(abc) for abc in tunes]
+    t_parse = (time.perf_counter() - start) / args.tunes
+    
+    failures = 0
+    for composition, abc, score in zip(compositions, tunes, scores):
+        if score is None or parsed_voices(score) != expected_voices(composition):
+            failures += 1
+            print(f"Round-trip mismatch ({composition['key']}, {composition['time_signature']}):\n{abc}")
+    
+    print(f"{args.tunes} tunes of {args.bars} bars, 3 voices")
+    print(f"json_to_abc    : {t_write * 1000:7.2f} ms per tune")
+    print(f"abc_to_music21 : {t_parse * 1000:7.2f} ms per tune (editor path only)")
+    print(f"round-trip     : {args.tunes - failures}/{args.tunes} identical")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: CompositionCache lookup and insert time as the cache grows, against
+the previous dict cache that scanned every entry to evict (and whose "oldest"
+was the oldest insertion, not the least recently used entry).
+
+Usage:
+    python benchmarks/bench_composition_cache.py [--sizes 10000 30000 100000] [--ops 20000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import CompositionCache
+
+
+class DictCache:
+    """The previous CompositionCache: timestamp written at insert, O(n) eviction scan."""
+    
+    def __init__(self, max_size, ttl_seconds=3600):
+        self.cache = {}
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+    
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['timestamp'] > self.ttl_seconds:
+            del self.cache[key]
+            return None
+        return entry['data']
+    
+    def set(self, key, composition):
+        if len(self.cache) >= self.max_size:
+            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k]['timestamp'])
+            del self.cache[oldest_key]
+        self.cache[key] = {'data': composition, 'timestamp': time.time()}
+
+
+def per_op(func, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(key)
+    return (time.perf_counter() - start) / len(keys)
+
+
+def measure(cache, size, ops):
+    """(µs per hit, µs per insert with eviction) on a full cache."""
+    composition = {"mood": "Benchmark"}
+    for i in range(size):
+        cache.set(f"key{i}", composition)
+    t_get = per_op(cache.get, [f"key{(i * 7919) % size}" for i in range(ops)])
+    t_set = per_op(lambda key: cache.set(key, composition), [f"new{i}" for i in range(ops)])
+    return t_get * 1e6, t_set * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 30000, 100000])
+    parser.add_argument('--ops', type=int, default=20000)
+    parser.add_argument('--legacy-ops', type=int, default=100, help="Inserts timed on the O(n) cache")
+    args = parser.parse_args()
+    
+    print(f"{'entries':>8} | {'LRU get':>9} {'LRU set':>9} | {'dict get':>9} {'dict set':>10}")
+    for size in args.sizes:
+        lru_get, lru_set = measure(CompositionCache(max_size=size), size, args.ops)
+        dict_get, dict_set = measure(DictCache(max_size=size), size, args.legacy_ops)
+        print(f"{size:8d} | {lru_get:7.2f}µs {lru_set:7.2f}µs | {dict_get:7.2f}µs {dict_set:8.0f}µs")
+    
+    # A hit makes an entry most recent: it survives the next eviction
+    cache = CompositionCache(max_size=2)
+    cache.set("a", {})
+    cache.set("b", {})
+    cache.get("a")
+    cache.set("c", {})
+    assert cache.get("a") is not None and cache.get("b") is None, "not LRU"
+    print(f"LRU order on hit: ok | {cache.get_stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: disk tier of the composition cache. Read and write latency, reads
+from several processes while one process writes (WAL: readers do not wait for
+the writer), compaction under a small budget, and promotion of a disk hit into
+a fresh in-memory CompositionCache (a new session or a restarted process).
+
+Usage:
+    python benchmarks/bench_composition_store.py [--entries 2000] [--readers 4] [--seconds 3]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import CompositionCache
+from composition_store import CompositionStore
+
+
+def make_composition(i, bars=16):
+    return {
+        "mood": f"Benchmark {i}",
+        "reasoning": "Synthetic composition",
+        "key": "C Minor",
+        "time_signature": "4/4",
+        "tempo": 104,
+        "tracks": {
+            "melody": [{"note": "C5", "duration": 0.5} for _ in range(bars * 8)],
+            "bass": [{"note": "C2", "duration": 2.0} for _ in range(bars * 2)],
+            "chords": [{"notes": ["C4", "Eb4", "G4"], "duration": 4.0} for _ in range(bars)],
+        },
+    }
+
+
+def reader(path, entries, seconds, results):
+    store = CompositionStore(path)
+    reads, worst, i = 0, 0.0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        assert store.get(f"key{(i * 7919) % entries}") is not None
+        worst = max(worst, time.perf_counter() - start)
+        reads += 1
+        i += 1
+    results.put((reads, worst))
+
+
+def writer(path, seconds, results):
+    store = CompositionStore(path)
+    writes, i = 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        store.set(f"new{i}", make_composition(i))
+        writes += 1
+        i += 1
+    results.put(writes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'compositions.sqlite3')
+        store = CompositionStore(path)
+        
+        start = time.perf_counter()
+        for i in range(args.entries):
+            store.set(f"key{i}", make_composition(i))
+        t_set = (time.perf_counter() - start) / args.entries
+        start = time.perf_counter()
+        for i in range(args.entries):
+            store.get(f"key{(i * 7919) % args.entries}")
+        t_get = (time.perf_counter() - start) / args.entries
+        stats = store.get_stats()
+        print(f"{stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB | "
+              f"set {t_set * 1e3:.2f} ms, get {t_get * 1e3:.2f} ms")
+        
+        # Readers in separate processes, alone then next to a writer
+        for with_writer in (False, True):
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=reader, args=(path, args.entries, args.seconds, results))
+                         for _ in range(args.readers)]
+            if with_writer:
+                processes.append(multiprocessing.Process(target=writer, args=(path, args.seconds, results)))
+            for process in processes:
+                process.start()
+            outcomes = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            reads = [outcome for outcome in outcomes if isinstance(outcome, tuple)]
+            writes = sum(outcome for outcome in outcomes if not isinstance(outcome, tuple))
+            label = f"{args.readers} readers" + (" + 1 writer" if with_writer else "")
+            print(f"{label:20s}: {sum(r for r, _ in reads) / args.seconds:8.0f} reads/s, "
+                  f"worst read {max(w for _, w in reads) * 1e3:6.1f} ms, {writes / args.seconds:6.0f} writes/s")
+        
+        # Compaction keeps a small store within its budget
+        small = CompositionStore(os.path.join(directory, 'small.sqlite3'), max_bytes=1024 * 1024)
+        for i in range(args.entries):
+            small.set(f"key{i}", make_composition(i))
+        stats = small.get_stats()
+        print(f"1 MB budget: {stats['entries']} entries kept, {stats['bytes'] / 1e6:.2f} MB, "
+              f"{stats['compactions']} compactions, file {os.path.getsize(small.path) / 1e6:.2f} MB")
+        assert stats['bytes'] <= stats['max_bytes']
+        
+        # A new session: the first lookup comes from disk, the next from memory
+        cache = CompositionCache(max_size=100, disk=CompositionStore(path))
+        assert cache.get("key1") == make_composition(1)
+        assert cache.get("key1") is not None
+        stats = cache.get_stats()
+        print(f"promotion: {stats['disk_hits']} disk hit, {stats['hits'] - stats['disk_hits']} memory hit, "
+              f"{stats['size']} in memory")
+        assert stats['disk_hits'] == 1 and stats['hits'] == 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark: envelope-follower compressor against its per-second time budget.
+
+Usage:
+    python benchmarks/bench_compressor.py [--seconds 20] [--budget-ms 20]
+
+Exits with status 1 if processing one second of stereo audio takes longer
+than the budget.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_effects import Compressor
+
+# Maximum compressor time per second of 44.1 kHz stereo audio
+BUDGET_MS_PER_SECOND = 20.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--budget-ms', type=float, default=BUDGET_MS_PER_SECOND)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = int(args.seconds * args.sample_rate)
+    t = np.arange(n) / args.sample_rate
+    # Gated tone plus noise: exercises both attack and release
+    gate = 0.2 + 0.8 * (np.sin(2 * np.pi * 2 * t) > 0)
+    tone = np.sin(2 * np.pi * 220 * t) * gate
+    # Planar (channels, N) layout, as used inside the effects chain
+    audio = np.stack([tone, tone]) + 0.05 * rng.standard_normal((2, n))
+    audio = audio.astype(np.float32)
+
+    over_budget = False
+    for detector in ('rms', 'peak'):
+        for lookahead in (0.0, 0.005):
+            compressor = Compressor(args.sample_rate, detector=detector, lookahead=lookahead)
+            best = float('inf')
+            for _ in range(args.repeat):
+                compressor.reset()
+                start = time.perf_counter()
+                compressor.process(audio)
+                best = min(best, time.perf_counter() - start)
+
+            ms_per_second = best * 1000 / args.seconds
+            status = 'ok' if ms_per_second <= args.budget_ms else 'OVER BUDGET'
+            over_budget |= ms_per_second > args.budget_ms
+            print(f"{detector:4s} lookahead={lookahead * 1000:3.0f}ms: "
+                  f"{ms_per_second:6.2f} ms per second of audio "
+                  f"(budget {args.budget_ms:.0f} ms) {status}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
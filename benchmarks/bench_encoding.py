@@ -0,0 +1,73 @@
+"""
+Benchmark: audio export encoding per format (time, compression ratio) and
+the wait a user sees when downloading: synchronous encode vs. an encode
+pre-warmed in the background while the piece plays, vs. a cache hit.
+
+Needs ffmpeg with libmp3lame and libopus.
+
+Usage:
+    python benchmarks/bench_encoding.py [--bars 32] [--listen 2.0]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import music_utils
+from encoding_service import EncodingService
+
+
+def make_composition(bars):
+    """Eighth-note melody, half-note bass and one triad per bar."""
+    scale = ["C5", "D5", "E5", "G5", "A5", "C6", "B4", "A4"]
+    chords = [["C4", "E4", "G4"], ["A3", "C4", "E4"], ["F3", "A3", "C4"], ["G3", "B3", "D4"]]
+    return {
+        "tempo": 120,
+        "tracks": {
+            "melody": [{"note": scale[(i * 5) % 8], "duration": 0.5} for i in range(bars * 8)],
+            "bass": [{"note": ["C2", "A1", "F2", "G2"][i % 4], "duration": 2} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4} for i in range(bars)],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=32)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--listen', type=float, default=2.0, help="Seconds between playback and download")
+    args = parser.parse_args()
+    
+    sr = args.sample_rate
+    audio = music_utils.synthesize(make_composition(args.bars), 'piano', sr)
+    print(f"{len(audio) / sr:.1f}s of stereo audio at {sr} Hz ({audio.nbytes / 1e6:.1f} MB PCM)")
+    
+    for fmt, spec in music_utils.AUDIO_FORMATS.items():
+        start = time.perf_counter()
+        data = music_utils.encode_audio(sr, audio, fmt)
+        t_sync = time.perf_counter() - start
+        if data is None:
+            print(f"{spec['label']:9s}: encoder unavailable")
+            continue
+        
+        service = EncodingService(music_utils.encode_audio)
+        key = service.pcm_key(sr, audio)  # Computed once per piece, as the app does
+        service.prewarm(sr, audio, [fmt], key=key)
+        time.sleep(args.listen)
+        start = time.perf_counter()
+        service.get(sr, audio, fmt, key=key)
+        t_prewarmed = time.perf_counter() - start
+        start = time.perf_counter()
+        service.get(sr, audio, fmt, key=key)
+        t_hit = time.perf_counter() - start
+        service.close()
+        
+        print(f"{spec['label']:9s}: encode {t_sync * 1000:6.0f} ms, ratio x{audio.nbytes / len(data):5.1f} | "
+              f"download wait: sync {t_sync * 1000:6.0f} ms, pre-warmed {t_prewarmed * 1000:6.1f} ms, "
+              f"cached {t_hit * 1000:5.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark: composition cache key of an uploaded photo. The previous key
+(PNG re-encode + SHA-256, paid by both get and set) vs. the fingerprint of the
+decoded pixels and of the uploaded file bytes, computed once per request.
+
+Usage:
+    python benchmarks/bench_fingerprint.py [--megapixels 12] [--repeat 3]
+"""
+import argparse
+import hashlib
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import composition_fingerprint
+
+
+def make_photo(megapixels, seed=0):
+    """Smooth gradients plus sensor-like noise, saved as a JPEG like a phone upload."""
+    height = int(np.sqrt(megapixels * 1e6 * 3 / 4))
+    width = int(height * 4 / 3)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+    pixels = np.clip(base + rng.normal(0, 8, base.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def png_key(image):
+    """The previous CompositionCache._get_image_hash()."""
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return hashlib.sha256(buffer.getvalue()).hexdigest()
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--megapixels', type=float, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    data = make_photo(args.megapixels)
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    print(f"{image.size[0]}x{image.size[1]} {image.mode}, JPEG {len(data) / 1e6:.1f} MB")
+    
+    t_png, _ = best_of(lambda: png_key(image), args.repeat)
+    t_pixels, pixels_key = best_of(lambda: composition_fingerprint(image), args.repeat)
+    t_file, file_key = best_of(lambda: composition_fingerprint(image, data), args.repeat)
+    
+    print(f"PNG + SHA-256, get and set : {2 * t_png * 1000:8.1f} ms per cache miss")
+    print(f"pixel buffer, once         : {t_pixels * 1000:8.1f} ms | x{2 * t_png / t_pixels:.0f}")
+    print(f"file bytes, once           : {t_file * 1000:8.1f} ms | x{2 * t_png / t_file:.0f}")
+    
+    # Same pixels under another mode or size must not collide
+    assert composition_fingerprint(image.convert('RGBA')) != pixels_key
+    assert composition_fingerprint(image, data) == file_key != pixels_key
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: ABC editor update latency, incremental re-render vs. a full render,
+for single-note edits of a long tune (built-in synthesizer, full effects
+chain). Also checks that the incremental result matches the full render.
+
+Usage:
+    python benchmarks/bench_incremental_render.py [--bars 64] [--edits 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['RENDER_CACHE_MB'] = '0'  # Full renders really synthesize
+
+import music_utils
+from audio_effects import AudioEffects
+from incremental_render import IncrementalRenderer
+
+CHAIN = dict(
+    use_reverb=True, use_delay=True, use_compression=True, use_width=True, room_size=0.6,
+    reverb_mode='convolution', delay_time=0.25, feedback=0.35, delay_mix=0.25, ping_pong=True, stereo_width=1.3,
+)
+
+
+def make_composition(bars, tempo):
+    """Eighth-note melody, half-note bass and one triad per bar."""
+    scale = ["C5", "D5", "E5", "G5", "A5", "C6", "B4", "A4"]
+    chords = [["C4", "E4", "G4"], ["A3", "C4", "E4"], ["F3", "A3", "C4"], ["G3", "B3", "D4"]]
+    return {
+        "tempo": tempo,
+        "key": "C Major",
+        "time_signature": "4/4",
+        "tracks": {
+            "melody": [{"note": scale[(i * 5) % 8], "duration": 0.5} for i in range(bars * 8)],
+            "bass": [{"note": ["C2", "A1", "F2", "G2"][i % 4], "duration": 2} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4} for i in range(bars)],
+        },
+    }
+
+
+def edit_one_note(lines, rng):
+    """Change the pitch letter of one random note in the tune body."""
+    body = [i for i, line in enumerate(lines) if line and line[1:2] != ':']
+    i = rng.choice(body)
+    positions = [j for j, ch in enumerate(lines[i]) if ch in 'ABCDEFGabcdefg']
+    j = rng.choice(positions)
+    lines[i] = lines[i][:j] + ('E' if lines[i][j] not in 'Ee' else 'F') + lines[i][j + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=64)
+    parser.add_argument('--tempo', type=int, default=120)
+    parser.add_argument('--edits', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    effects = AudioEffects(44100, cache_bytes=0)
+    lines = music_utils.json_to_abc(make_composition(args.bars, args.tempo)).splitlines()
+    
+    renderer = IncrementalRenderer('piano', 44100, 'numpy', effects=effects)
+    start = time.perf_counter()
+    renderer.update('\n'.join(lines) + '\n', CHAIN)
+    print(f"{args.bars} bars, {renderer.last_stats['total_seconds']:.1f}s of audio | "
+          f"first render {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    worst = 0
+    for _ in range(args.edits):
+        edit_one_note(lines, rng)
+        abc = '\n'.join(lines) + '\n'
+        start = time.perf_counter()
+        result = renderer.update(abc, CHAIN)
+        t_incremental = time.perf_counter() - start
+        
+        music_utils._abc_chunk.cache_clear()  # The full render parses everything again
+        start = time.perf_counter()
+        reference = IncrementalRenderer('piano', 44100, 'numpy', effects=effects).update(abc, CHAIN)
+        t_full = time.perf_counter() - start
+        
+        error = int(np.max(np.abs(result['audio'].astype(np.int32) - reference['audio'])))
+        worst = max(worst, error)
+        print(f"edit: {renderer.last_stats['changed_seconds']:5.2f}s changed | incremental "
+              f"{t_incremental * 1000:6.0f} ms | full {t_full * 1000:6.0f} ms | x{t_full / t_incremental:4.1f} "
+              f"| max error {error} LSB")
+    
+    print(f"worst difference with a full render: {worst} LSB")
+    if worst > 2:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: composition JSON -> MIDI, direct midiutil writer vs. the
+music21 score graph and score.write('midi'). Also checks that both paths
+produce the same notes, programs and tempo.
+
+Usage:
+    python benchmarks/bench_midi_writer.py [--bars 32] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import music21
+import music_utils
+
+
+def make_composition(bars):
+    """Melody in eighths, bass in halves, one chord per bar."""
+    scale = ["C5", "D5", "E-5", "F5", "G5", "A-5", "B-4", "C#5"]
+    chords = [["C4", "E-4", "G4"], ["A-3", "C4", "E-4"], ["F3", "A-3", "C4"], ["G3", "B3", "D4"]]
+    melody = []
+    for i in range(bars * 8):
+        note = "REST" if i % 7 == 6 else scale[(i * 3) % len(scale)]
+        melody.append({"note": note, "duration": 0.5})
+    return {
+        "tempo": 104,
+        "tracks": {
+            "melody": melody,
+            "bass": [{"note": ["C2", "A-1", "F2", "G2"][i % 4], "duration": 2} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4} for i in range(bars)],
+        },
+    }
+
+
+def midi_summary(data):
+    """Sorted (pitch, start, duration, velocity) notes, program changes and tempo of a MIDI file."""
+    mf = music21.midi.MidiFile()
+    mf.readstr(data)
+    tpq = mf.ticksPerQuarterNote
+    notes, programs, tempo = [], [], None
+    for track in mf.tracks:
+        tick = 0
+        sounding = {}
+        for event in track.events:
+            if event.isDeltaTime():
+                tick += event.time
+            elif event.type == music21.midi.ChannelVoiceMessages.PROGRAM_CHANGE:
+                programs.append(event.data)
+            elif event.type == music21.midi.MetaEvents.SET_TEMPO:
+                tempo = round(60e6 / int.from_bytes(event.data, 'big'), 3)
+            elif event.isNoteOn():
+                sounding.setdefault(event.pitch, []).append((tick, event.velocity))
+            elif event.isNoteOff():
+                start, velocity = sounding[event.pitch].pop(0)
+                notes.append((event.pitch, start / tpq, (tick - start) / tpq, velocity))
+    # music21 repeats each program change; compare the sequence of distinct programs per track
+    distinct = [p for i, p in enumerate(programs) if i == 0 or p != programs[i - 1]]
+    return sorted(notes), distinct, tempo
+
+
+def music21_midi(composition, instrument):
+    """The previous path: music21 score, instrument override, score.write('midi')."""
+    score = music_utils.json_to_music21(composition)
+    part = score.parts[0]
+    part.removeByClass('Instrument')
+    part.insert(0, music21.instrument.instrumentFromMidiProgram(music_utils.MIDI_PROGRAMS[instrument]))
+    with open(score.write('midi'), 'rb') as f:
+        return f.read()
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=32)
+    parser.add_argument('--instrument', default='brass')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    composition = make_composition(args.bars)
+    t_music21, ref = best_of(lambda: music21_midi(composition, args.instrument), args.repeat)
+    t_direct, out = best_of(lambda: music_utils.json_to_midi(composition, args.instrument), args.repeat)
+    
+    ref_notes, ref_programs, ref_tempo = midi_summary(ref)
+    notes, programs, tempo = midi_summary(out)
+    print(f"{args.bars} bars, {len(notes)} notes")
+    print(f"music21 : {t_music21 * 1000:8.1f} ms ({len(ref)} bytes)")
+    print(f"midiutil: {t_direct * 1000:8.1f} ms ({len(out)} bytes) | speedup x{t_music21 / t_direct:.0f}")
+    print(f"same notes: {notes == ref_notes} | programs {programs} vs {ref_programs} | tempo {tempo} vs {ref_tempo}")
+    assert notes == ref_notes and programs == ref_programs and tempo == ref_tempo, "MIDI writers disagree"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark: the columnar NoteEvents built once and shared by the ABC writer,
+the MIDI writer and the synthesizer tracks, vs. every consumer reading the
+composition JSON dicts again. Also compares memory per note and checks that
+both paths write the same ABC, MIDI and note events.
+
+Usage:
+    python benchmarks/bench_note_events.py [--bars 64] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import music_utils
+
+
+def make_composition(bars):
+    """Melody in eighths with rests, bass in halves, one triad per bar."""
+    scale = ["C5", "D5", "Eb5", "F5", "G5", "Ab5", "Bb4", "C#5"]
+    chords = [["C4", "E-4", "G4"], ["A-3", "C4", "E-4"], ["F3", "A-3", "C4"], ["G3", "B3", "D4"]]
+    return {
+        "mood": "Benchmark",
+        "tempo": 104,
+        "key": "C minor",
+        "time_signature": "4/4",
+        "tracks": {
+            "melody": [{"note": "REST" if i % 7 == 6 else scale[(i * 3) % 8], "duration": 0.5}
+                       for i in range(bars * 8)],
+            "bass": [{"note": ["C2", "Ab1", "F2", "G2"][i % 4], "duration": 2} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4} for i in range(bars)],
+        },
+    }
+
+
+def json_bytes(value):
+    """Approximate memory of nested JSON containers and their strings."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(json_bytes(k) + json_bytes(v) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(json_bytes(item) for item in value)
+    return size
+
+
+def consumers(score):
+    """ABC, MIDI and synthesizer tracks of a composition, as the app produces them."""
+    return (music_utils.json_to_abc(score), music_utils.json_to_midi(score, 'piano'),
+            music_utils.note_tracks(score, 'piano'))
+
+
+def best_of(func, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    
+    composition = make_composition(args.bars)
+    t_build, notes = best_of(lambda: music_utils.NoteEvents.from_json(composition), args.repeat)
+    t_json, ref = best_of(lambda: consumers(composition), args.repeat)
+    t_shared, out = best_of(lambda: consumers(music_utils.NoteEvents.from_json(composition)), args.repeat)
+    
+    n = len(notes.events)
+    print(f"{args.bars} bars, {n} notes")
+    print(f"NoteEvents.from_json  : {t_build * 1000:7.2f} ms")
+    print(f"consumers, JSON each  : {t_json * 1000:7.2f} ms")
+    print(f"consumers, built once : {t_shared * 1000:7.2f} ms | x{t_json / t_shared:.2f}")
+    print(f"memory per note       : {json_bytes(composition['tracks']) / n:6.0f} B as dicts, "
+          f"{notes.events.itemsize} B as rows")
+    
+    same = ref[0] == out[0] and ref[1] == out[1] and all(
+        a[:3] == b[:3] and (a[3] == b[3]).all() for a, b in zip(ref[2], out[2]))
+    print(f"same ABC, MIDI and events: {same}")
+    assert same, "Shared NoteEvents changed the output"
+
+
+if __name__ == '__main__':
+    main()
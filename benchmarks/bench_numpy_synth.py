@@ -0,0 +1,61 @@
+"""
+Benchmark: built-in NumPy synthesizer throughput, in seconds of audio
+rendered per CPU-second, for every instrument timbre.
+
+Usage:
+    python benchmarks/bench_numpy_synth.py [--bars 64] [--sample-rate 44100]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['RENDER_CACHE_MB'] = '0'  # Measure synthesis, not cached stems
+
+import music_utils
+from synth_engine import TIMBRES
+
+
+def make_composition(bars, tempo):
+    """Eighth-note melody, half-note bass and one triad per bar."""
+    scale = ["C5", "D5", "E5", "G5", "A5", "C6", "B4", "A4"]
+    chords = [["C4", "E4", "G4"], ["A3", "C4", "E4"], ["F3", "A3", "C4"], ["G3", "B3", "D4"]]
+    return {
+        "tempo": tempo,
+        "tracks": {
+            "melody": [{"note": scale[(i * 5) % 8], "duration": 0.5} for i in range(bars * 8)],
+            "bass": [{"note": ["C2", "A1", "F2", "G2"][i % 4], "duration": 2} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4} for i in range(bars)],
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=64)
+    parser.add_argument('--tempo', type=int, default=120)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    composition = make_composition(args.bars, args.tempo)
+    notes = sum(len(events) for _, _, _, events in music_utils.note_tracks(composition))
+    print(f"{args.bars} bars at {args.tempo} bpm, {notes} notes, {args.sample_rate} Hz")
+    
+    for timbre in TIMBRES:
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.process_time()
+            audio = music_utils.synthesize(composition, timbre, args.sample_rate)
+            best = min(best, time.process_time() - start)
+        seconds = len(audio) / args.sample_rate
+        peak = np.max(np.abs(audio)) / 32767
+        print(f"{timbre:12s}: {best * 1000:7.1f} ms CPU for {seconds:5.1f}s "
+              f"-> x{seconds / best:6.0f} real time | peak {peak:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: chunked multi-threaded effects chain scaling with worker count,
+and the delay stage alone at high feedback (its tail spans the whole track,
+so it must not get slower with more workers).
+
+Usage:
+    python benchmarks/bench_parallel.py [--seconds 120] [--workers 1 2 4 8] [--feedbacks 0.9 0.98]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_effects import AudioEffects
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=120.0)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-seconds', type=float, default=4.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--feedbacks', type=float, nargs='+', default=[0.9, 0.98])
+    args = parser.parse_args()
+    
+    rng = np.random.default_rng(0)
+    n = int(args.seconds * args.sample_rate)
+    audio = rng.uniform(-0.5, 0.5, (n, 2)).astype(np.float32)
+    chain = dict(use_eq=True, eq_mode='biquad', low_gain=1.3, use_compression=True,
+                 use_delay=True, delay_time=0.25, feedback=0.35,
+                 use_reverb=True, reverb_mode='convolution', room_size=0.6)
+    
+    print(f"{os.cpu_count()} CPUs available, {args.seconds:.0f}s stereo clip")
+    scaling(audio, chain, args)
+    
+    for feedback in args.feedbacks:
+        print(f"delay only, feedback {feedback}")
+        scaling(audio, dict(use_delay=True, delay_time=0.25, feedback=feedback), args)
+
+
+def scaling(audio, chain, args):
+    reference = None
+    baseline = None
+    for workers in args.workers:
+        # Stage cache off: every run must do the full work
+        effects = AudioEffects(args.sample_rate, cache_bytes=0, workers=workers,
+                               chunk_seconds=args.chunk_seconds)
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            out = effects.apply_effects_chain(audio, **chain)
+            best = min(best, time.perf_counter() - start)
+        
+        if reference is None:
+            reference, baseline = out, best
+        max_err = float(np.max(np.abs(out - reference)))
+        print(f"workers={workers:2d}: {best:6.3f}s | speedup x{baseline / best:4.2f} | "
+              f"max abs diff vs workers={args.workers[0]}: {max_err:.1e}")
+
+
+if __name__ == '__main__':
+    main()
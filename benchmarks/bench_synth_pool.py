@@ -0,0 +1,91 @@
+"""
+Benchmark: FluidSynth render latency, one process per render (soundfont
+reloaded every time) vs. the persistent worker pool.
+
+Needs the fluidsynth package and a General MIDI soundfont.
+
+Usage:
+    python benchmarks/bench_synth_pool.py [--renders 5] [--workers 2]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import music_utils
+from synth_pool import SynthWorkerPool
+
+COMPOSITION = {
+    "mood": "Benchmark",
+    "tempo": 110,
+    "tracks": {
+        "melody": [{"note": n, "duration": 0.5} for n in ["C5", "E5", "G5", "B4", "A4", "F4", "D5", "C5"] * 4],
+        "bass": [{"note": n, "duration": 2} for n in ["C2", "A1", "F2", "G2"] * 2],
+        "chords": [{"notes": c, "duration": 4} for c in (["C4", "E4", "G4"], ["A3", "C4", "E4"],
+                                                           ["F3", "A3", "C4"], ["G3", "B3", "D4"])],
+    },
+}
+
+
+def cold_render(sf2_path, midi_bytes, sample_rate):
+    """One fluidsynth process per render, as score_to_audio did before the pool."""
+    with tempfile.TemporaryDirectory() as tmp:
+        midi_path = os.path.join(tmp, 'bench.mid')
+        tmp_wav = os.path.join(tmp, 'bench.wav')
+        with open(midi_path, 'wb') as f:
+            f.write(midi_bytes)
+        subprocess.run(
+            ['fluidsynth', '-ni', '-g', '1.0', sf2_path, midi_path, '-F', tmp_wav, '-r', str(sample_rate)],
+            check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        return os.path.getsize(tmp_wav)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--renders', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--sample-rate', type=int, default=44100)
+    args = parser.parse_args()
+    
+    sf2_path = music_utils.get_soundfont_path()
+    if not sf2_path:
+        sys.exit("No soundfont found: install fluid-soundfont-gm")
+    
+    midi_bytes = music_utils.score_to_midi(COMPOSITION)
+    
+    cold = []
+    for _ in range(args.renders):
+        start = time.perf_counter()
+        cold_render(sf2_path, midi_bytes, args.sample_rate)
+        cold.append(time.perf_counter() - start)
+    
+    start = time.perf_counter()
+    pool = SynthWorkerPool(sf2_path, size=args.workers)
+    startup = time.perf_counter() - start
+    try:
+        pooled = []
+        for _ in range(args.renders):
+            start = time.perf_counter()
+            audio = pool.render(midi_bytes, args.sample_rate)
+            pooled.append(time.perf_counter() - start)
+        health = pool.health_check()
+    finally:
+        pool.close()
+    
+    seconds = len(audio) / args.sample_rate
+    print(f"Soundfont {sf2_path}, {seconds:.1f}s of audio per render")
+    print(f"cold spawn: median {np.median(cold) * 1000:8.1f} ms | min {min(cold) * 1000:8.1f} ms")
+    print(f"pooled    : median {np.median(pooled) * 1000:8.1f} ms | min {min(pooled) * 1000:8.1f} ms "
+          f"(one-time pool startup {startup:.2f}s, {args.workers} workers)")
+    print(f"speedup x{np.median(cold) / np.median(pooled):.1f} | health check {health}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: composition JSON validation. jsonschema.validate() with the schema
+compiled on every call (the previous path) vs. the schema compiled once by
+jsonschema and by fastjsonschema, and the cost of the semantic pass and its
+repairs (grid snapping, rest padding, invalid note names).
+
+Usage:
+    python benchmarks/bench_validation.py [--bars 32] [--repeat 200]
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jsonschema
+
+from composition_validator import COMPOSITION_SCHEMA, _SCHEMA_VALIDATOR, _check_schema, validate_composition
+
+
+def make_composition(bars):
+    """Well-formed answer: eighth-note melody, half-note bass, one triad per bar."""
+    scale = ["C5", "D5", "Eb5", "F5", "G5", "Ab5", "Bb4", "C#5"]
+    chords = [["C4", "Eb4", "G4"], ["Ab3", "C4", "Eb4"], ["F3", "Ab3", "C4"], ["G3", "B3", "D4"]]
+    return {
+        "mood": "Benchmark",
+        "reasoning": "Synthetic composition",
+        "key": "C Minor",
+        "time_signature": "4/4",
+        "tempo": 104,
+        "tracks": {
+            "melody": [{"note": scale[(i * 3) % 8], "duration": 0.5} for i in range(bars * 8)],
+            "bass": [{"note": ["C2", "Ab1", "F2", "G2"][i % 4], "duration": 2.0} for i in range(bars * 2)],
+            "chords": [{"notes": chords[i % 4], "duration": 4.0} for i in range(bars)],
+        },
+    }
+
+
+def make_sloppy(composition):
+    """The usual model mistakes: rounded triplets, a short track, a misspelled note."""
+    sloppy = copy.deepcopy(composition)
+    melody = sloppy["tracks"]["melody"]
+    for event in melody[:3]:
+        event["duration"] = 0.33
+    melody[3]["duration"] = 0.51
+    melody[5]["note"] = "H4"
+    del sloppy["tracks"]["bass"][-3:]
+    return sloppy
+
+
+def per_call(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bars', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+    
+    composition = make_composition(args.bars)
+    sloppy = make_sloppy(composition)
+    events = sum(len(track) for track in composition["tracks"].values())
+    print(f"{args.bars} bars, {events} events")
+    
+    t_compile, _ = per_call(lambda: jsonschema.validate(composition, COMPOSITION_SCHEMA), args.repeat)
+    t_schema, _ = per_call(lambda: _SCHEMA_VALIDATOR.validate(composition), args.repeat)
+    t_fast, _ = per_call(lambda: _check_schema(composition), args.repeat)
+    t_full, (_, report) = per_call(lambda: validate_composition(composition), args.repeat)
+    t_repair, (repaired, sloppy_report) = per_call(lambda: validate_composition(sloppy), args.repeat)
+    
+    print(f"jsonschema.validate (compiled per call): {t_compile * 1000:7.3f} ms")
+    print(f"jsonschema, compiled once              : {t_schema * 1000:7.3f} ms | x{t_compile / t_schema:.1f}")
+    print(f"fastjsonschema, compiled once          : {t_fast * 1000:7.3f} ms | x{t_compile / t_fast:.1f}")
+    print(f"schema + semantic pass                 : {t_full * 1000:7.3f} ms | {report.summary()}")
+    print(f"schema + semantic pass + repairs       : {t_repair * 1000:7.3f} ms | {sloppy_report.summary()}")
+    
+    _, again = validate_composition(repaired)
+    print(f"repaired composition validates cleanly: {again.valid and not again.repairs}")
+    assert report.valid and not report.repairs and again.valid and not again.repairs
+
+
+if __name__ == '__main__':
+    main()
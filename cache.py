@@ -3,100 +3,173 @@ Simple in-memory cache for Gemini API responses.
 Reduces API calls and costs by caching compositions based on image hash.
 """
 import hashlib
+import threading
 import time
+from collections import OrderedDict
 from typing import Optional, Dict, Any
 from PIL import Image
-import io
+
+
+def composition_fingerprint(image: Optional[Image.Image] = None, image_bytes: Optional[bytes] = None,
+                            audio_bytes: Optional[bytes] = None) -> str:
+    """
+    Cache key of a composition request, computed once and passed to both
+    CompositionCache.get() and set().
+    
+    The uploaded file's bytes are hashed when available (a few ms even for a
+    phone photo); otherwise the decoded pixel buffer with its mode and size.
+    Nothing is re-encoded. SHA-256 is used for its speed: hardware-accelerated
+    on current CPUs, and the keys stay stable across processes.
+    
+    Args:
+        image: Decoded image, used when image_bytes is not given
+        image_bytes: Raw bytes of the uploaded image file
+        audio_bytes: Raw bytes of the optional audio file
+    
+    Returns:
+        Hex digest, prefixed with the kind of image data it was computed from
+    """
+    digest = hashlib.sha256()
+    if image_bytes is not None:
+        kind = "file"
+        digest.update(image_bytes)
+    elif image is not None:
+        kind = "pixels"
+        digest.update(f"{image.mode}|{image.size[0]}x{image.size[1]}|".encode())
+        digest.update(image.tobytes())
+    else:
+        raise ValueError("composition_fingerprint() needs an image or its file bytes")
+    if audio_bytes is not None:
+        digest.update(b"|audio|")
+        digest.update(hashlib.sha256(audio_bytes).digest())
+    return f"{kind}:{digest.hexdigest()}"
 
 
 class CompositionCache:
-    """In-memory cache for AI-generated compositions."""
+    """In-memory LRU cache for AI-generated compositions, with a time-to-live and an optional disk tier."""
     
-    def __init__(self, max_size: int = 100, ttl_seconds: int = 3600):
+    def __init__(self, max_size: int = 100, ttl_seconds: int = 3600, disk=None):
         """
         Initialize the cache.
         
         Args:
-            max_size: Maximum number of cached items
-            ttl_seconds: Time-to-live for cache entries (default: 1 hour)
+            max_size: Maximum number of cached items; least recently used go first
+            ttl_seconds: Time-to-live for cache entries, from insertion (default: 1 hour)
+            disk: Optional shared second tier (composition_store.CompositionStore):
+                written on every set, looked up on a memory miss, hits promoted to memory
         """
-        self.cache: Dict[str, Dict[str, Any]] = {}
         self.max_size = max_size
         self.ttl_seconds = ttl_seconds
+        self.disk = disk
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()  # Least recently used first
+        self._inserted: "OrderedDict[str, float]" = OrderedDict()  # key -> insertion time, oldest first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
     
-    def _get_image_hash(self, image: Image.Image) -> str:
-        """Generate a hash from an image for cache key."""
-        # Convert image to bytes
-        img_byte_arr = io.BytesIO()
-        image.save(img_byte_arr, format='PNG')
-        img_bytes = img_byte_arr.getvalue()
-        
-        # Generate SHA256 hash
-        return hashlib.sha256(img_bytes).hexdigest()
+    def _sweep(self, now: float):
+        """
+        Drop the expired entries, oldest insertions first. An entry is swept
+        at most once, so the cost is O(1) amortized per call. Caller holds the lock.
+        """
+        deadline = now - self.ttl_seconds
+        while self._inserted:
+            key, inserted = next(iter(self._inserted.items()))
+            if inserted >= deadline:
+                break
+            del self._inserted[key]
+            del self._entries[key]
+            self.expirations += 1
     
-    def get(self, image: Image.Image, audio_path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """
-        Retrieve a cached composition.
+        Retrieve a cached composition and mark it as most recently used.
+        On a memory miss the disk tier is looked up, and a hit there is
+        promoted into memory.
         
         Args:
-            image: PIL Image object
-            audio_path: Optional path to audio file
+            cache_key: Key from composition_fingerprint()
             
         Returns:
             Cached composition data or None if not found/expired
         """
-        cache_key = self._get_image_hash(image)
-        if audio_path:
-            cache_key += f"_audio_{hashlib.md5(audio_path.encode()).hexdigest()}"
+        with self._lock:
+            self._sweep(time.time())
+            composition = self._entries.get(cache_key)
+            if composition is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return composition
         
-        if cache_key in self.cache:
-            entry = self.cache[cache_key]
-            
-            # Check if expired
-            if time.time() - entry['timestamp'] > self.ttl_seconds:
-                del self.cache[cache_key]
+        # Outside the lock: other threads keep using the memory tier during the disk read
+        composition = self.disk.get(cache_key) if self.disk is not None else None
+        with self._lock:
+            if composition is None:
+                self.misses += 1
                 return None
-            
-            return entry['data']
-        
-        return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._insert(cache_key, composition, time.time())
+        return composition
+    
+    def _insert(self, cache_key: str, composition: Dict[str, Any], now: float):
+        """Add or replace a memory entry as most recently used. Caller holds the lock."""
+        if self.max_size <= 0:
+            return
+        self._sweep(now)
+        if cache_key in self._entries:
+            del self._entries[cache_key]
+            del self._inserted[cache_key]
+        elif len(self._entries) >= self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            del self._inserted[evicted]
+            self.evictions += 1
+        self._entries[cache_key] = composition
+        self._inserted[cache_key] = now
     
-    def set(self, image: Image.Image, composition: Dict[str, Any], audio_path: Optional[str] = None):
+    def set(self, cache_key: str, composition: Dict[str, Any]):
         """
-        Store a composition in the cache.
+        Store a composition in the cache, evicting the least recently used one
+        if full, and in the disk tier.
         
         Args:
-            image: PIL Image object
+            cache_key: Key from composition_fingerprint()
             composition: Composition data to cache
-            audio_path: Optional path to audio file
         """
-        cache_key = self._get_image_hash(image)
-        if audio_path:
-            cache_key += f"_audio_{hashlib.md5(audio_path.encode()).hexdigest()}"
-        
-        # Implement LRU eviction if cache is full
-        if len(self.cache) >= self.max_size:
-            # Remove oldest entry
-            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k]['timestamp'])
-            del self.cache[oldest_key]
-        
-        self.cache[cache_key] = {
-            'data': composition,
-            'timestamp': time.time()
-        }
+        with self._lock:
+            self._insert(cache_key, composition, time.time())
+        if self.disk is not None:
+            self.disk.set(cache_key, composition)
     
     def clear(self):
-        """Clear all cached entries."""
-        self.cache.clear()
+        """Clear all cached entries of the memory tier (the shared disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._inserted.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics."""
-        return {
-            'size': len(self.cache),
-            'max_size': self.max_size,
-            'ttl_seconds': self.ttl_seconds,
-            'oldest_entry_age': min(
-                [time.time() - entry['timestamp'] for entry in self.cache.values()],
-                default=0
-            )
-        }
+        """Get cache statistics (running counters, no scan of the entries)."""
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            lookups = self.hits + self.misses
+            oldest = next(iter(self._inserted.values()), now)
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'oldest_entry_age': now - oldest,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'disk_hits': self.disk_hits,
+                'disk': self.disk.get_stats() if self.disk is not None else None,
+            }
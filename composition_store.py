@@ -0,0 +1,275 @@
+"""
+Persistent tier of the composition cache, shared by every session, worker and
+process on the machine. Compositions are kept in a SQLite database in WAL
+mode (readers never wait for the writer), under the same fingerprint keys as
+the in-memory CompositionCache, and survive restarts.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+# Compaction brings the database back to this fraction of its budget, so it
+# does not run again on the next insert
+_COMPACT_TO = 0.9
+
+# Reads refresh an entry's access time at most this often (seconds): the
+# recency used by compaction, without turning every read into a write
+_ACCESS_RESOLUTION = 60.0
+
+# Seconds a write waits for the writer lock held by another connection
+_BUSY_TIMEOUT = 10.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS compositions (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS compositions_accessed ON compositions (accessed);
+CREATE INDEX IF NOT EXISTS compositions_created ON compositions (created);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    entries INTEGER NOT NULL,
+    bytes INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0);
+"""
+
+
+class CompositionStore:
+    """Compositions on disk with a byte budget, a time-to-live and least-recently-used compaction."""
+    
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 30 * 86400):
+        """
+        Open (or create) the database.
+        
+        Args:
+            path: SQLite file, shared by all processes using the same store
+            max_bytes: Size of the stored compositions above which the store compacts itself
+            ttl_seconds: Age after which an entry is ignored, then dropped at the next compaction
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()  # One connection per thread
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.compactions = 0
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        with self._write(conn):
+            for statement in _SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the calling thread, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit: write transactions are opened explicitly by _write()
+            conn = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT, isolation_level=None)
+            # Freed pages go back to the file system after each compaction; only
+            # takes effect on a new file, so it comes before anything else
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    @contextmanager
+    def _write(self, conn: sqlite3.Connection):
+        """Write transaction. BEGIN IMMEDIATE takes the single writer lock up front (waiting up to the timeout)."""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Retrieve a stored composition.
+        
+        Args:
+            key: Key from cache.composition_fingerprint()
+        
+        Returns:
+            Composition data, or None if missing, expired or unreadable
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT data, created, accessed FROM compositions WHERE key = ?", (key,)
+            ).fetchone()
+            composition = None
+            if row is not None and row[1] >= now - self.ttl_seconds:
+                composition = json.loads(row[0])
+                if now - row[2] > _ACCESS_RESOLUTION:
+                    self._touch(conn, key, now)
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Warning: composition store read failed: {e}")
+            composition = None
+        
+        with self._stats_lock:
+            if composition is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return composition
+    
+    def _touch(self, conn: sqlite3.Connection, key: str, now: float):
+        """Refresh an entry's access time if the writer lock is free, without waiting for it."""
+        conn.execute("PRAGMA busy_timeout = 0")
+        try:
+            conn.execute("UPDATE compositions SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.OperationalError:
+            pass  # Writer busy: the recency update can wait for the next read
+        finally:
+            conn.execute(f"PRAGMA busy_timeout = {int(_BUSY_TIMEOUT * 1000)}")
+    
+    def set(self, key: str, composition: Dict[str, Any]) -> bool:
+        """
+        Store a composition, compacting the store if it goes over budget.
+        
+        Args:
+            key: Key from cache.composition_fingerprint()
+            composition: JSON-serializable composition data
+        
+        Returns:
+            True if stored
+        """
+        data = json.dumps(composition, ensure_ascii=False, separators=(',', ':'))
+        size = len(data.encode('utf-8'))
+        if size > self.max_bytes:
+            return False
+        now = time.time()
+        compacted = False
+        try:
+            conn = self._connect()
+            with self._write(conn):
+                previous = conn.execute("SELECT size FROM compositions WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO compositions (key, data, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, data, size, now, now)
+                )
+                conn.execute(
+                    "UPDATE totals SET entries = entries + ?, bytes = bytes + ? WHERE id = 0",
+                    (0 if previous else 1, size - (previous[0] if previous else 0))
+                )
+                total = conn.execute("SELECT bytes FROM totals WHERE id = 0").fetchone()[0]
+                if total > self.max_bytes:
+                    self._compact(conn, now, total)
+                    compacted = True
+            if compacted:
+                conn.execute("PRAGMA incremental_vacuum")
+        except sqlite3.Error as e:
+            print(f"Warning: composition store write failed: {e}")
+            return False
+        
+        with self._stats_lock:
+            self.writes += 1
+            self.compactions += compacted
+        return True
+    
+    def _compact(self, conn: sqlite3.Connection, now: float, total: int):
+        """
+        Drop expired entries, then least recently accessed ones until the store
+        is back to _COMPACT_TO of its budget. Runs inside the caller's write transaction.
+        """
+        target = int(self.max_bytes * _COMPACT_TO)
+        deadline = now - self.ttl_seconds
+        expired_entries, expired_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM compositions WHERE created < ?", (deadline,)
+        ).fetchone()
+        conn.execute("DELETE FROM compositions WHERE created < ?", (deadline,))
+        total -= expired_bytes
+        
+        victims, freed = [], 0
+        if total > target:
+            for key, size in conn.execute("SELECT key, size FROM compositions ORDER BY accessed"):
+                victims.append((key,))
+                freed += size
+                if total - freed <= target:
+                    break
+            conn.executemany("DELETE FROM compositions WHERE key = ?", victims)
+        
+        conn.execute(
+            "UPDATE totals SET entries = entries - ?, bytes = bytes - ? WHERE id = 0",
+            (expired_entries + len(victims), expired_bytes + freed)
+        )
+    
+    def clear(self):
+        """Remove all stored compositions."""
+        conn = self._connect()
+        with self._write(conn):
+            conn.execute("DELETE FROM compositions")
+            conn.execute("UPDATE totals SET entries = 0, bytes = 0 WHERE id = 0")
+        conn.execute("PRAGMA incremental_vacuum")
+    
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get store statistics: shared totals from the database, counters of this process."""
+        try:
+            entries, total = self._connect().execute("SELECT entries, bytes FROM totals WHERE id = 0").fetchone()
+        except sqlite3.Error:
+            entries, total = 0, 0
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': entries,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'writes': self.writes,
+                'compactions': self.compactions,
+            }
+
+
+_store = None
+_store_disabled = False
+_store_lock = threading.Lock()
+
+def get_composition_store() -> Optional[CompositionStore]:
+    """
+    Composition store of this process, opened on first use.
+    Budget from COMPOSITION_CACHE_MB (0 disables the store), entry lifetime from
+    COMPOSITION_CACHE_TTL_DAYS, file under CACHE_DIR.
+    Returns None when the store is disabled or cannot be opened.
+    """
+    global _store, _store_disabled
+    with _store_lock:
+        if _store is None and not _store_disabled:
+            max_mb = float(os.getenv('COMPOSITION_CACHE_MB', '64'))
+            path = os.path.join(os.getenv('CACHE_DIR', '.cache'), 'compositions.sqlite3')
+            if max_mb <= 0:
+                _store_disabled = True
+            else:
+                try:
+                    _store = CompositionStore(
+                        path, int(max_mb * 1024 * 1024),
+                        ttl_seconds=float(os.getenv('COMPOSITION_CACHE_TTL_DAYS', '30')) * 86400
+                    )
+                except (OSError, sqlite3.Error) as e:
+                    _store_disabled = True
+                    print(f"Warning: composition store unavailable: {e}")
+        return _store
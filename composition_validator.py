@@ -0,0 +1,264 @@
+"""
+Validation of the composition JSON returned by the AI model.
+The JSON schema is compiled once at import; a semantic pass then checks note
+names, pitch ranges and track lengths on the note arrays, and can repair small
+issues in place of another API round trip.
+"""
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import fastjsonschema
+import numpy as np
+from jsonschema import Draft7Validator
+
+from music_utils import TRACK_LAYOUT, NoteEvents, pitch_code
+
+
+# Schema bounds of an event duration, in beats
+_MIN_DURATION = 0.125
+_MAX_DURATION = 8.0
+
+
+def _event_schema(notes_field: Dict[str, Any], required: str) -> Dict[str, Any]:
+    return {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "required": [required, "duration"],
+            "properties": {
+                required: notes_field,
+                "duration": {"type": "number", "minimum": _MIN_DURATION, "maximum": _MAX_DURATION}
+            }
+        }
+    }
+
+COMPOSITION_SCHEMA = {
+    "type": "object",
+    "required": ["mood", "tempo", "key", "time_signature", "reasoning", "tracks"],
+    "properties": {
+        "mood": {"type": "string"},
+        "reasoning": {"type": "string"},
+        "key": {"type": "string"},
+        "time_signature": {"type": "string"},
+        "tempo": {"type": "number", "minimum": 40, "maximum": 240},
+        "suggested_instrument": {"type": "string"},
+        "tracks": {
+            "type": "object",
+            "properties": {
+                "melody": _event_schema({"type": "string"}, "note"),
+                "bass": _event_schema({"type": "string"}, "note"),
+                "chords": _event_schema({"type": "array", "items": {"type": "string"}}, "notes"),
+            }
+        }
+    }
+}
+
+# fastjsonschema generates Python code for the schema: ~20x faster than jsonschema on
+# valid answers. It stops at the first error, so jsonschema lists them all on a failure
+_check_schema = fastjsonschema.compile(COMPOSITION_SCHEMA)
+_SCHEMA_VALIDATOR = Draft7Validator(COMPOSITION_SCHEMA)
+
+# Durations are snapped to this grid in beats: 32nd notes and eighth-note triplets
+DURATION_GRID = 1 / 24
+
+# Comfortable MIDI range of each track (melody C3-C7, bass C1-E4, chords C2-C6);
+# notes outside are reported, not changed
+TRACK_RANGES = {'melody': (48, 96), 'bass': (24, 64), 'chords': (36, 84)}
+
+# Longest rest added at once when padding a track (stays within the schema maximum)
+_MAX_PAD_BEATS = 4.0
+
+
+class ValidationReport:
+    """Outcome of validate_composition()."""
+    
+    def __init__(self):
+        self.errors: List[str] = []     # The composition cannot be used
+        self.warnings: List[str] = []   # Usable, but not what the prompt asks for
+        self.repairs: List[str] = []    # Changes made to the composition
+        self.track_beats: Dict[str, float] = {}  # Length of every track after repairs
+        self.seconds = 0.0
+    
+    @property
+    def valid(self) -> bool:
+        return not self.errors
+    
+    def summary(self) -> str:
+        """One line for the logs."""
+        parts = [f"{len(self.errors)} errors", f"{len(self.warnings)} warnings", f"{len(self.repairs)} repairs"]
+        details = self.errors + self.warnings + self.repairs
+        return ', '.join(parts) + (': ' + '; '.join(details) if details else '')
+
+
+def _schema_errors(data: Any) -> List[str]:
+    """Every schema violation, as 'path: message'."""
+    errors = []
+    for error in sorted(_SCHEMA_VALIDATOR.iter_errors(data), key=lambda e: list(e.absolute_path)):
+        location = '/'.join(str(part) for part in error.absolute_path) or 'root'
+        errors.append(f"{location}: {error.message}")
+    return errors
+
+
+def _event_names(event: Dict[str, Any], is_chord: bool) -> List[str]:
+    names = event.get('notes', []) if is_chord else [event.get('note')]
+    return [name for name in names if name and name != "REST"]
+
+
+def _invalid_names(tracks: Dict[str, list]) -> Dict[str, str]:
+    """Note names that do not parse or fall outside MIDI, each distinct name checked once."""
+    names = {name for key, _, _, is_chord in TRACK_LAYOUT
+             for event in tracks.get(key, []) for name in _event_names(event, is_chord)}
+    invalid = {}
+    for name in names:
+        try:
+            pitch_code(name)
+        except ValueError as e:
+            invalid[name] = str(e)
+    return invalid
+
+
+def _rest(duration: float, is_chord: bool) -> Dict[str, Any]:
+    return {"notes": ["REST"], "duration": duration} if is_chord else {"note": "REST", "duration": duration}
+
+
+def _on_grid(beats: float) -> float:
+    return round(beats / DURATION_GRID) * DURATION_GRID
+
+
+def _padding(events: List[Dict[str, Any]], gap: float, is_chord: bool) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Events extended by gap beats, every duration within the schema bounds: a
+    leftover shorter than the schema minimum is folded into the previous rest,
+    or into the last event when the whole gap is that short.
+    
+    Returns:
+        (events, description of the change for the report)
+    """
+    events = list(events)
+    pieces = [_MAX_PAD_BEATS] * int(gap // _MAX_PAD_BEATS)
+    leftover = _on_grid(gap - sum(pieces))
+    if leftover >= _MIN_DURATION:
+        pieces.append(leftover)
+    elif leftover > 0 and pieces:
+        pieces[-1] += leftover
+    elif leftover > 0:
+        last = events[-1]
+        if last['duration'] + leftover <= _MAX_DURATION:
+            events[-1] = dict(last, duration=_on_grid(last['duration'] + leftover))
+            return events, f"last event lengthened by {leftover:g} beats"
+        # Last event already near the maximum: it gives up what a minimal rest needs
+        events[-1] = dict(last, duration=_on_grid(last['duration'] + leftover - _MIN_DURATION))
+        return events + [_rest(_MIN_DURATION, is_chord)], (
+            f"last event shortened by {_MIN_DURATION - leftover:g} beats, then a {_MIN_DURATION:g} beat rest"
+        )
+    return events + [_rest(piece, is_chord) for piece in pieces], f"padded with {gap:g} beats of rest"
+
+
+def validate_composition(data: Any, repair: bool = True) -> Tuple[Optional[Dict[str, Any]], ValidationReport]:
+    """
+    Check a composition JSON and optionally repair it.
+    
+    Schema violations are errors. The semantic pass then checks that:
+    - note names parse and are MIDI notes; with repair they become rests
+    - durations sit on DURATION_GRID; with repair they are snapped to it
+    - melody, bass and chords have the same length; with repair the shorter
+      tracks are padded with rests
+    - pitches stay within TRACK_RANGES (warnings only)
+    
+    Args:
+        data: Parsed JSON from the model
+        repair: Fix what can be fixed instead of reporting it as an error
+    
+    Returns:
+        (composition, report): the composition is a repaired copy (data itself
+        is never modified), or None when the report has errors
+    """
+    start = time.perf_counter()
+    report = ValidationReport()
+    
+    try:
+        _check_schema(data)
+    except fastjsonschema.JsonSchemaException:
+        report.errors.extend(_schema_errors(data))
+        report.seconds = time.perf_counter() - start
+        return None, report
+    
+    tracks = dict(data['tracks'])
+    layout = [(key, is_chord) for key, _, _, is_chord in TRACK_LAYOUT if key in tracks]
+    
+    # Note names
+    invalid = _invalid_names(tracks)
+    if invalid and not repair:
+        report.errors.extend(reason for _, reason in sorted(invalid.items()))
+        report.seconds = time.perf_counter() - start
+        return None, report
+    if invalid:
+        report.repairs.extend(f"{reason}, replaced by a rest" for _, reason in sorted(invalid.items()))
+        for key, is_chord in layout:
+            events = []
+            for event in tracks[key]:
+                names = _event_names(event, is_chord)
+                if any(name in invalid for name in names):
+                    kept = [name for name in names if name not in invalid]
+                    if is_chord:
+                        event = dict(event, notes=kept or ["REST"])
+                    else:
+                        event = dict(event, note="REST")
+                events.append(event)
+            tracks[key] = events
+    
+    # Durations on the grid
+    for key, is_chord in layout:
+        durations = np.array([float(event['duration']) for event in tracks[key]], dtype=np.float64)
+        snapped = np.round(durations / DURATION_GRID) * DURATION_GRID
+        off_grid = np.flatnonzero(np.abs(snapped - durations) > 1e-6)
+        if len(off_grid) == 0:
+            continue
+        message = f"{key}: {len(off_grid)} durations off the 1/{round(1 / DURATION_GRID)} beat grid"
+        if not repair:
+            report.warnings.append(message)
+            continue
+        report.repairs.append(message + ", snapped")
+        events = list(tracks[key])
+        for i in off_grid.tolist():
+            events[i] = dict(events[i], duration=float(snapped[i]))
+        tracks[key] = events
+    
+    notes = NoteEvents.from_json({'tracks': tracks})
+    
+    # Pitch ranges
+    for track in notes.tracks:
+        key = TRACK_LAYOUT[track][0]
+        pitches = notes.track(track)['pitch']
+        low, high = TRACK_RANGES[key]
+        outside = np.count_nonzero((pitches < low) | (pitches > high))
+        if outside:
+            report.warnings.append(f"{key}: {outside}/{len(pitches)} notes outside MIDI {low}-{high} "
+                                   f"(lowest {pitches.min()}, highest {pitches.max()})")
+    
+    # Track lengths
+    lengths = {TRACK_LAYOUT[track][0]: float(notes.lengths[track]) for track in notes.tracks}
+    target = max(lengths.values(), default=0.0)
+    for key, is_chord in layout:
+        gap = target - lengths[key]
+        if gap <= 1e-6:
+            continue
+        message = f"{key}: {lengths[key]:g} beats, {target:g} in the longest track"
+        if not repair:
+            report.warnings.append(message)
+            continue
+        tracks[key], change = _padding(tracks[key], _on_grid(gap), is_chord)
+        report.repairs.append(f"{message}, {change}")
+        lengths[key] = target
+    
+    # Repairs must produce what the schema accepts
+    composition = dict(data, tracks=tracks)
+    if report.repairs:
+        try:
+            _check_schema(composition)
+        except fastjsonschema.JsonSchemaException:
+            report.errors.extend(f"{error} (after repairs)" for error in _schema_errors(composition))
+    
+    report.track_beats = lengths
+    report.seconds = time.perf_counter() - start
+    return (composition if report.valid else None), report
@@ -0,0 +1,172 @@
+"""
+Background encoding of audio downloads for img2music.
+Exports (MP3, Ogg Opus, FLAC) are encoded on a small thread pool only when a
+format is requested or pre-warmed, and the encoded bytes are kept in memory
+under a hash of the PCM and the format, so nobody waits for an encode they
+never download and an unchanged piece is never encoded twice.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+# Failed (audio, format) pairs remembered, so reruns do not retry an encode that
+# cannot succeed (no ffmpeg, unsupported input); oldest forgotten first
+_MAX_FAILED = 1024
+
+
+class EncodingService:
+    """On-demand audio encoder running in the background, with an LRU cache of encoded bytes."""
+    
+    def __init__(self, encoder: Callable[[int, np.ndarray, str], Optional[bytes]], max_workers: int = 2,
+                 max_bytes: int = 128 * 1024 * 1024):
+        """
+        Args:
+            encoder: encoder(sample_rate, int16 audio, format) -> encoded bytes, or None on failure
+            max_workers: Encodes running at the same time
+            max_bytes: Total size of encoded files kept in memory; least recently used go first
+        """
+        self._encoder = encoder
+        self.max_bytes = max_bytes
+        self._executor = ThreadPoolExecutor(max_workers=max(int(max_workers), 1), thread_name_prefix='encoder')
+        self._lock = threading.Lock()
+        self._done: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()  # Oldest first
+        self._pending: Dict[Tuple[str, str], Future] = {}
+        self._failed: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._bytes = 0
+        self._formats: Dict[str, Dict[str, Any]] = {}
+    
+    @staticmethod
+    def pcm_key(sample_rate: int, audio: np.ndarray) -> str:
+        """Identity of a piece of audio: digest of its samples, rate and layout."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{int(sample_rate)}|{audio.dtype}|{audio.shape}".encode())
+        digest.update(np.ascontiguousarray(audio).data)
+        return digest.hexdigest()
+    
+    def _format_stats(self, fmt: str) -> Dict[str, Any]:
+        """Running totals of a format. Caller holds the lock."""
+        return self._formats.setdefault(fmt, {
+            'encodes': 0, 'failures': 0, 'cache_hits': 0, 'seconds': 0.0, 'pcm_bytes': 0, 'encoded_bytes': 0,
+        })
+    
+    def _encode(self, entry: Tuple[str, str], sample_rate: int, audio: np.ndarray) -> Optional[bytes]:
+        """Worker: encode, then move the result from pending to the cache."""
+        fmt = entry[1]
+        start = time.perf_counter()
+        try:
+            data = self._encoder(sample_rate, audio, fmt)
+        except Exception as e:
+            print(f"Error encoding {fmt}: {e}")
+            data = None
+        duration = time.perf_counter() - start
+        
+        with self._lock:
+            self._pending.pop(entry, None)
+            stats = self._format_stats(fmt)
+            if not data:
+                stats['failures'] += 1
+                self._failed[entry] = None
+                if len(self._failed) > _MAX_FAILED:
+                    self._failed.popitem(last=False)
+                return None
+            stats['encodes'] += 1
+            stats['seconds'] += duration
+            stats['pcm_bytes'] += audio.nbytes
+            stats['encoded_bytes'] += len(data)
+            if len(data) <= self.max_bytes:
+                self._done[entry] = data
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._done.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return data
+    
+    def _lookup(self, entry: Tuple[str, str]) -> Optional[bytes]:
+        """Cached bytes of an entry, marked as most recently used. Caller holds the lock."""
+        data = self._done.get(entry)
+        if data is not None:
+            self._done.move_to_end(entry)
+            self._format_stats(entry[1])['cache_hits'] += 1
+        return data
+    
+    def request(self, sample_rate: int, audio: np.ndarray, fmt: str, key: Optional[str] = None) -> Future:
+        """
+        Get the encoding of audio in a format, starting it in the background if needed.
+        Concurrent requests for the same audio and format share one encode, and
+        an encode that failed is not attempted again.
+        
+        Args:
+            sample_rate: Sample rate of audio in Hz
+            audio: int16 samples, shape (N,) or (N, channels); must not be modified afterwards
+            fmt: Format name understood by the encoder
+            key: pcm_key() of audio, if already known
+        
+        Returns:
+            Future of the encoded bytes (None if encoding failed)
+        """
+        entry = (key or self.pcm_key(sample_rate, audio), fmt)
+        with self._lock:
+            data = self._lookup(entry)
+            if data is not None or entry in self._failed:
+                future = Future()
+                future.set_result(data)
+                return future
+            future = self._pending.get(entry)
+            if future is None:
+                future = self._executor.submit(self._encode, entry, sample_rate, audio)
+                self._pending[entry] = future
+            return future
+    
+    def prewarm(self, sample_rate: int, audio: np.ndarray, formats: Iterable[str], key: Optional[str] = None):
+        """Start encoding formats likely to be downloaded, without waiting."""
+        key = key or self.pcm_key(sample_rate, audio)
+        for fmt in formats:
+            self.request(sample_rate, audio, fmt, key=key)
+    
+    def get(self, sample_rate: int, audio: np.ndarray, fmt: str, key: Optional[str] = None,
+            timeout: Optional[float] = None) -> Optional[bytes]:
+        """Encoded bytes of audio in a format, waiting for the encode if it is still running."""
+        return self.request(sample_rate, audio, fmt, key=key).result(timeout)
+    
+    def peek(self, key: str, fmt: str) -> Optional[bytes]:
+        """Encoded bytes if they are already available, without starting an encode."""
+        with self._lock:
+            return self._lookup((key, fmt))
+    
+    def clear(self):
+        """Drop all cached encodes and remembered failures (running encodes finish and are kept)."""
+        with self._lock:
+            self._done.clear()
+            self._failed.clear()
+            self._bytes = 0
+    
+    def close(self):
+        """Stop the workers; queued encodes are cancelled."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache occupancy and, per format, encode count, average time and compression ratio."""
+        with self._lock:
+            return {
+                'entries': len(self._done),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'pending': len(self._pending),
+                'formats': {
+                    fmt: {
+                        'encodes': stats['encodes'],
+                        'failures': stats['failures'],
+                        'cache_hits': stats['cache_hits'],
+                        'avg_time': stats['seconds'] / stats['encodes'] if stats['encodes'] else 0.0,
+                        'compression_ratio': (
+                            stats['pcm_bytes'] / stats['encoded_bytes'] if stats['encoded_bytes'] else 0.0
+                        ),
+                    }
+                    for fmt, stats in self._formats.items()
+                },
+            }
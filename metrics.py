@@ -3,6 +3,7 @@ Logging and metrics system for img2music.
 Provides structured logging and performance monitoring.
 """
 import logging
+import threading
 import time
 import json
 from functools import wraps
@@ -36,68 +37,167 @@ class MetricsCollector:
             'total_processing_time': 0.0,
             'api_response_times': [],
             'audio_generation_times': [],
+            'time_to_first_audio': [],
+            'effects_chain_times': [],
+            'effects_allocated_bytes': [],
+            'effects_cache_hits': 0,
+            'effects_cache_misses': 0,
+            'render_cache_hits': 0,
+            'render_cache_misses': 0,
+            'render_cache_bytes_saved': 0,
+            'io_stages': {},
         }
         self.start_time = time.time()
+        # Recorded from worker threads (renders, encodes) while the app reads the stats
+        self._lock = threading.Lock()
     
     def record_api_call(self, duration: float, cached: bool = False):
         """Record an API call."""
-        if cached:
-            self.metrics['cache_hits'] += 1
-            logger.info(f"Cache hit - instant response")
-        else:
-            self.metrics['cache_misses'] += 1
-            self.metrics['api_calls'] += 1
-            self.metrics['api_response_times'].append(duration)
-            logger.info(f"API call completed in {duration:.2f}s")
+        with self._lock:
+            if cached:
+                self.metrics['cache_hits'] += 1
+                logger.info(f"Cache hit - instant response")
+            else:
+                self.metrics['cache_misses'] += 1
+                self.metrics['api_calls'] += 1
+                self.metrics['api_response_times'].append(duration)
+                logger.info(f"API call completed in {duration:.2f}s")
     
     def record_composition(self, duration: float):
         """Record a composition generation."""
-        self.metrics['compositions_generated'] += 1
-        self.metrics['total_processing_time'] += duration
-        logger.info(f"Composition generated in {duration:.2f}s")
+        with self._lock:
+            self.metrics['compositions_generated'] += 1
+            self.metrics['total_processing_time'] += duration
+            logger.info(f"Composition generated in {duration:.2f}s")
     
     def record_audio_generation(self, duration: float):
         """Record audio generation time."""
-        self.metrics['audio_generation_times'].append(duration)
-        logger.debug(f"Audio generated in {duration:.2f}s")
+        with self._lock:
+            self.metrics['audio_generation_times'].append(duration)
+            logger.debug(f"Audio generated in {duration:.2f}s")
+    
+    def record_time_to_first_audio(self, duration: float):
+        """Record the time from the request to the first playable audio (preview or full render)."""
+        with self._lock:
+            self.metrics['time_to_first_audio'].append(duration)
+            logger.info(f"First audio ready in {duration:.2f}s")
+    
+    def record_effects_chain(self, duration: float, allocated_bytes: int, cache_hits: int = 0, cache_misses: int = 0):
+        """Record an effects chain run, the bytes it allocated and its stage cache lookups."""
+        with self._lock:
+            self.metrics['effects_chain_times'].append(duration)
+            self.metrics['effects_allocated_bytes'].append(allocated_bytes)
+            self.metrics['effects_cache_hits'] += cache_hits
+            self.metrics['effects_cache_misses'] += cache_misses
+            logger.debug(f"Effects chain completed in {duration:.3f}s ({allocated_bytes} bytes allocated)")
+    
+    def record_render_cache(self, hit: bool, bytes_saved: int = 0):
+        """Record a render cache lookup and the PCM bytes it spared FluidSynth from synthesizing."""
+        with self._lock:
+            if hit:
+                self.metrics['render_cache_hits'] += 1
+                self.metrics['render_cache_bytes_saved'] += bytes_saved
+                logger.debug(f"Render cache hit ({bytes_saved} bytes)")
+            else:
+                self.metrics['render_cache_misses'] += 1
+    
+    def record_io_stage(self, stage: str, bytes_in: int, bytes_out: int, duration: float):
+        """Record one pass through an audio I/O stage (synthesis, encoding) and the bytes it moved."""
+        with self._lock:
+            totals = self.metrics['io_stages'].setdefault(
+                stage, {'calls': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0}
+            )
+            totals['calls'] += 1
+            totals['bytes_in'] += bytes_in
+            totals['bytes_out'] += bytes_out
+            totals['seconds'] += duration
+            logger.debug(f"{stage}: {bytes_in} bytes in, {bytes_out} bytes out in {duration:.3f}s")
     
     def record_error(self, error_type: str, error_msg: str):
         """Record an error."""
-        self.metrics['errors'] += 1
-        logger.error(f"{error_type}: {error_msg}")
+        with self._lock:
+            self.metrics['errors'] += 1
+            logger.error(f"{error_type}: {error_msg}")
     
     def get_stats(self) -> Dict[str, Any]:
         """Get current statistics."""
-        uptime = time.time() - self.start_time
-        
-        avg_api_time = (
-            sum(self.metrics['api_response_times']) / len(self.metrics['api_response_times'])
-            if self.metrics['api_response_times'] else 0
-        )
-        
-        avg_audio_time = (
-            sum(self.metrics['audio_generation_times']) / len(self.metrics['audio_generation_times'])
-            if self.metrics['audio_generation_times'] else 0
-        )
-        
-        cache_hit_rate = (
-            self.metrics['cache_hits'] / (self.metrics['cache_hits'] + self.metrics['cache_misses'])
-            if (self.metrics['cache_hits'] + self.metrics['cache_misses']) > 0 else 0
-        )
-        
-        return {
-            'uptime_seconds': uptime,
-            'uptime_formatted': f"{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m",
-            'total_compositions': self.metrics['compositions_generated'],
-            'api_calls': self.metrics['api_calls'],
-            'cache_hit_rate': f"{cache_hit_rate * 100:.1f}%",
-            'cache_hits': self.metrics['cache_hits'],
-            'cache_misses': self.metrics['cache_misses'],
-            'errors': self.metrics['errors'],
-            'avg_api_response_time': f"{avg_api_time:.2f}s",
-            'avg_audio_generation_time': f"{avg_audio_time:.2f}s",
-            'total_processing_time': f"{self.metrics['total_processing_time']:.2f}s"
-        }
+        with self._lock:
+            uptime = time.time() - self.start_time
+            
+            avg_api_time = (
+                sum(self.metrics['api_response_times']) / len(self.metrics['api_response_times'])
+                if self.metrics['api_response_times'] else 0
+            )
+            
+            avg_audio_time = (
+                sum(self.metrics['audio_generation_times']) / len(self.metrics['audio_generation_times'])
+                if self.metrics['audio_generation_times'] else 0
+            )
+            
+            avg_first_audio_time = (
+                sum(self.metrics['time_to_first_audio']) / len(self.metrics['time_to_first_audio'])
+                if self.metrics['time_to_first_audio'] else 0
+            )
+            
+            avg_effects_time = (
+                sum(self.metrics['effects_chain_times']) / len(self.metrics['effects_chain_times'])
+                if self.metrics['effects_chain_times'] else 0
+            )
+            
+            avg_effects_bytes = (
+                sum(self.metrics['effects_allocated_bytes']) / len(self.metrics['effects_allocated_bytes'])
+                if self.metrics['effects_allocated_bytes'] else 0
+            )
+            
+            cache_hit_rate = (
+                self.metrics['cache_hits'] / (self.metrics['cache_hits'] + self.metrics['cache_misses'])
+                if (self.metrics['cache_hits'] + self.metrics['cache_misses']) > 0 else 0
+            )
+            
+            effects_lookups = self.metrics['effects_cache_hits'] + self.metrics['effects_cache_misses']
+            effects_cache_hit_rate = (
+                self.metrics['effects_cache_hits'] / effects_lookups
+                if effects_lookups > 0 else 0
+            )
+            
+            render_lookups = self.metrics['render_cache_hits'] + self.metrics['render_cache_misses']
+            render_cache_hit_rate = (
+                self.metrics['render_cache_hits'] / render_lookups
+                if render_lookups > 0 else 0
+            )
+            
+            return {
+                'uptime_seconds': uptime,
+                'uptime_formatted': f"{int(uptime // 3600)}h {int((uptime % 3600) // 60)}m",
+                'total_compositions': self.metrics['compositions_generated'],
+                'api_calls': self.metrics['api_calls'],
+                'cache_hit_rate': f"{cache_hit_rate * 100:.1f}%",
+                'cache_hits': self.metrics['cache_hits'],
+                'cache_misses': self.metrics['cache_misses'],
+                'errors': self.metrics['errors'],
+                'avg_api_response_time': f"{avg_api_time:.2f}s",
+                'avg_audio_generation_time': f"{avg_audio_time:.2f}s",
+                'avg_time_to_first_audio': f"{avg_first_audio_time:.2f}s",
+                'avg_effects_chain_time': f"{avg_effects_time:.3f}s",
+                'avg_effects_allocated_bytes': int(avg_effects_bytes),
+                'effects_cache_hits': self.metrics['effects_cache_hits'],
+                'effects_cache_misses': self.metrics['effects_cache_misses'],
+                'effects_cache_hit_rate': f"{effects_cache_hit_rate * 100:.1f}%",
+                'render_cache_hits': self.metrics['render_cache_hits'],
+                'render_cache_misses': self.metrics['render_cache_misses'],
+                'render_cache_hit_rate': f"{render_cache_hit_rate * 100:.1f}%",
+                'render_cache_bytes_saved': self.metrics['render_cache_bytes_saved'],
+                'io_stages': {
+                    stage: {
+                        'calls': totals['calls'],
+                        'bytes_in': totals['bytes_in'],
+                        'bytes_out': totals['bytes_out'],
+                        'avg_time': f"{totals['seconds'] / totals['calls']:.3f}s",
+                    }
+                    for stage, totals in self.metrics['io_stages'].items()
+                },
+                'total_processing_time': f"{self.metrics['total_processing_time']:.2f}s"
+            }
     
     def get_stats_json(self) -> str:
         """Get statistics as JSON string."""
@@ -1,14 +1,31 @@
 import os
+import io
+import re
+import atexit
+import threading
+import time
 import numpy as np
 import tempfile
 import subprocess
 import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fractions import Fraction
+from functools import lru_cache
+
+from midiutil import MIDIFile
 
 # --- PRE-CONFIG ENV ---
 os.environ['MUSIC21_NO_PLAYBACK'] = '1'
 
 import music21
 
+from encoding_service import EncodingService
+from metrics import metrics
+from render_cache import RenderCache
+from synth_engine import SynthEngine
+from synth_pool import SynthWorkerPool
+
 # --- CONFIG MUSIC21 ---
 try:
     music21.environment.set('directoryScratch', '/tmp')
@@ -31,8 +48,313 @@ def get_soundfont_path():
             return p
     return None
 
+# --- FLUIDSYNTH WORKER POOL ---
+_render_pool = None
+_render_pool_error = None
+_render_pool_lock = threading.Lock()
+
+# Seconds a one-off FluidSynth render may take before it is killed (as the pool's render_timeout)
+CLI_RENDER_TIMEOUT = 120.0
+
+def get_render_pool():
+    """
+    Shared pool of FluidSynth workers with the soundfont preloaded, started on first use.
+    Size comes from SYNTH_WORKERS (0 disables the pool), the interval between
+    background health checks of idle workers from SYNTH_HEALTH_INTERVAL (seconds).
+    Returns None when the pool is disabled or cannot start (renders then use the CLI).
+    """
+    global _render_pool, _render_pool_error
+    with _render_pool_lock:
+        if _render_pool is None and _render_pool_error is None:
+            size = int(os.getenv('SYNTH_WORKERS', '2'))
+            sf2_path = get_soundfont_path()
+            if size <= 0 or not sf2_path:
+                _render_pool_error = "disabled"
+            else:
+                try:
+                    _render_pool = SynthWorkerPool(
+                        sf2_path, size=size,
+                        health_interval=float(os.getenv('SYNTH_HEALTH_INTERVAL', '60'))
+                    )
+                    atexit.register(_render_pool.close)
+                except Exception as e:
+                    _render_pool_error = str(e)
+                    print(f"Warning: FluidSynth worker pool unavailable, using the CLI: {e}")
+        return _render_pool
+
+# --- RENDER CACHE ---
+_render_cache = None
+_render_cache_disabled = False
+_render_cache_lock = threading.Lock()
+
+def get_render_cache():
+    """
+    Shared disk cache of FluidSynth renders, created on first use.
+    Budget comes from RENDER_CACHE_MB (0 disables the cache), location from RENDER_CACHE_DIR.
+    Returns None when the cache is disabled or its directory is unusable.
+    """
+    global _render_cache, _render_cache_disabled
+    with _render_cache_lock:
+        if _render_cache is None and not _render_cache_disabled:
+            max_mb = float(os.getenv('RENDER_CACHE_MB', '512'))
+            directory = os.getenv('RENDER_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'img2music_renders'))
+            if max_mb <= 0:
+                _render_cache_disabled = True
+            else:
+                try:
+                    _render_cache = RenderCache(directory, int(max_mb * 1024 * 1024))
+                except OSError as e:
+                    _render_cache_disabled = True
+                    print(f"Warning: render cache unavailable: {e}")
+        return _render_cache
+
+# --- ENCODING SERVICE ---
+
+# Download formats: ffmpeg output options, file extension and MIME type
+AUDIO_FORMATS = {
+    'mp3': {'label': 'MP3', 'args': ['-acodec', 'libmp3lame', '-q:a', '2', '-f', 'mp3'],
+            'ext': 'mp3', 'mime': 'audio/mpeg'},
+    # Opus only runs at 48 kHz (or its divisors), so the stream is resampled
+    'opus': {'label': 'Ogg Opus', 'args': ['-acodec', 'libopus', '-b:a', '128k', '-ar', '48000', '-f', 'ogg'],
+             'ext': 'opus', 'mime': 'audio/ogg'},
+    'flac': {'label': 'FLAC', 'args': ['-acodec', 'flac', '-compression_level', '5', '-f', 'flac'],
+             'ext': 'flac', 'mime': 'audio/flac'},
+}
+
+_encoding_service = None
+_encoding_service_lock = threading.Lock()
+
+def get_encoding_service():
+    """
+    Shared background encoder for audio downloads, created on first use.
+    Worker count from ENCODE_WORKERS (default 2), memory budget of encoded
+    files from ENCODE_CACHE_MB (default 128).
+    """
+    global _encoding_service
+    with _encoding_service_lock:
+        if _encoding_service is None:
+            _encoding_service = EncodingService(
+                encode_audio,
+                max_workers=int(os.getenv('ENCODE_WORKERS', '2')),
+                max_bytes=int(float(os.getenv('ENCODE_CACHE_MB', '128')) * 1024 * 1024)
+            )
+            atexit.register(_encoding_service.close)
+        return _encoding_service
+
+# --- MIDI CONSTANTS ---
+
+# Map common suggestions to General MIDI program numbers
+MIDI_PROGRAMS = {
+    'piano': 0,          # Acoustic Grand Piano
+    'synth_retro': 81,   # Lead 2 (sawtooth) - roughly retro
+    'strings': 48,       # String Ensemble 1
+    'bass': 33,          # Electric Bass (finger)
+    'guitar': 25,        # Acoustic Guitar (nylon)
+    'brass': 61,         # Brass Section
+    'drums': 0,          # Drums are channel 10, program doesn't matter much usually
+    'sax': 65,           # Alto Sax
+    'flute': 73,         # Flute
+}
+
+# Composition tracks in score order: (JSON key, part name, GM program, chord events)
+# Programs match the music21 parts: Piano, ElectricBass, StringInstrument
+TRACK_LAYOUT = (
+    ('melody', 'Melody', 0, False),
+    ('bass', 'Bass', 33, False),
+    ('chords', 'Chords', 48, True),
+)
+
+# Built-in synthesizer timbre (first track: the chosen instrument) and mixdown pan of each track stem
+TRACK_TIMBRES = {'melody': 'piano', 'bass': 'bass', 'chords': 'strings'}
+TRACK_PANS = {'melody': -0.2, 'bass': 0.0, 'chords': 0.3}
+
+# Bars rendered first in progressive mode, so playback starts before the full render
+PREVIEW_BARS = 4
+
+MIDI_VELOCITY = 90  # music21's default when a note has no velocity
+MIDI_TICKS_PER_QUARTER = 960
+
+_PITCH_RE = re.compile(r'^([A-Ga-g])([#b-]*)(-?\d+)?$')
+_STEP_SEMITONES = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+_SEMITONE_STEPS = {semitone: step for step, semitone in _STEP_SEMITONES.items()}
+
+@lru_cache(maxsize=1024)
+def parse_pitch(name):
+    """
+    Split a pitch name into (step, alter, octave) with music21's spelling rules:
+    case-insensitive step, '#' sharps, '-' or 'b' flats, octave 4 if omitted.
+    "Bb3" -> ('B', -1, 3).
+    """
+    match = _PITCH_RE.match(name.strip())
+    if not match:
+        raise ValueError(f"Invalid note name: {name!r}")
+    step, accidentals, octave = match.groups()
+    alter = accidentals.count('#') - len(accidentals.replace('#', ''))
+    return step.upper(), alter, int(octave if octave is not None else 4)
+
+@lru_cache(maxsize=1024)
+def pitch_to_midi(name):
+    """
+    MIDI number of a pitch name, spelled as in parse_pitch().
+    "C4" -> 60, "B-3"/"Bb3" -> 58.
+    """
+    step, alter, octave = parse_pitch(name)
+    midi = 12 * (octave + 1) + _STEP_SEMITONES[step] + alter
+    if not 0 <= midi <= 127:
+        raise ValueError(f"Note out of MIDI range: {name!r}")
+    return midi
+
+@lru_cache(maxsize=1024)
+def pitch_code(name):
+    """(MIDI number, written alteration) of a pitch name: "Bb3" -> (58, -1)."""
+    return pitch_to_midi(name), parse_pitch(name)[1]
+
+# --- NOTE EVENTS ---
+
+# One row per sounding pitch: chords are flattened, rests dropped. Onsets and
+# durations are in beats (quarter notes); alter keeps the written accidental so
+# "C#4" and "Db4" are still spelled apart in ABC.
+NOTE_EVENT_DTYPE = np.dtype([
+    ('track', np.uint8),       # Index into TRACK_LAYOUT
+    ('pitch', np.uint8),       # MIDI number
+    ('alter', np.int8),        # Semitones of the written accidental
+    ('velocity', np.uint8),    # MIDI velocity
+    ('onset', np.float64),
+    ('duration', np.float64),
+])
+
+_EMPTY_EVENTS = np.zeros(0, dtype=NOTE_EVENT_DTYPE)
+_EMPTY_EVENTS.setflags(write=False)
+
+class NoteEvents:
+    """
+    Columnar form of a composition JSON, built once and read by the MIDI and ABC
+    writers, the synthesizers and the stem renderer instead of the dicts.
+    
+    Attributes:
+        events: read-only NOTE_EVENT_DTYPE array, grouped by track in TRACK_LAYOUT
+            order, then in JSON order
+        tracks: TRACK_LAYOUT indices of the tracks present in the JSON
+        lengths: float64 array, length in beats of every TRACK_LAYOUT track,
+            trailing rests included (0 if absent)
+        tempo, key, time_signature, mood: composition fields, None if missing
+    """
+    
+    __slots__ = ('events', 'tracks', 'lengths', 'tempo', 'key', 'time_signature', 'mood')
+    
+    def __init__(self, events, tracks, lengths, tempo=None, key=None, time_signature=None, mood=None):
+        events.setflags(write=False)
+        self.events = events
+        self.tracks = tuple(tracks)
+        self.lengths = lengths
+        self.tempo = tempo
+        self.key = key
+        self.time_signature = time_signature
+        self.mood = mood
+    
+    @classmethod
+    def from_json(cls, json_data):
+        """
+        Build the events of a composition JSON. Note names go through the
+        pitch_code() lookup table, so each distinct spelling is parsed once.
+        
+        Raises:
+            ValueError: on an invalid or out of range note name
+        """
+        tracks_data = json_data.get('tracks', {})
+        tracks, columns = [], []
+        lengths = np.zeros(len(TRACK_LAYOUT))
+        
+        for track, (key, _, _, is_chord) in enumerate(TRACK_LAYOUT):
+            if key not in tracks_data:
+                continue
+            tracks.append(track)
+            durations, counts, names = [], [], []
+            for event in tracks_data[key]:
+                durations.append(float(event.get('duration', 1.0)))
+                sounding = [name for name in (event.get('notes', []) if is_chord else [event.get('note')])
+                            if name and name != "REST"]
+                counts.append(len(sounding))
+                names.extend(sounding)
+            
+            # Running sum, as the writers used to advance their position
+            ends = np.cumsum(durations, dtype=np.float64)
+            onsets = np.concatenate(([0.0], ends[:-1]))
+            lengths[track] = ends[-1] if len(ends) else 0.0
+            rows = np.zeros(len(names), dtype=NOTE_EVENT_DTYPE)
+            rows['track'] = track
+            if names:
+                codes = np.array([pitch_code(name) for name in names], dtype=np.int16)
+                rows['pitch'] = codes[:, 0]
+                rows['alter'] = codes[:, 1]
+                rows['velocity'] = MIDI_VELOCITY
+                rows['onset'] = np.repeat(onsets, counts)
+                rows['duration'] = np.repeat(durations, counts)
+            columns.append(rows)
+        
+        events = np.concatenate(columns) if columns else _EMPTY_EVENTS.copy()
+        return cls(events, tracks, lengths, json_data.get('tempo'), json_data.get('key'),
+                   json_data.get('time_signature'), json_data.get('mood'))
+    
+    def track(self, index):
+        """Rows of one TRACK_LAYOUT track (a view)."""
+        bounds = np.searchsorted(self.events['track'], [index, index + 1])
+        return self.events[bounds[0]:bounds[1]]
+    
+    def head(self, beats):
+        """Events cut at a beat: later notes dropped, notes crossing it shortened to end on it."""
+        events = self.events[self.events['onset'] < beats]
+        crossing = events['onset'] + events['duration'] > beats
+        events['duration'][crossing] = beats - events['onset'][crossing]
+        return NoteEvents(events, self.tracks, np.minimum(self.lengths, beats),
+                          self.tempo, self.key, self.time_signature, self.mood)
+
+def note_events(score):
+    """NoteEvents of a composition JSON (built) or of NoteEvents (returned as is)."""
+    return score if isinstance(score, NoteEvents) else NoteEvents.from_json(score)
+
+# --- ABC CONSTANTS ---
+
+ABC_UNIT = Fraction(1, 8)  # L: field, in whole notes
+ABC_BARS_PER_LINE = 4
+
+_KEY_RE = re.compile(r'^([A-Ga-g])([#b-]?)\s*(major|maj|minor|min|m)?$', re.IGNORECASE)
+_STEP_FIFTHS = {'F': -1, 'C': 0, 'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5}
+_ABC_ACCIDENTALS = {-2: '__', -1: '_', 0: '=', 1: '^', 2: '^^'}
+
 # --- CONVERSION LOGIC ---
 
+def json_to_midi(json_data, instrument_name=None):
+    """
+    Write a composition straight to MIDI file bytes (no music21 objects, no temp file).
+    json_data: composition JSON or its NoteEvents.
+    Same tracks, programs and notes as json_to_music21() + score.write('midi');
+    instrument_name overrides the program of the first track, as score_to_audio() does.
+    """
+    notes = note_events(json_data)
+    
+    midi = MIDIFile(max(len(notes.tracks), 1), removeDuplicates=False, deinterleave=False,
+                    ticks_per_quarternote=MIDI_TICKS_PER_QUARTER)
+    midi.addTempo(0, 0, notes.tempo if notes.tempo is not None else 120)
+    
+    for track, layout_index in enumerate(notes.tracks):
+        _, part_name, program, _ = TRACK_LAYOUT[layout_index]
+        channel = track if track < 9 else track + 1  # Skip the GM percussion channel
+        if track == 0 and instrument_name:
+            program = MIDI_PROGRAMS.get(instrument_name, 0)
+        midi.addTrackName(track, 0, part_name)
+        midi.addProgramChange(track, channel, 0, program)
+        
+        rows = notes.track(layout_index)
+        for pitch, onset, duration, velocity in zip(rows['pitch'].tolist(), rows['onset'].tolist(),
+                                                    rows['duration'].tolist(), rows['velocity'].tolist()):
+            midi.addNote(track, channel, pitch, onset, duration, velocity)
+    
+    buffer = io.BytesIO()
+    midi.writeFile(buffer)
+    return buffer.getvalue()
+
+
 def json_to_music21(json_data):
     """Convert Gemini JSON to Music21 Score."""
     score = music21.stream.Score()
@@ -81,7 +403,7 @@ def json_to_music21(json_data):
             p.append(elt)
             
         return p
-
+    
     # 1. Melody
     if 'melody' in tracks_data:
         # Try to map suggested instrument to MIDI program
@@ -89,31 +411,185 @@ def json_to_music21(json_data):
         # But for MIDI file quality, it's better to set it here if we knew it.
         # Since 'instrument' is passed to audio gen, we can perhaps set a default here.
         score.insert(0, create_part('Melody', music21.instrument.Piano(), tracks_data['melody']))
-
+    
     # 2. Bass
     if 'bass' in tracks_data:
         score.insert(0, create_part('Bass', music21.instrument.ElectricBass(), tracks_data['bass']))
-
+    
     # 3. Chords
     if 'chords' in tracks_data:
         # Strings for pads/chords often sounds good
         score.insert(0, create_part('Chords', music21.instrument.StringInstrument(), tracks_data['chords'], is_chord=True))
-
+    
     return score
 
-def music21_to_abc(score):
-    """Convert Score to ABC format."""
+def parse_key(key_str):
+    """
+    ABC key field and key signature of a key name such as "Eb Major", "A minor", "F#m" or "c".
+    A lowercase tonic without a mode is minor, as in music21. Unknown keys fall back to C major.
+    
+    Returns:
+        (ABC K: value, dict step -> alteration implied by the signature)
+    """
+    match = _KEY_RE.match((key_str or '').strip())
+    if not match:
+        return 'C', {}
+    tonic, accidental, mode = match.groups()
+    minor = not mode.lower().startswith('maj') if mode else tonic.islower()
+    alter = {'#': 1, 'b': -1, '-': -1}.get(accidental, 0)
+    fifths = _STEP_FIFTHS[tonic.upper()] + 7 * alter - (3 if minor else 0)
+    if not -7 <= fifths <= 7:
+        return 'C', {}
+    
+    order = 'FCGDAEB' if fifths > 0 else 'BEADGCF'
+    signature = {step: (1 if fifths > 0 else -1) for step in order[:abs(fifths)]}
+    field = tonic.upper() + {1: '#', -1: 'b'}.get(alter, '') + ('m' if minor else '')
+    return field, signature
+
+def parse_meter(meter_str):
+    """(numerator, denominator) of a time signature like "3/4"; 4/4 if invalid."""
     try:
-        abc_path = score.write('abc')
-        if abc_path and os.path.exists(abc_path):
-            with open(abc_path, 'r') as f:
-                content = f.read()
-            return content
-        else:
-            raise Exception("ABC file not created")
-    except Exception as e:
-        print(f"Error converting to ABC: {e}")
-        return "X:1\nT:Error\nK:C\nC"
+        num, den = (int(part) for part in str(meter_str).split('/'))
+        if num > 0 and den > 0 and den & (den - 1) == 0:
+            return num, den
+    except (TypeError, ValueError):
+        pass
+    return 4, 4
+
+def composition_head(json_data, bars=PREVIEW_BARS):
+    """
+    NoteEvents of a composition (JSON or NoteEvents) cut after its first bars,
+    the progressive-mode preview. Notes crossing the cut are shortened to end on it.
+    """
+    notes = note_events(json_data)
+    num, den = parse_meter(notes.time_signature or '4/4')
+    return notes.head(bars * 4 * num / den)
+
+@lru_cache(maxsize=256)
+def _abc_length(quarters):
+    """ABC length suffix of a duration in quarter notes, as a multiple of ABC_UNIT."""
+    units = Fraction(quarters) / 4 / ABC_UNIT
+    if units.denominator == 1:
+        return '' if units == 1 else str(units.numerator)
+    return ('' if units.numerator == 1 else str(units.numerator)) + f"/{units.denominator}"
+
+def _abc_pitch(pitch, alter, signature, bar_accidentals):
+    """
+    ABC spelling of a MIDI pitch written with an alteration (78, +1 for "F#5" -> "^f").
+    An accidental is written whenever the note differs from the key signature or from
+    an earlier accidental on the same pitch in the bar, so readers with or without
+    bar-wide accidentals agree.
+    """
+    natural = pitch - alter
+    step, octave = _SEMITONE_STEPS[natural % 12], natural // 12 - 1
+    token = step if octave <= 4 else step.lower()
+    token += ',' * max(4 - octave, 0) + "'" * max(octave - 5, 0)
+    
+    previous = bar_accidentals.get(token)
+    if alter != signature.get(step, 0) or (previous is not None and previous != alter):
+        if alter not in _ABC_ACCIDENTALS:
+            raise ValueError(f"Unsupported accidental: {alter:+d} on {step}{octave}")
+        bar_accidentals[token] = alter
+        return _ABC_ACCIDENTALS[alter] + token
+    return token
+
+@lru_cache(maxsize=256)
+def _beat_fraction(beats):
+    """Float beat count as a Fraction, snapped to denominators up to 96 (triplets, 64ths)."""
+    return Fraction(beats).limit_denominator(96)
+
+def _voice_events(rows, track_length):
+    """
+    (duration, [(pitch, alter), ...]) of the successive events of one track, in
+    quarters as Fractions: rows sharing an onset form a chord, gaps become rests
+    (an empty pitch list), up to the track length.
+    """
+    sequence, position = [], Fraction(0)
+    last_onset, last_end = None, 0.0  # Float onset and end of the previous event
+    for pitch, alter, onset, duration in zip(rows['pitch'].tolist(), rows['alter'].tolist(),
+                                             rows['onset'].tolist(), rows['duration'].tolist()):
+        if duration <= 0:
+            continue
+        if onset == last_onset:
+            sequence[-1][1].append((pitch, alter))
+            continue
+        if onset != last_end:
+            # Only after a rest: onsets of back-to-back notes are the previous end exactly
+            start = _beat_fraction(onset)
+            if start > position:
+                sequence.append((start - position, []))
+            position = start
+        length = _beat_fraction(duration)
+        sequence.append((length, [(pitch, alter)]))
+        position += length
+        last_onset, last_end = onset, onset + duration
+    
+    end = _beat_fraction(float(track_length))
+    if end > position:
+        sequence.append((end - position, []))
+    return sequence
+
+def json_to_abc(json_data):
+    """
+    Write a composition straight to ABC notation (no music21, no scratch file).
+    
+    One voice per track in score order, notes split at barlines with ties,
+    durations as multiples of the L: unit (triplets become fractions like 2/3).
+    The text parses back with abc_to_music21() to the same pitches and rhythm;
+    consecutive rests are written as one.
+    
+    Args:
+        json_data: Composition JSON (tempo, key, time_signature, tracks) or its NoteEvents
+    
+    Returns:
+        ABC tune as a string
+    """
+    notes = note_events(json_data)
+    key_field, signature = parse_key(notes.key)
+    num, den = parse_meter(notes.time_signature or '4/4')
+    bar_length = Fraction(4 * num, den)
+    tempo = notes.tempo if notes.tempo is not None else 120
+    
+    lines = [
+        "X:1",
+        f"T:AI Composition - {notes.mood if notes.mood is not None else 'Untitled'}",
+        "C:Img2Music AI",
+        f"M:{num}/{den}",
+        f"L:{ABC_UNIT.numerator}/{ABC_UNIT.denominator}",
+        f"Q:1/4={int(tempo) if float(tempo).is_integer() else tempo}",
+        f"K:{key_field}",
+    ]
+    
+    for voice, layout_index in enumerate(notes.tracks, start=1):
+        key, part_name, _, _ = TRACK_LAYOUT[layout_index]
+        clef = ' clef=bass' if key == 'bass' else ''
+        lines.append(f'V:{voice} name="{part_name}"{clef}')
+        
+        bars, tokens, bar_accidentals = [], [], {}
+        position = Fraction(0)
+        for remaining, chord in _voice_events(notes.track(layout_index), notes.lengths[layout_index]):
+            while remaining > 0:
+                piece = min(remaining, bar_length - position)
+                remaining -= piece
+                if not chord:
+                    token = 'z'
+                else:
+                    pitches = [_abc_pitch(pitch, alter, signature, bar_accidentals) for pitch, alter in chord]
+                    token = pitches[0] if len(pitches) == 1 else '[' + ''.join(pitches) + ']'
+                tokens.append(token + _abc_length(piece) + ('-' if chord and remaining > 0 else ''))
+                
+                position += piece
+                if position == bar_length:
+                    bars.append(' '.join(tokens))
+                    tokens, bar_accidentals, position = [], {}, Fraction(0)
+        if tokens:
+            bars.append(' '.join(tokens))
+        
+        for start in range(0, len(bars), ABC_BARS_PER_LINE):
+            end = ' |]' if start + ABC_BARS_PER_LINE >= len(bars) else ' |'
+            lines.append(' | '.join(bars[start:start + ABC_BARS_PER_LINE]) + end)
+    
+    return '\n'.join(lines) + '\n'
 
 def abc_to_music21(abc_content):
     """Parse ABC content to Score."""
@@ -124,137 +600,471 @@ def abc_to_music21(abc_content):
         print(f"Error parsing ABC: {e}")
         return None
 
-def score_to_midi(score):
-    """Write Score to temporary MIDI file."""
-    fp = score.write('midi')
-    return fp
+# Body lines that change how the rest of a voice reads: fields (K:, M:, L:, Q:...) and inline fields
+_ABC_FIELD_RE = re.compile(r'^[A-Za-z]:|\[[A-Za-z]:')
+# A line that closes a chunk ends on a barline, not tied into the next line
+_ABC_BAR_END_RE = re.compile(r'[|\]:]\s*(%.*)?$')
+_ABC_TIE_END_RE = re.compile(r'-\s*[|\]:]+\s*(%.*)?$')
 
-def score_to_audio(score, instrument_name='piano'):
+def split_abc(abc_content):
     """
-    Generate audio from score using FluidSynth.
-    Returns: (sample_rate, numpy_int16_array)
+    Split an ABC tune into its header and, per voice, independently parseable chunks.
+    
+    The header runs up to the K: line. Body lines are grouped by V: voice, then
+    into chunks of one line, joined with the next line while a line does not end
+    on a barline or ends tied into the next one, so no note crosses a chunk. A
+    voice whose body sets fields is kept as a single chunk.
+    
+    Returns:
+        (header, [(voice line, [chunk, ...]), ...]), each piece newline-terminated;
+        None without a K: line or with voices declared in the header
     """
-    sf2_path = get_soundfont_path()
-    if not sf2_path:
-        print("❌ Error: No SoundFont found. Install fluid-soundfont-gm.")
-        # Fallback to silent/empty audio or raise error?
-        # Let's return 1s of silence to avoid crash
-        return 44100, np.zeros(44100, dtype=np.int16)
-
-    # 1. Set instruments based on request
-    # This is tricky because music21 parts already have instruments.
-    # The 'instrument_name' arg usually overrides the melody instrument.
-    
-    # Map common suggestions to General MIDI program numbers
-    midi_programs = {
-        'piano': 0,          # Acoustic Grand Piano
-        'synth_retro': 81,   # Lead 2 (sawtooth) - roughly retro
-        'strings': 48,       # String Ensemble 1
-        'bass': 33,          # Electric Bass (finger)
-        'guitar': 25,        # Acoustic Guitar (nylon)
-        'brass': 61,         # Brass Section
-        'drums': 0,          # Drums are channel 10, program doesn't matter much usually
-        'sax': 65,           # Alto Sax
-        'flute': 73,         # Flute
-    }
-    
-    prog = midi_programs.get(instrument_name, 0)
-    
-    # Update the first part (Melody) instrument
-    if len(score.parts) > 0:
-        p0 = score.parts[0]
-        # Remove existing instrument objects at start
-        p0.removeByClass('Instrument')
-        
-        new_inst = music21.instrument.instrumentFromMidiProgram(prog)
-        p0.insert(0, new_inst)
+    lines = abc_content.splitlines(keepends=True)
+    key_line = next((i for i, line in enumerate(lines) if line.startswith('K:')), None)
+    if key_line is None or any(line.startswith('V:') for line in lines[:key_line]):
+        return None
+    header = ''.join(lines[:key_line + 1])
+    
+    voices = {}  # voice id -> (voice line, body lines), in order of appearance
+    current = ''
+    for line in lines[key_line + 1:]:
+        if line.startswith('V:'):
+            current = line[2:].split(maxsplit=1)[0] if line[2:].strip() else ''
+            voices.setdefault(current, (line if line.endswith('\n') else line + '\n', []))
+            continue
+        voices.setdefault(current, ('', []))[1].append(line if line.endswith('\n') else line + '\n')
+    
+    split = []
+    for voice_line, body in voices.values():
+        if any(_ABC_FIELD_RE.search(line) for line in body):
+            split.append((voice_line, [''.join(body)]))
+            continue
+        chunks, pending = [], []
+        for line in body:
+            pending.append(line)
+            if _ABC_BAR_END_RE.search(line) and not _ABC_TIE_END_RE.search(line):
+                chunks.append(''.join(pending))
+                pending = []
+        if pending:
+            chunks.append(''.join(pending))
+        split.append((voice_line, chunks))
+    return header, split
+
+@lru_cache(maxsize=4096)
+def _abc_chunk(header, voice_line, chunk):
+    """
+    Parse one chunk of a voice on its own.
+    Returns: (read-only rows (notes, 4) in quarters from the chunk start, chunk
+    length in quarters, quarter-note tempo), or None if it does not parse
+    """
+    score = abc_to_music21(header + voice_line + chunk)
+    if score is None:
+        return None
+    part = score.parts[0] if score.parts else score
+    rows = np.array(_part_rows(part), dtype=np.float64).reshape(-1, 4)
+    rows.setflags(write=False)
+    return rows, float(part.highestTime), _score_bpm(score)
 
-    # 2. Export to MIDI
-    midi_path = score.write('midi')
+def abc_tracks(abc_content, instrument_name='piano'):
+    """
+    note_tracks() of an ABC tune, parsed chunk by chunk (see split_abc()) through a
+    cache: after an edit, only the chunks whose text changed are parsed again.
+    Tunes that cannot be split are parsed whole.
+    Returns: (tracks, quarter-note tempo), or None if the tune does not parse
+    """
+    split = split_abc(abc_content)
+    if split is None:
+        score = abc_to_music21(abc_content)
+        if score is None:
+            return None
+        return note_tracks(score, instrument_name), _score_bpm(score)
     
-    # 3. Render with FluidSynth
-    # fluidsynth -ni -g 1.0 /path/to/sf2 midifile -F output.wav -r 44100
-    tmp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False).name
+    header, voices = split
+    voiced, bpm = [], 120.0
+    for track, (voice_line, chunks) in enumerate(voices[:len(TRACK_LAYOUT)]):
+        rows, position = [], 0.0
+        for chunk in chunks:
+            parsed = _abc_chunk(header, voice_line, chunk)
+            if parsed is None:
+                return None
+            chunk_rows, length, bpm = parsed
+            shifted = chunk_rows.copy()
+            shifted[:, 0] += position
+            rows.append(shifted)
+            position += length
+        voiced.append((TRACK_LAYOUT[track][0], np.concatenate(rows) if rows else np.zeros((0, 4))))
+    return _voice_tracks(voiced, instrument_name, 60.0 / bpm), bpm
+
+def score_to_midi(score, instrument_name=None):
+    """
+    Write a composition to MIDI file bytes, in memory.
+    score: composition JSON or NoteEvents (fast path through json_to_midi) or a music21 Score (ABC edits).
+    """
+    if isinstance(score, (dict, NoteEvents)):
+        return json_to_midi(score, instrument_name)
+    return music21.midi.translate.streamToMidiFile(score).writestr()
+
+def note_tracks(score, instrument_name='piano'):
+    """
+    Note events of each track of a composition.
+    score: composition JSON, NoteEvents or a music21 Score (parts in TRACK_LAYOUT order).
+    instrument_name sets the timbre and MIDI program of the first track; the
+    others use their TRACK_TIMBRES timbre and TRACK_LAYOUT program.
+    Returns: list of (track key, timbre, GM program, events), events a float array
+    (notes, 4) of start seconds, duration seconds, MIDI pitch and velocity (synth_engine.EVENT_*)
+    """
+    voiced = []
     
-    cmd = [
-        'fluidsynth',
-        '-ni',              # No interactive shell
-        '-g', '1.0',       # Gain
-        sf2_path,
-        midi_path,
-        '-F', tmp_wav,      # Fast render to file
-        '-r', '44100'       # Sample rate
-    ]
+    if isinstance(score, (dict, NoteEvents)):
+        notes = note_events(score)
+        seconds_per_quarter = 60.0 / float(notes.tempo if notes.tempo is not None else 120)
+        for layout_index in notes.tracks:
+            rows = notes.track(layout_index)
+            events = np.empty((len(rows), 4))
+            events[:, 0] = rows['onset']
+            events[:, 1] = rows['duration']
+            events[:, 2] = rows['pitch']
+            events[:, 3] = rows['velocity'] / 127
+            voiced.append((TRACK_LAYOUT[layout_index][0], events))
+    else:
+        seconds_per_quarter = 60.0 / _score_bpm(score)
+        for track, part in enumerate(score.parts[:len(TRACK_LAYOUT)]):
+            voiced.append((TRACK_LAYOUT[track][0], _part_rows(part)))
     
-    try:
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        
-        # 4. Read WAV back to numpy
-        if os.path.exists(tmp_wav):
-            with wave.open(tmp_wav, 'rb') as wf:
-                sr = wf.getframerate()
-                # Read all frames
-                n_frames = wf.getnframes()
-                audio_bytes = wf.readframes(n_frames)
-                
-                # Convert to numpy
-                audio_data = np.frombuffer(audio_bytes, dtype=np.int16)
-                
-                # If stereo, mix to mono or keep stereo?
-                # App expects (sr, data). Data can be 1D or 2D. 
-                # Wav file from fluidsynth is likely stereo.
-                channels = wf.getnchannels()
-                if channels == 2:
-                    audio_data = audio_data.reshape(-1, 2)
-                    # Mix to mono for simple visualization/effects later?
-                    # Or keep stereo. Let's keep stereo if possible, but audio_effects Might expect mono.
-                    # Looking at audio_effects.py: it does simple math. If input is (N, 2), it works?
-                    # "if delay < len(audio)" -> len matches samples (N).
-                    # "audio[:-delay]" -> works for (N, 2).
-                    # So stereo should be fine!
-                
-            os.remove(tmp_wav)
-            return sr, audio_data
+    return _voice_tracks(voiced, instrument_name, seconds_per_quarter)
+
+def _score_bpm(score):
+    """Quarter-note tempo of a music21 score (120 if unmarked)."""
+    boundaries = score.metronomeMarkBoundaries()
+    bpm = boundaries[0][2].getQuarterBPM() if boundaries else 120.0
+    return bpm or 120.0
+
+def _part_rows(part):
+    """(onset, duration in quarters, MIDI pitch, velocity) of every sounding pitch of a music21 part."""
+    velocity = MIDI_VELOCITY / 127
+    return [
+        (float(n.offset), float(n.quarterLength), p.midi,
+         n.volume.velocity / 127 if n.volume.velocity else velocity)
+        for n in part.stripTies().flatten().notes
+        for p in n.pitches
+    ]
+
+def _voice_tracks(voiced, instrument_name, seconds_per_quarter):
+    """note_tracks() output from (track key, rows in quarters) per voice."""
+    programs = {key: program for key, _, program, _ in TRACK_LAYOUT}
+    tracks = []
+    for track, (key, rows) in enumerate(voiced):
+        events = np.array(rows, dtype=np.float64).reshape(-1, 4)
+        events[:, :2] *= seconds_per_quarter
+        if track == 0:
+            tracks.append((key, instrument_name, MIDI_PROGRAMS.get(instrument_name, 0), events))
         else:
-            print("FluidSynth did not create output file.")
-            return 44100, np.zeros(44100, dtype=np.int16)
-            
-    except subprocess.CalledProcessError as e:
-        print(f"FluidSynth error: {e.stderr.decode()}")
-        return 44100, np.zeros(44100, dtype=np.int16)
-    except Exception as e:
-        print(f"Error processing audio: {e}")
-        return 44100, np.zeros(44100, dtype=np.int16)
+            tracks.append((key, TRACK_TIMBRES[key], programs[key], events))
+    return tracks
 
-def save_audio_to_mp3(sr, audio_data):
-    """Save audio data to MP3 using ffmpeg."""
-    try:
-        # Handle Stereo/Mono for saving
-        channels = 1
-        if len(audio_data.shape) > 1 and audio_data.shape[1] == 2:
-            channels = 2
-            
-        tmp_wav = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-        tmp_wav.close()
+def events_to_midi(events, program):
+    """
+    Single-track MIDI file bytes for note events, at 60 bpm so beats are seconds.
+    Used to render one stem; the bytes only change when that track does.
+    """
+    midi = MIDIFile(1, removeDuplicates=False, deinterleave=False, ticks_per_quarternote=MIDI_TICKS_PER_QUARTER)
+    midi.addTempo(0, 0, 60)
+    midi.addProgramChange(0, 0, 0, program)
+    for start, duration, pitch, velocity in events.tolist():
+        midi.addNote(0, 0, int(pitch), start, duration, int(round(velocity * 127)))
+    buffer = io.BytesIO()
+    midi.writeFile(buffer)
+    return buffer.getvalue()
 
-        with wave.open(tmp_wav.name, 'wb') as wav_file:
-            wav_file.setnchannels(channels)
-            wav_file.setsampwidth(2)  # 16-bit
-            wav_file.setframerate(sr)
-            wav_file.writeframes(audio_data.tobytes())
+def tracks_to_midi(tracks, tempo=120):
+    """
+    MIDI file bytes of note_tracks() output (events in seconds at tempo bpm):
+    one MIDI track per voice, with its program and part name.
+    """
+    names = {key: part_name for key, part_name, _, _ in TRACK_LAYOUT}
+    beats_per_second = float(tempo) / 60.0
+    midi = MIDIFile(max(len(tracks), 1), removeDuplicates=False, deinterleave=False,
+                    ticks_per_quarternote=MIDI_TICKS_PER_QUARTER)
+    midi.addTempo(0, 0, tempo)
+    
+    for track, (key, _, program, events) in enumerate(tracks):
+        channel = track if track < 9 else track + 1  # Skip the GM percussion channel
+        midi.addTrackName(track, 0, names.get(key, key))
+        midi.addProgramChange(track, channel, 0, program)
+        for start, duration, pitch, velocity in events.tolist():
+            midi.addNote(track, channel, int(pitch), start * beats_per_second, duration * beats_per_second,
+                         int(round(velocity * 127)))
+    
+    buffer = io.BytesIO()
+    midi.writeFile(buffer)
+    return buffer.getvalue()
 
-        tmp_mp3 = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        tmp_mp3.close()
+def synthesize(score, instrument_name='piano', sample_rate=44100):
+    """
+    Render a composition in-process with the NumPy synthesizer (no soundfont, no subprocess).
+    Returns: numpy int16 array (N, 2)
+    """
+    stems = render_stems(score, instrument_name, sample_rate, engine='numpy')
+    return mix_stems(stems)
 
-        cmd = [
-            'ffmpeg', '-y', '-i', tmp_wav.name,
-            '-acodec', 'libmp3lame', '-q:a', '2', tmp_mp3.name
-        ]
+def render_stem(timbre, program, events, sample_rate, engine, sf2_path):
+    """
+    Render one track, centered, through the render cache.
+    Returns: int16 (N, 2) from FluidSynth, (N, 1) from the built-in synthesizer
+    """
+    if len(events) == 0:
+        return np.zeros((0, 2), dtype=np.int16)
+    if engine != 'numpy':
+        return midi_to_audio(events_to_midi(events, program), sample_rate, sf2_path, program=program)[1]
+    
+    # The built-in synthesizer is identified by the timbre and no soundfont
+    cache = get_render_cache()
+    key = cache.make_key(events.tobytes(), timbre, None, sample_rate) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        metrics.record_render_cache(cached is not None, cached.nbytes if cached is not None else 0)
+        if cached is not None:
+            return cached
+    
+    synth_start = time.perf_counter()
+    audio_data = SynthEngine(sample_rate).render_stem(timbre, events)
+    metrics.record_io_stage('numpy_synth', events.nbytes, audio_data.nbytes, time.perf_counter() - synth_start)
+    if key is not None:
+        cache.put(key, audio_data)
+    return audio_data
+
+def render_stems(score, instrument_name='piano', sample_rate=44100, engine='fluidsynth'):
+    """
+    Render every track of a composition as its own stem, concurrently.
+    Each stem is cached on its own MIDI (or events) and program, so changing the
+    melody instrument only re-renders the melody stem.
+    engine: 'fluidsynth', or 'numpy' for the built-in synthesizer (also used
+    whenever no soundfont is installed).
+    Returns: dict track key -> numpy int16 array (N, channels), in TRACK_LAYOUT order
+    """
+    sf2_path = get_soundfont_path()
+    if engine != 'numpy' and not sf2_path:
+        print("⚠️ No SoundFont found, using the built-in synthesizer. Install fluid-soundfont-gm.")
+        engine = 'numpy'
+    
+    tracks = note_tracks(score, instrument_name)
+    with ThreadPoolExecutor(max_workers=max(len(tracks), 1)) as executor:
+        futures = {
+            key: executor.submit(render_stem, timbre, program, events, sample_rate, engine, sf2_path)
+            for key, timbre, program, events in tracks
+        }
+        return {key: future.result() for key, future in futures.items()}
+
+def mix_stems(stems, gains=None, pans=None):
+    """
+    Mix stems down to one int16 stereo track.
+    Stems are stacked into one zero-padded (stems, N, 2) buffer and combined
+    with a single (stems, 2) gain matrix: per-stem gain times constant-power pan.
+    gains / pans: optional dicts per track key (default 1.0 / TRACK_PANS).
+    Returns: numpy int16 array (N, 2)
+    """
+    gains = gains or {}
+    pans = pans if pans is not None else TRACK_PANS
+    keys = list(stems)
+    n = max((len(stems[key]) for key in keys), default=0)
+    if not keys or n == 0:
+        return np.zeros((n, 2), dtype=np.int16)
+    
+    stack = np.zeros((len(keys), n, 2), dtype=np.float32)
+    for i, key in enumerate(keys):
+        stem = stems[key]
+        stack[i, :len(stem)] = stem.reshape(len(stem), -1)  # Mono stems fill both channels
+    
+    angle = (np.clip([pans.get(key, 0.0) for key in keys], -1.0, 1.0) + 1.0) * np.pi / 4
+    matrix = np.sqrt(2.0) * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+    matrix *= np.array([gains.get(key, 1.0) for key in keys])[:, None]
+    
+    mix = np.einsum('snc,sc->nc', stack, matrix.astype(np.float32))
+    np.clip(mix, -32768, 32767, out=mix)
+    return np.rint(mix).astype(np.int16)
+
+def score_to_audio(score, instrument_name='piano', sample_rate=44100, engine='fluidsynth'):
+    """
+    Generate audio from a composition: every track rendered as a stem, then mixed down.
+    score: composition JSON or a music21 Score.
+    Renders at sample_rate (e.g. 22050 for previews, 44100/48000 for exports):
+    FluidSynth synthesizes at that rate directly into a pipe, as does the NumPy
+    synthesizer, so no resampling is involved.
+    engine: 'fluidsynth', or 'numpy' for the low-latency built-in synthesizer,
+    which is also used whenever no soundfont is installed.
+    Returns: (sample_rate, numpy_int16_array)
+    """
+    return sample_rate, mix_stems(render_stems(score, instrument_name, sample_rate, engine))
+
+def audio_to_wav(sr, audio_data):
+    """Encode int16 audio as WAV file bytes, in memory."""
+    channels = audio_data.shape[1] if audio_data.ndim > 1 else 1
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)  # 16-bit
+        wav_file.setframerate(int(sr))
+        wav_file.writeframes(np.ascontiguousarray(audio_data).tobytes())
+    return buffer.getvalue()
+
+def midi_to_audio(midi_bytes, sample_rate=44100, sf2_path=None, program=None):
+    """
+    Render MIDI file bytes with FluidSynth, through the disk render cache.
+    A render already cached for the same MIDI, program, soundfont and sample
+    rate is memory-mapped back (read-only) instead of being synthesized again.
+    Returns: (sample_rate, numpy_int16_array)
+    """
+    sf2_path = sf2_path or get_soundfont_path()
+    if not sf2_path:
+        print("❌ Error: No SoundFont found. Install fluid-soundfont-gm.")
+        return sample_rate, np.zeros(sample_rate, dtype=np.int16)
+    
+    cache = get_render_cache()
+    key = cache.make_key(midi_bytes, program, sf2_path, sample_rate) if cache is not None else None
+    if key is not None:
+        cached = cache.get(key)
+        metrics.record_render_cache(cached is not None, cached.nbytes if cached is not None else 0)
+        if cached is not None:
+            return sample_rate, cached
+    
+    synth_start = time.perf_counter()
+    audio_data = _render_midi(midi_bytes, sample_rate, sf2_path)
+    if audio_data is None:
+        return sample_rate, np.zeros(sample_rate, dtype=np.int16)
+    metrics.record_io_stage('synth', len(midi_bytes), audio_data.nbytes, time.perf_counter() - synth_start)
+    if key is not None:
+        cache.put(key, audio_data)
+    return sample_rate, audio_data
 
-        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
-        os.unlink(tmp_wav.name)
+@contextmanager
+def _midi_source(midi_bytes):
+    """
+    Path a child process can open to read MIDI bytes: an in-memory file (memfd)
+    passed as /dev/fd/N, or a temporary file where memfd is not available.
+    Yields: (path, file descriptors to pass to the child)
+    """
+    if hasattr(os, 'memfd_create'):
+        fd = os.memfd_create('midi')
+        try:
+            view = memoryview(midi_bytes)
+            while view:
+                view = view[os.write(fd, view):]
+            yield f'/dev/fd/{fd}', (fd,)
+        finally:
+            os.close(fd)
+    else:
+        with tempfile.NamedTemporaryFile(suffix='.mid') as f:
+            f.write(midi_bytes)
+            f.flush()
+            yield f.name, ()
 
-        return tmp_mp3.name
+def _render_midi(midi_bytes, sample_rate, sf2_path):
+    """
+    Synthesize MIDI file bytes at sample_rate.
+    Returns: numpy int16 array (N, 2), or None if FluidSynth failed
+    """
+    # 2a. Render on a pooled worker (soundfont already loaded)
+    pool = get_render_pool()
+    if pool is not None:
+        try:
+            return pool.render(midi_bytes, sample_rate)
+        except Exception as e:
+            print(f"FluidSynth pool error, falling back to the CLI: {e}")
+    
+    # 2b. Render with a one-off FluidSynth process: raw s16 stereo PCM written
+    # to a pipe and read straight into memory, no WAV file
+    # fluidsynth -ni -g 1.0 /path/to/sf2 /dev/fd/<midi> -F /dev/fd/<pipe> -T raw -O s16 -r <sample_rate>
+    # stderr goes to a file: a pipe nobody reads before the PCM is finished
+    # would fill up with warnings and block FluidSynth
+    stderr_file = tempfile.TemporaryFile()
+    read_fd, write_fd = os.pipe()
+    try:
+        with _midi_source(midi_bytes) as (midi_path, midi_fds):
+            cmd = [
+                'fluidsynth',
+                '-ni',              # No interactive shell
+                '-g', '1.0',       # Gain
+                sf2_path,
+                midi_path,
+                '-F', f'/dev/fd/{write_fd}',  # Fast render to the pipe
+                '-T', 'raw',        # Headerless PCM...
+                '-O', 's16',        # ...as native-endian int16
+                '-r', str(sample_rate)  # Sample rate
+            ]
+            proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=stderr_file, pass_fds=midi_fds + (write_fd,))
+    except OSError as e:
+        os.close(read_fd)
+        stderr_file.close()
+        print(f"Error starting FluidSynth: {e}")
+        return None
+    finally:
+        os.close(write_fd)
+    
+    # 3. Read PCM until FluidSynth closes the pipe; a hung render is killed,
+    # which closes the pipe too
+    timed_out = threading.Event()
+    def kill():
+        timed_out.set()
+        proc.kill()
+    watchdog = threading.Timer(CLI_RENDER_TIMEOUT, kill)
+    watchdog.daemon = True
+    watchdog.start()
+    pcm = bytearray()
+    try:
+        with os.fdopen(read_fd, 'rb', buffering=0) as pipe:
+            for chunk in iter(lambda: pipe.read(1 << 16), b''):
+                pcm += chunk
+        proc.wait()
+    finally:
+        watchdog.cancel()
+    
+    with stderr_file:
+        if timed_out.is_set():
+            print(f"FluidSynth error: render killed after {CLI_RENDER_TIMEOUT:.0f}s")
+            return None
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            print(f"FluidSynth error: {stderr_file.read().decode(errors='replace')}")
+            return None
+    if not pcm:
+        print("FluidSynth produced no audio.")
+        return None
+    
+    # FluidSynth renders stereo: keep it as (N, 2),
+    # the effects chain processes stereo natively
+    del pcm[len(pcm) - len(pcm) % 4:]
+    return np.frombuffer(pcm, dtype=np.int16).reshape(-1, 2)
+
+def encode_audio(sr, audio_data, fmt='mp3'):
+    """
+    Encode int16 audio to one of AUDIO_FORMATS in memory: PCM is piped to
+    ffmpeg's stdin and the encoded stream read back from its stdout.
+    Returns: encoded bytes, or None if ffmpeg is unavailable or fails
+    """
+    spec = AUDIO_FORMATS[fmt]
+    # Handle Stereo/Mono for encoding
+    channels = audio_data.shape[1] if audio_data.ndim > 1 else 1
+    pcm = memoryview(np.ascontiguousarray(audio_data)).cast('B')
+    
+    cmd = [
+        'ffmpeg', '-hide_banner', '-loglevel', 'error',
+        '-f', 's16le', '-ar', str(int(sr)), '-ac', str(channels), '-i', 'pipe:0',
+        *spec['args'], 'pipe:1'
+    ]
+    
+    try:
+        encode_start = time.perf_counter()
+        result = subprocess.run(cmd, input=pcm, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        metrics.record_io_stage(f'encode_{fmt}', pcm.nbytes, len(result.stdout), time.perf_counter() - encode_start)
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        print(f"Error encoding {spec['label']}: {e.stderr.decode(errors='replace')}")
+        return None
     except Exception as e:
-        print(f"Error saving MP3: {e}")
+        print(f"Error encoding {spec['label']}: {e}")
         return None
+
+def audio_to_mp3(sr, audio_data):
+    """Encode int16 audio to MP3 bytes in memory (see encode_audio). Returns None on failure."""
+    return encode_audio(sr, audio_data, 'mp3')
@@ -0,0 +1,182 @@
+"""
+Disk cache for synthesized audio.
+Renders are stored as raw int16 PCM (.npy) under a hash of everything that
+determines them, and memory-mapped back on a hit instead of re-running FluidSynth.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+
+class RenderCache:
+    """Content-addressed render cache on disk with a byte budget and LRU eviction."""
+    
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Initialize the cache, picking up renders left by previous runs.
+        
+        Args:
+            directory: Directory holding the cached renders (created if missing)
+            max_bytes: Total size of cached files kept on disk; least recently used go first
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> file size, oldest first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        
+        os.makedirs(directory, exist_ok=True)
+        
+        # Recency survives restarts through the file mtimes (touched on every hit)
+        entries = []
+        for name in os.listdir(directory):
+            if name.endswith('.npy'):
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime_ns, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict()
+    
+    @staticmethod
+    def make_key(midi_bytes: bytes, program, soundfont_path: Optional[str], sample_rate: int) -> str:
+        """
+        Cache key of a render.
+        
+        The soundfont is identified by its path, size and modification time
+        rather than its content, which would mean hashing ~140 MB per render.
+        
+        Args:
+            midi_bytes: MIDI file that is rendered (note event bytes for the built-in synthesizer)
+            program: GM program of the instrument override (timbre name for the built-in synthesizer)
+            soundfont_path: Soundfont used by FluidSynth, None for the built-in synthesizer
+            sample_rate: Output sample rate in Hz
+        
+        Returns:
+            Hex digest naming the cache entry
+        """
+        if soundfont_path is None:
+            engine = "numpy"
+        else:
+            stat = os.stat(soundfont_path)
+            engine = f"{os.path.realpath(soundfont_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        digest = hashlib.sha256(midi_bytes)
+        digest.update(f"|{program}|{engine}|{sample_rate}".encode())
+        return digest.hexdigest()
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.npy')
+    
+    def _evict(self):
+        """Drop least recently used entries until the budget is met. Caller holds the lock."""
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+    
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """
+        Retrieve a cached render.
+        
+        Args:
+            key: Key from make_key()
+        
+        Returns:
+            Read-only int16 array memory-mapped from the cache file, or None on a miss
+        """
+        with self._lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        
+        path = self._path(key)
+        try:
+            audio = np.load(path, mmap_mode='r')
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed or truncated behind our back
+            with self._lock:
+                self._bytes -= self._index.pop(key, 0)
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += audio.nbytes
+        return audio
+    
+    def put(self, key: str, audio: np.ndarray) -> bool:
+        """
+        Store a render. The file is written under a temporary name and renamed,
+        so readers never see a partial entry.
+        
+        Args:
+            key: Key from make_key()
+            audio: PCM samples, shape (N,) or (N, channels)
+        
+        Returns:
+            True if stored, False if empty or larger than the whole budget
+        """
+        if audio.size == 0 or audio.nbytes > self.max_bytes:
+            return False
+        
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.ascontiguousarray(audio))
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        
+        with self._lock:
+            self._bytes += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+        return True
+    
+    def clear(self):
+        """Remove all cached renders."""
+        with self._lock:
+            for key in self._index:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,276 @@
+"""
+In-process synthesizer for img2music.
+Renders note events with band-limited wavetable oscillators and ADSR
+envelopes in pure NumPy: a low-latency alternative to FluidSynth, and the
+fallback when no soundfont is installed.
+"""
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+
+
+# Event columns: start (seconds), duration (seconds), MIDI pitch, velocity (0..1)
+EVENT_START, EVENT_DURATION, EVENT_PITCH, EVENT_VELOCITY = range(4)
+
+# Samples per single-cycle wavetable (power of two). Large enough that a
+# nearest-sample lookup keeps the phase noise near -70 dB, so no interpolation
+_TABLE_SIZE = 8192
+
+# Harmonics stay below this fraction of Nyquist for the highest note of a table's octave
+_BANDLIMIT = 0.9
+
+# Note samples rendered per batch (bounds temporary memory)
+_CHUNK_ELEMENTS = 1 << 21
+
+# Per-note amplitude before the velocity
+_NOTE_GAIN = 0.2
+
+# Timbres described in the Help tab. harmonics: {harmonic number: amplitude} of
+# the table, played at ratio * note frequency (the bass table runs an octave low
+# so harmonic 1 is the sub-octave). Envelope times in seconds: attack, decay time
+# constant towards sustain, sustain level, release. vibrato: (rate Hz, depth as a
+# frequency fraction). sweep: (start frequency multiple, time constant) of a
+# pitch drop, fixed_hz: pitch independent of the note (kick drum).
+TIMBRES = {
+    'piano': {
+        'harmonics': {1: 1.0, 2: 0.5, 3: 0.3, 4: 0.2, 5: 0.12, 6: 0.08, 7: 0.05, 8: 0.03},
+        'attack': 0.004, 'decay': 0.6, 'sustain': 0.0, 'release': 0.25,
+    },
+    'synth_retro': {
+        'harmonics': {n: 1.0 / n for n in range(1, 64, 2)},  # Square wave
+        'attack': 0.01, 'decay': 0.15, 'sustain': 0.7, 'release': 0.08,
+    },
+    'strings': {
+        'harmonics': {n: 1.0 / n for n in range(1, 24)},  # Sawtooth
+        'attack': 0.12, 'decay': 0.3, 'sustain': 0.85, 'release': 0.35,
+        'vibrato': (5.5, 0.004),
+    },
+    'bass': {
+        'harmonics': {1: 0.6, 2: 1.0, 4: 0.35, 6: 0.15, 8: 0.05},
+        'ratio': 0.5,
+        'attack': 0.008, 'decay': 0.4, 'sustain': 0.6, 'release': 0.12,
+    },
+    'guitar': {
+        'harmonics': {n: 1.0 / n ** 1.3 for n in range(1, 16)},
+        'attack': 0.002, 'decay': 0.35, 'sustain': 0.0, 'release': 0.15,
+    },
+    'brass': {
+        'harmonics': {1: 1.0, 2: 0.15, 3: 0.7, 4: 0.1, 5: 0.5, 6: 0.05, 7: 0.3, 9: 0.15, 11: 0.08},
+        'attack': 0.05, 'decay': 0.2, 'sustain': 0.8, 'release': 0.12,
+        'vibrato': (5.0, 0.002),
+    },
+    'sax': {
+        'harmonics': {1: 1.0, 2: 0.6, 3: 0.5, 4: 0.3, 5: 0.25, 6: 0.15, 7: 0.1},
+        'attack': 0.04, 'decay': 0.25, 'sustain': 0.75, 'release': 0.1,
+        'vibrato': (5.0, 0.005),
+    },
+    'flute': {
+        'harmonics': {1: 1.0, 2: 0.2, 3: 0.08},
+        'attack': 0.06, 'decay': 0.3, 'sustain': 0.85, 'release': 0.15,
+        'vibrato': (4.5, 0.004),
+    },
+    'drums': {
+        'harmonics': {1: 1.0},
+        'attack': 0.001, 'decay': 0.18, 'sustain': 0.0, 'release': 0.05,
+        'fixed_hz': 50.0, 'sweep': (3.0, 0.03),
+    },
+}
+
+
+def midi_to_hz(pitch):
+    """Frequency of a MIDI pitch (A4 = 69 = 440 Hz)."""
+    return 440.0 * 2.0 ** ((np.asarray(pitch, dtype=np.float64) - 69.0) / 12.0)
+
+
+@lru_cache(maxsize=32)
+def wavetables(timbre: str, sample_rate: int) -> np.ndarray:
+    """
+    Band-limited single-cycle tables of a timbre, one per MIDI octave.
+    
+    Table b holds only the harmonics that stay below Nyquist for the highest
+    note of octave b, so high notes never alias. Each table is normalized to
+    unit peak.
+    
+    Args:
+        timbre: Key of TIMBRES
+        sample_rate: Output sample rate in Hz
+    
+    Returns:
+        Read-only float32 array of shape (11, _TABLE_SIZE)
+    """
+    spec = TIMBRES[timbre]
+    ratio = spec.get('ratio', 1.0)
+    phase = np.arange(_TABLE_SIZE) / _TABLE_SIZE
+    tables = np.zeros((11, _TABLE_SIZE))
+    
+    for band in range(11):
+        top_hz = spec.get('fixed_hz') or midi_to_hz(12 * band + 11) * ratio
+        top_hz *= spec.get('sweep', (1.0, 0.0))[0]
+        for harmonic, amplitude in spec['harmonics'].items():
+            if harmonic == 1 or harmonic * top_hz < _BANDLIMIT * sample_rate / 2:
+                tables[band] += amplitude * np.sin(2 * np.pi * harmonic * phase)
+        tables[band] /= np.max(np.abs(tables[band]))
+    
+    tables = tables.astype(np.float32)
+    tables.setflags(write=False)
+    return tables
+
+
+class SynthEngine:
+    """Vectorized wavetable synthesizer rendering note events into per-track stems."""
+    
+    def __init__(self, sample_rate: int = 44100):
+        """
+        Initialize the engine.
+        
+        Args:
+            sample_rate: Output sample rate in Hz
+        """
+        self.sample_rate = sample_rate
+    
+    def _envelope(self, timbre: str, note_samples: int) -> np.ndarray:
+        """ADSR envelope of a note held note_samples long, release tail included."""
+        spec = TIMBRES[timbre]
+        sr = self.sample_rate
+        attack = max(int(spec['attack'] * sr), 1)
+        release = max(int(spec['release'] * sr), 1)
+        
+        t = np.arange(note_samples + release, dtype=np.float32)
+        env = np.empty_like(t)
+        held = t[:note_samples]
+        sustain = spec['sustain']
+        decay = np.exp(-np.maximum(held - attack, 0.0) / (spec['decay'] * sr))
+        np.multiply(np.minimum(held / attack, 1.0), sustain + (1.0 - sustain) * decay, out=env[:note_samples])
+        
+        # Linear release from the level reached at note-off
+        level = env[note_samples - 1] if note_samples else 0.0
+        env[note_samples:] = level * (1.0 - np.arange(1, release + 1, dtype=np.float32) / release)
+        return env
+    
+    def _phase(self, timbre: str, freqs: np.ndarray, t: np.ndarray) -> np.ndarray:
+        """
+        Oscillator phase, (notes, samples), in the unit of freqs times seconds: the
+        closed-form integral of the instantaneous frequency, so vibrato and pitch
+        sweeps need no running sum.
+        """
+        spec = TIMBRES[timbre]
+        phase = freqs[:, None] * t[None, :]
+        if 'vibrato' in spec:
+            rate, depth = spec['vibrato']
+            phase += freqs[:, None] * (depth / (2 * np.pi * rate)) * np.sin(2 * np.pi * rate * t)[None, :]
+        if 'sweep' in spec:
+            start, tau = spec['sweep']
+            phase += freqs[:, None] * ((start - 1.0) * tau * (1.0 - np.exp(-t / tau)))[None, :]
+        return phase
+    
+    def note_spans(self, timbre: str, events: np.ndarray):
+        """
+        Sample ranges the notes sound in, release tails included.
+        
+        Returns:
+            (starts, stops) int64 arrays, one entry per event
+        """
+        spec = TIMBRES.get(timbre, TIMBRES['piano'])
+        sr = self.sample_rate
+        starts = np.round(events[:, EVENT_START] * sr).astype(np.int64)
+        lengths = np.maximum(np.round(events[:, EVENT_DURATION] * sr).astype(np.int64), 1)
+        return starts, starts + lengths + max(int(spec['release'] * sr), 1)
+    
+    def stem_samples(self, timbre: str, events: np.ndarray) -> int:
+        """Length of the stem render_stem() produces for these events."""
+        if len(events) == 0:
+            return 0
+        tail = TIMBRES.get(timbre, TIMBRES['piano'])['release']
+        end = float(np.max(events[:, EVENT_START] + events[:, EVENT_DURATION]))
+        return int(np.ceil((end + tail) * self.sample_rate)) + 1
+    
+    def render_track(self, timbre: str, events: np.ndarray, out: np.ndarray, offset: int = 0):
+        """
+        Add one track to a mono buffer.
+        
+        Notes of equal length share one envelope and are rendered together as a
+        (notes, samples) block: phases, the table lookup and the envelope are
+        computed for the whole batch, then each row is added
+        into the buffer at its start sample. Samples falling outside the buffer
+        are dropped, so a window of the track can be rendered on its own.
+        
+        Args:
+            timbre: Key of TIMBRES (unknown names use the piano)
+            events: float array (notes, 4) with the EVENT_* columns
+            out: float32 mono buffer
+            offset: Track sample at which out starts
+        """
+        if timbre not in TIMBRES:
+            timbre = 'piano'
+        if len(events) == 0:
+            return
+        spec = TIMBRES[timbre]
+        sr = self.sample_rate
+        flat_tables = wavetables(timbre, sr).ravel()
+        
+        starts = np.round(events[:, EVENT_START] * sr).astype(np.int64)
+        lengths = np.maximum(np.round(events[:, EVENT_DURATION] * sr).astype(np.int64), 1)
+        pitches = events[:, EVENT_PITCH]
+        if 'fixed_hz' in spec:
+            freqs = np.full(len(events), spec['fixed_hz'])
+        else:
+            freqs = midi_to_hz(pitches) * spec.get('ratio', 1.0)
+        bands = np.clip(pitches.astype(np.int64) // 12, 0, 10)
+        gains = (_NOTE_GAIN * events[:, EVENT_VELOCITY]).astype(np.float32)
+        
+        for note_samples in np.unique(lengths):
+            env = self._envelope(timbre, int(note_samples))
+            span = len(env)
+            t = np.arange(span) / sr
+            group = np.flatnonzero(lengths == note_samples)
+            
+            step = max(1, _CHUNK_ELEMENTS // span)
+            for first in range(0, len(group), step):
+                rows = group[first:first + step]
+                # Phase in table samples; the table size is a power of two so
+                # wrapping is a mask, and each row reads its octave's table
+                index = self._phase(timbre, freqs[rows] * _TABLE_SIZE, t).astype(np.int64)
+                index &= _TABLE_SIZE - 1
+                index += (bands[rows] * _TABLE_SIZE)[:, None]
+                block = flat_tables.take(index)
+                block *= env
+                block *= gains[rows][:, None]
+                
+                for row, start in zip(block, starts[rows] - offset):
+                    lo, hi = max(start, 0), min(start + span, len(out))
+                    if lo < hi:
+                        out[lo:hi] += row[lo - start:hi - start]
+    
+    def render_stem(self, timbre: str, events: np.ndarray, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Render one track to a 16-bit mono stem, long enough for the last release.
+        Stems are panned and balanced at mixdown, so nothing is normalized here.
+        
+        A window [start, stop) only synthesizes the notes sounding in it and is
+        identical to the same slice of the whole stem, so an edited passage can
+        be re-rendered and spliced into the previous stem.
+        
+        Args:
+            timbre: Key of TIMBRES (unknown names use the piano)
+            events: float array (notes, 4) with the EVENT_* columns
+            start: First sample to render
+            stop: End of the window (defaults to the end of the stem)
+        
+        Returns:
+            int16 array of shape (stop - start, 1)
+        """
+        if stop is None:
+            stop = self.stem_samples(timbre, events)
+        n = max(stop - start, 0)
+        if start > 0 or stop < self.stem_samples(timbre, events):
+            # Same note order as a full render, so the sums match bit for bit
+            note_starts, note_stops = self.note_spans(timbre, events)
+            events = events[(note_starts < stop) & (note_stops > start)]
+        
+        buffer = np.zeros(n, dtype=np.float32)
+        self.render_track(timbre, events, buffer, offset=start)
+        buffer *= 32767
+        np.clip(buffer, -32768, 32767, out=buffer)
+        np.rint(buffer, out=buffer)
+        return buffer.astype(np.int16).reshape(n, 1)
@@ -0,0 +1,422 @@
+"""
+Persistent FluidSynth render workers for img2music.
+Keeps a pool of long-lived processes with the soundfont already loaded, so a
+render no longer pays for a process start and a full soundfont load.
+"""
+import ctypes
+import ctypes.util
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from metrics import logger
+
+
+# FluidSynth API constants
+_FLUID_FAILED = -1
+_FLUID_PLAYER_PLAYING = 1
+
+# Frames rendered per fluid_synth_write_s16() call
+_RENDER_BLOCK = 512
+
+# Rates every worker prepares a synth for at startup
+_PRELOAD_SAMPLE_RATES = (44100,)
+
+
+def _load_fluidsynth() -> ctypes.CDLL:
+    """Load libfluidsynth and declare the functions used by the workers."""
+    name = ctypes.util.find_library('fluidsynth')
+    if name is None:
+        raise OSError("libfluidsynth not found (install the fluidsynth package)")
+    lib = ctypes.CDLL(name)
+    
+    c_void_p, c_char_p, c_int, c_double = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int, ctypes.c_double
+    signatures = {
+        'new_fluid_settings': ([], c_void_p),
+        'delete_fluid_settings': ([c_void_p], None),
+        'fluid_settings_setnum': ([c_void_p, c_char_p, c_double], c_int),
+        'fluid_settings_setint': ([c_void_p, c_char_p, c_int], c_int),
+        'fluid_settings_setstr': ([c_void_p, c_char_p, c_char_p], c_int),
+        'new_fluid_synth': ([c_void_p], c_void_p),
+        'delete_fluid_synth': ([c_void_p], None),
+        'fluid_synth_sfload': ([c_void_p, c_char_p, c_int], c_int),
+        'fluid_synth_system_reset': ([c_void_p], c_int),
+        'fluid_synth_write_s16': ([c_void_p, c_int, c_void_p, c_int, c_int, c_void_p, c_int, c_int], c_int),
+        'new_fluid_player': ([c_void_p], c_void_p),
+        'delete_fluid_player': ([c_void_p], None),
+        'fluid_player_add_mem': ([c_void_p, c_void_p, ctypes.c_size_t], c_int),
+        'fluid_player_play': ([c_void_p], c_int),
+        'fluid_player_stop': ([c_void_p], c_int),
+        'fluid_player_get_status': ([c_void_p], c_int),
+    }
+    for func_name, (argtypes, restype) in signatures.items():
+        func = getattr(lib, func_name)
+        func.argtypes = argtypes
+        func.restype = restype
+    return lib
+
+
+class _FluidSynthEngine:
+    """
+    In-process FluidSynth renderer (runs inside a worker).
+    
+    Mirrors ``fluidsynth -F``: the MIDI player is clocked by the rendered
+    samples and rendering stops when the player is done. One synth is kept
+    per sample rate; FluidSynth shares the soundfont samples between them.
+    """
+    
+    def __init__(self, soundfont_path: str, gain: float = 1.0):
+        self.lib = _load_fluidsynth()
+        self.soundfont_path = soundfont_path
+        self.gain = gain
+        self._synths: Dict[int, Tuple[int, int]] = {}
+        for sample_rate in _PRELOAD_SAMPLE_RATES:
+            self._synth_for(sample_rate)
+    
+    def _synth_for(self, sample_rate: int) -> int:
+        """Return the synth for a sample rate, creating it and loading the soundfont once."""
+        entry = self._synths.get(sample_rate)
+        if entry is not None:
+            return entry[1]
+        
+        lib = self.lib
+        settings = lib.new_fluid_settings()
+        lib.fluid_settings_setnum(settings, b"synth.sample-rate", float(sample_rate))
+        lib.fluid_settings_setnum(settings, b"synth.gain", float(self.gain))
+        lib.fluid_settings_setstr(settings, b"player.timing-source", b"sample")
+        lib.fluid_settings_setint(settings, b"synth.lock-memory", 0)
+        synth = lib.new_fluid_synth(settings)
+        if not synth:
+            lib.delete_fluid_settings(settings)
+            raise RuntimeError(f"Could not create a FluidSynth synth at {sample_rate} Hz")
+        if lib.fluid_synth_sfload(synth, self.soundfont_path.encode(), 1) == _FLUID_FAILED:
+            lib.delete_fluid_synth(synth)
+            lib.delete_fluid_settings(settings)
+            raise RuntimeError(f"Could not load soundfont {self.soundfont_path}")
+        
+        self._synths[sample_rate] = (settings, synth)
+        return synth
+    
+    def render(self, midi_bytes: bytes, sample_rate: int) -> bytes:
+        """Render a MIDI file to interleaved stereo int16 PCM."""
+        lib = self.lib
+        synth = self._synth_for(sample_rate)
+        player = lib.new_fluid_player(synth)
+        if not player:
+            raise RuntimeError("Could not create a FluidSynth player")
+        
+        midi = ctypes.create_string_buffer(midi_bytes, len(midi_bytes))
+        chunks = []
+        try:
+            if lib.fluid_player_add_mem(player, midi, len(midi_bytes)) == _FLUID_FAILED:
+                raise RuntimeError("FluidSynth rejected the MIDI data")
+            lib.fluid_player_play(player)
+            
+            block = np.empty((_RENDER_BLOCK, 2), dtype=np.int16)
+            address = block.ctypes.data
+            while lib.fluid_player_get_status(player) == _FLUID_PLAYER_PLAYING:
+                lib.fluid_synth_write_s16(synth, _RENDER_BLOCK, address, 0, 2, address, 1, 2)
+                chunks.append(block.tobytes())
+        finally:
+            lib.fluid_player_stop(player)
+            lib.delete_fluid_player(player)
+            # Silence hanging voices and controllers before the next request
+            lib.fluid_synth_system_reset(synth)
+        
+        return b''.join(chunks)
+    
+    def close(self):
+        """Free every synth and settings object."""
+        for settings, synth in self._synths.values():
+            self.lib.delete_fluid_synth(synth)
+            self.lib.delete_fluid_settings(settings)
+        self._synths.clear()
+
+
+def _worker_main(conn, soundfont_path: str, gain: float):
+    """
+    Worker process loop.
+    
+    Protocol over the pipe (pickled tuples, PCM as raw bytes):
+    ('render', midi_bytes, sample_rate) -> ('ok', n_bytes) then the PCM bytes, or ('error', message);
+    ('ping',) -> ('pong', pid); ('stop',) ends the loop.
+    """
+    try:
+        engine = _FluidSynthEngine(soundfont_path, gain)
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+    conn.send(('ready', os.getpid()))
+    
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        
+        kind = message[0]
+        if kind == 'render':
+            try:
+                pcm = engine.render(message[1], message[2])
+            except Exception as e:
+                conn.send(('error', f"{type(e).__name__}: {e}"))
+                continue
+            conn.send(('ok', len(pcm)))
+            conn.send_bytes(pcm)
+        elif kind == 'ping':
+            conn.send(('pong', os.getpid()))
+        elif kind == 'stop':
+            break
+    
+    engine.close()
+
+
+class WorkerError(RuntimeError):
+    """A render worker crashed, timed out or could not start."""
+
+
+class _SynthWorker:
+    """Handle on one worker process and its end of the pipe."""
+    
+    def __init__(self, context, soundfont_path: str, gain: float):
+        self._context = context
+        self.soundfont_path = soundfont_path
+        self.gain = gain
+        self.process = None
+        self.conn = None
+        self.renders = 0
+    
+    def start(self, timeout: float):
+        """Spawn the process and wait until the soundfont is loaded."""
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main, args=(child_conn, self.soundfont_path, self.gain),
+            name='fluidsynth-worker', daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.renders = 0
+        
+        if not self.conn.poll(timeout):
+            self.kill()
+            raise WorkerError(f"FluidSynth worker did not start within {timeout:.0f}s")
+        try:
+            status, detail = self.conn.recv()
+        except (EOFError, OSError):
+            self.kill()
+            raise WorkerError("FluidSynth worker exited during startup")
+        if status != 'ready':
+            self.kill()
+            raise WorkerError(f"FluidSynth worker failed to start: {detail}")
+    
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+    
+    def ping(self, timeout: float) -> bool:
+        """True if the worker answers a ping within timeout."""
+        if not self.alive:
+            return False
+        try:
+            self.conn.send(('ping',))
+            return self.conn.poll(timeout) and self.conn.recv()[0] == 'pong'
+        except (EOFError, OSError):
+            return False
+    
+    def render(self, midi_bytes: bytes, sample_rate: int, timeout: float) -> bytes:
+        """Send a render request and wait for the PCM bytes."""
+        try:
+            self.conn.send(('render', midi_bytes, sample_rate))
+            if not self.conn.poll(timeout):
+                raise WorkerError(f"Render timed out after {timeout:.0f}s")
+            status, detail = self.conn.recv()
+            if status != 'ok':
+                raise RuntimeError(f"FluidSynth render failed: {detail}")
+            pcm = self.conn.recv_bytes()
+        except (EOFError, OSError) as e:
+            raise WorkerError(f"FluidSynth worker died during render: {e}")
+        self.renders += 1
+        return pcm
+    
+    def stop(self, timeout: float = 2.0):
+        """Ask the worker to exit, killing it if it does not."""
+        if self.alive:
+            try:
+                self.conn.send(('stop',))
+            except (EOFError, OSError):
+                pass
+            self.process.join(timeout)
+        self.kill()
+    
+    def kill(self):
+        """Terminate the process and close the pipe."""
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(1.0)
+        if self.conn is not None:
+            self.conn.close()
+        self.process = None
+        self.conn = None
+
+
+class SynthWorkerPool:
+    """
+    Pool of FluidSynth worker processes with the soundfont preloaded.
+    
+    Requests go to an idle worker over a local pipe. A worker that crashes
+    or times out is restarted and the request is retried once on the fresh
+    worker; health_check() pings idle workers and restarts unresponsive ones,
+    every health_interval seconds on a background thread, so a worker that
+    hangs while idle is replaced before a render waits on it.
+    """
+    
+    def __init__(self, soundfont_path: str, size: int = 2, gain: float = 1.0,
+                 render_timeout: float = 120.0, start_timeout: float = 60.0,
+                 health_interval: float = 60.0):
+        """
+        Args:
+            soundfont_path: SF2 file loaded by every worker
+            size: Number of worker processes
+            gain: Synth gain (as ``fluidsynth -g``)
+            render_timeout: Seconds to wait for one render
+            start_timeout: Seconds to wait for a worker to load the soundfont
+            health_interval: Seconds between background health checks (0 = only on demand)
+        """
+        self.soundfont_path = soundfont_path
+        self.size = max(int(size), 1)
+        self.gain = gain
+        self.render_timeout = render_timeout
+        self.start_timeout = start_timeout
+        
+        # Spawn: workers must not inherit the threads of the app process
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_SynthWorker(self._context, soundfont_path, gain) for _ in range(self.size)]
+        self._idle: "queue.Queue[_SynthWorker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stop = threading.Event()
+        self.health_interval = health_interval
+        self.stats = {'renders': 0, 'restarts': 0, 'failures': 0, 'render_time': 0.0, 'health_checks': 0}
+        
+        try:
+            for worker in self._workers:
+                worker.start(start_timeout)
+                self._idle.put(worker)
+        except WorkerError:
+            self.close()
+            raise
+        logger.info(f"FluidSynth pool started: {self.size} workers, soundfont {soundfont_path}")
+        
+        if health_interval > 0:
+            threading.Thread(target=self._monitor, name='synth-health', daemon=True).start()
+    
+    def _monitor(self):
+        """Background thread: health_check() every health_interval seconds until close()."""
+        while not self._stop.wait(self.health_interval):
+            try:
+                result = self.health_check()
+            except Exception as e:
+                logger.warning(f"FluidSynth health check failed: {e}")
+                continue
+            if result['restarted']:
+                logger.warning(f"FluidSynth health check: {result}")
+    
+    def _restart(self, worker: _SynthWorker):
+        """Replace a dead or stuck worker process."""
+        worker.kill()
+        worker.start(self.start_timeout)
+        with self._lock:
+            self.stats['restarts'] += 1
+        logger.warning("FluidSynth worker restarted")
+    
+    def render(self, midi_bytes: bytes, sample_rate: int = 44100) -> np.ndarray:
+        """
+        Render a MIDI file on an idle worker.
+        
+        Args:
+            midi_bytes: Standard MIDI file content
+            sample_rate: Output sample rate in Hz
+        
+        Returns:
+            Stereo int16 audio, shape (N, 2)
+        """
+        if self._closed:
+            raise WorkerError("Pool is closed")
+        
+        worker = self._idle.get()
+        start = time.perf_counter()
+        try:
+            for attempt in range(2):
+                if not worker.alive:
+                    self._restart(worker)
+                try:
+                    pcm = worker.render(midi_bytes, sample_rate, self.render_timeout)
+                    break
+                except WorkerError:
+                    # Crash or hang: start a fresh worker and retry once
+                    self._restart(worker)
+                    if attempt == 1:
+                        raise
+        except Exception:
+            with self._lock:
+                self.stats['failures'] += 1
+            raise
+        finally:
+            self._idle.put(worker)
+        
+        with self._lock:
+            self.stats['renders'] += 1
+            self.stats['render_time'] += time.perf_counter() - start
+        return np.frombuffer(pcm, dtype=np.int16).reshape(-1, 2)
+    
+    def health_check(self, timeout: float = 5.0) -> Dict[str, int]:
+        """
+        Ping every idle worker and restart the ones that do not answer.
+        
+        Returns:
+            Counts of healthy and restarted workers
+        """
+        healthy = restarted = 0
+        checked = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            checked.append(worker)
+        
+        try:
+            for worker in checked:
+                if worker.ping(timeout):
+                    healthy += 1
+                else:
+                    self._restart(worker)
+                    restarted += 1
+        finally:
+            for worker in checked:
+                self._idle.put(worker)
+        with self._lock:
+            self.stats['health_checks'] += 1
+        return {'healthy': healthy, 'restarted': restarted, 'busy': self.size - len(checked)}
+    
+    def close(self):
+        """Stop the health checks and every worker."""
+        self._closed = True
+        self._stop.set()
+        for worker in self._workers:
+            worker.stop()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool statistics."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['workers'] = self.size
+        stats['alive'] = sum(worker.alive for worker in self._workers)
+        stats['avg_render_time'] = stats['render_time'] / stats['renders'] if stats['renders'] else 0.0
+        return stats